@@ -102,6 +102,8 @@ class HealthconnectPocStack(Stack):
             bucket_name=f"{self.config.ENVIRONMENT.lower()}-sftp-server-bucket{self.version_suffix}", #dev account
             removal_policy=RemovalPolicy.DESTROY,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            # Results of shards whose file never merged (see VERADIGM_SHARD_PREFIX)
+            lifecycle_rules=[s3.LifecycleRule(prefix="_shards/", expiration=Duration.days(7))],
         )
         # self.sftp_role = iam.Role(
         #     self,
@@ -185,6 +187,18 @@ class HealthconnectPocStack(Stack):
             ),
             projection_type=dynamo_db.ProjectionType.ALL
         )
+        self.appointment_table.add_global_secondary_index(
+            index_name="booked_hospital_id-end_time-index",
+            partition_key=dynamo_db.Attribute(
+                name="booked_hospital_id",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            sort_key=dynamo_db.Attribute(
+                name="end_time",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            projection_type=dynamo_db.ProjectionType.ALL
+        )
         self.appointment_table.grant_full_access(self.LambdaExecutionRole)
         self.patients_table = dynamo_db.TableV2(
             self,
@@ -200,6 +214,19 @@ class HealthconnectPocStack(Stack):
                 name="patient_id", type=dynamo_db.AttributeType.STRING
             ),
         )
+        self.patients_table.add_global_secondary_index(
+            index_name="rider_linked-modified-index",
+            partition_key=dynamo_db.Attribute(
+                name="rider_linked",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            sort_key=dynamo_db.Attribute(
+                name="modified",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            projection_type=dynamo_db.ProjectionType.INCLUDE,
+            non_key_attributes=["via_rider_id", "provider"],
+        )
         self.patients_table.grant_full_access(self.LambdaExecutionRole)
         self.settings_table = dynamo_db.TableV2(
             self,
@@ -229,6 +256,19 @@ class HealthconnectPocStack(Stack):
                 name="name", type=dynamo_db.AttributeType.STRING
             )
         )
+        self.sftp_logs_table.add_global_secondary_index(
+            index_name="hospital_id-etag-index",
+            partition_key=dynamo_db.Attribute(
+                name="hospital_id",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            sort_key=dynamo_db.Attribute(
+                name="etag",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            projection_type=dynamo_db.ProjectionType.INCLUDE,
+            non_key_attributes=["rows_ingested", "rows_failed", "rows_skipped"],
+        )
         self.sftp_logs_table.grant_full_access(self.LambdaExecutionRole)
         self.hospitals_table = dynamo_db.TableV2(
             self,
@@ -240,7 +280,29 @@ class HealthconnectPocStack(Stack):
                 name="id", type=dynamo_db.AttributeType.STRING
             ),
         )
+        self.hospitals_table.add_global_secondary_index(
+            index_name="sftp_username-index",
+            partition_key=dynamo_db.Attribute(
+                name="sftp_username",
+                type=dynamo_db.AttributeType.STRING
+            ),
+            projection_type=dynamo_db.ProjectionType.ALL
+        )
         self.hospitals_table.grant_full_access(self.LambdaExecutionRole)
+        self.cache_table = dynamo_db.TableV2(
+            self,
+            f"EHRMultitenant{self.config.ENVIRONMENT.title()}CacheTable",
+            table_name=f"{self.config.ENVIRONMENT.lower()}_cache_table{self.version_suffix_us}",
+            partition_key=dynamo_db.Attribute(
+                name="namespace", type=dynamo_db.AttributeType.STRING
+            ),
+            sort_key=dynamo_db.Attribute(
+                name="cache_key", type=dynamo_db.AttributeType.STRING
+            ),
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        self.cache_table.grant_full_access(self.LambdaExecutionRole)
 
     def create_vpc(self):
         self.vpc = ec2.Vpc(
@@ -480,6 +542,7 @@ class HealthconnectPocStack(Stack):
                 "DATA_POPULATOR_LAMBDA_NAME": self.data_populator_lambda.function_name,
                 "APPOINTMENT_TABLE_NAME": self.appointment_table.table_name,
                 "PATIENTS_TABLE_NAME": self.patients_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
             },
         )
@@ -501,6 +564,7 @@ class HealthconnectPocStack(Stack):
                 "SETTINGS_TABLE_NAME": self.settings_table.table_name,
                 "FTPLOGS_TABLE_NAME": self.sftp_logs_table.table_name,
                 "HOSPITALS_TABLE_NAME": self.hospitals_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
             },
             layers=[self.requirements_layer, self.base_layer],
@@ -533,6 +597,7 @@ class HealthconnectPocStack(Stack):
                 "APPOINTMENT_TABLE_NAME": self.appointment_table.table_name,
                 "PATIENTS_TABLE_NAME": self.patients_table.table_name,
                 "HOSPITALS_TABLE_NAME": self.hospitals_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
             },
             layers=[self.requirements_layer, self.base_layer],
@@ -581,6 +646,7 @@ class HealthconnectPocStack(Stack):
                 "KMS_AVAILABLE": "True",
                 "ENVIRONMENT": self.config.ENVIRONMENT.upper(),
                 "SETTINGS_TABLE_NAME": self.settings_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
             },
             # tracing=aws_lambda.Tracing.ACTIVE, 
@@ -636,6 +702,7 @@ class HealthconnectPocStack(Stack):
                 "SFTP_S3_BUCKET": self.sftp_bucket.bucket_name,
                 "PROVISIONING_LAMBDA": self.provisioning_lambda.function_name,
                 "HOSPITALS_TABLE_NAME": self.hospitals_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
             },
         )
@@ -680,6 +747,8 @@ class HealthconnectPocStack(Stack):
                 "APPOINTMENT_TABLE_NAME": self.appointment_table.table_name,
                 "PATIENTS_TABLE_NAME": self.patients_table.table_name,
                 "HOSPITALS_TABLE_NAME": self.hospitals_table.table_name,
+                "SETTINGS_TABLE_NAME": self.settings_table.table_name,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
                 "VERSION_SUFFIX": self.version_suffix,
                 "ENVIRONMENT": self.config.ENVIRONMENT.upper(),
             },
@@ -700,6 +769,7 @@ class HealthconnectPocStack(Stack):
             environment={
                 "ENVIRONMENT": self.config.ENVIRONMENT.upper(),
                 "VERSION_SUFFIX": self.version_suffix,
+                "CACHE_TABLE_NAME": self.cache_table.table_name,
             }
         )
 
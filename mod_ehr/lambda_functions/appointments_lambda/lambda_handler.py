@@ -88,6 +88,7 @@ class AppointmentAPIHandler(APIHandler):
 
         obj = self.model(**body)
         try:
+            obj.resolve_coordinates()
             obj.save()
             return Response(body=obj, status=Status.HTTP_201_CREATED)
         except PutError:
@@ -134,7 +135,15 @@ class AppointmentAPIHandler(APIHandler):
             for key, value in body.items():
                 if key not in ('hospital_id', 'id') and hasattr(self.model, key):
                     actions.append(getattr(self.model, key).set(value))
+
+            if "location" in body and body["location"] != appointment.location:
+                appointment.location = body["location"]
+                appointment.resolve_coordinates(force=True)
+                actions.extend(appointment.coordinate_actions())
             
+            if "status" in body:
+                actions.extend(appointment.booked_actions(body))
+
             if actions:
                 appointment.update(actions=actions)
 
@@ -0,0 +1,124 @@
+"""
+Compares Veradigm CSV parse throughput (rows/sec) of the original
+AppointmentsList path, per-row pydantic validation and the columnar fast
+path, and checks that all three produce the same appointment fields.
+
+    python benchmark.py --rows 100000 [--invalid 0.01] [--delimiter "|"]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from error_report import ErrorReport  # noqa: E402
+from lambda_handler import AppointmentsMapperWithVia  # noqa: E402
+from pydantic_models import AppointmentsList  # noqa: E402
+
+FIELDNAMES = [
+    "Patient First Name",
+    "Patient Middle Initial",
+    "Patient Last Name",
+    "Scheduling Location Description",
+    "Appointment DateTime",
+    "Status",
+    "Patient Number",
+    "Appointment Duration",
+    "Location Name",
+    "Location Street1",
+    "Location Street2",
+    "Location City",
+    "Location State",
+    "Location Zip",
+    "Location Phone Number",
+    "Appointment ID",
+]
+
+
+def generate_csv(rows: int, invalid: float, delimiter: str) -> str:
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDNAMES, delimiter=delimiter)
+    writer.writeheader()
+    for i in range(rows):
+        appointment_time = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 60))
+        record = {
+            "Patient First Name": rng.choice(["Ann", "Bob", " Cy ", "Dee"]),
+            "Patient Middle Initial": rng.choice(["A", "", "Q"]),
+            "Patient Last Name": rng.choice(["Smith", "Jones", "Lee"]),
+            "Scheduling Location Description": "Clinic",
+            "Appointment DateTime": appointment_time.strftime("%Y%m%d_%H%M%S"),
+            "Status": rng.choice(["Booked", "Cancelled", "Pending"]),
+            "Patient Number": f"P{rng.randrange(rows // 4 + 1)}",
+            "Appointment Duration": rng.choice([15, 30, 45, 60]),
+            "Location Name": "610",
+            "Location Phone Number": "555-0100",
+            "Location Street1": "10th St",
+            "Location Street2": rng.choice(["", "Suite 2"]),
+            "Location City": "Perry",
+            "Location State": "IA",
+            "Location Zip": "50220",
+            "Appointment ID": f"A{i}",
+        }
+        if rng.random() < invalid:
+            record[rng.choice(["Appointment DateTime", "Appointment Duration"])] = "bad"
+        writer.writerow(record)
+    return out.getvalue()
+
+
+class NullS3:
+    def upload_fileobj(self, *args, **kwargs):
+        pass
+
+
+def run(name, parse, rows):
+    started = time.perf_counter()
+    result = parse()
+    elapsed = time.perf_counter() - started
+    if result is None:
+        print(f"{name:<16} {'skipped':>12}  (fails the whole file on any invalid row)")
+        return result
+    print(f"{name:<16} {rows / elapsed:>12,.0f} rows/sec  ({elapsed:.2f}s, {len(result)} valid)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--invalid", type=float, default=0.0)
+    parser.add_argument("--delimiter", default=",")
+    args = parser.parse_args()
+
+    data = generate_csv(args.rows, args.invalid, args.delimiter)
+    mapper = AppointmentsMapperWithVia()
+
+    def reader():
+        return csv.DictReader(io.StringIO(data), delimiter=args.delimiter)
+
+    def appointments_list():
+        if args.invalid:
+            return None
+        apps = AppointmentsList(appointments=reader())
+        return [mapper._appointment_fields(app) for app in apps.appointments]
+
+    def stream(columnar):
+        with ErrorReport(NullS3(), "bucket", "key") as errors:
+            return list(mapper.iter_veradigm_rows(reader(), errors, columnar=columnar))
+
+    print(f"{args.rows:,} rows, {args.invalid:.1%} invalid, delimiter {args.delimiter!r}")
+    baseline = run("AppointmentsList", appointments_list, args.rows)
+    per_row = run("per-row pydantic", lambda: stream(False), args.rows)
+    columnar = run("columnar", lambda: stream(True), args.rows)
+    assert columnar == per_row, "columnar fields differ from pydantic"
+    assert baseline is None or baseline == per_row, "streaming fields differ from AppointmentsList"
+    print("All paths produced identical appointment fields")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+central_tz = pytz.timezone("America/Chicago")
+utc_tz = pytz.utc
+
+# Rows are converted with naive.replace(tzinfo=central_tz).astimezone(utc), and
+# a pytz zone attached with replace() always carries its first (LMT) offset.
+CENTRAL_OFFSET = np.timedelta64(
+    int(datetime(2000, 1, 1).replace(tzinfo=central_tz).utcoffset().total_seconds()), "s"
+)
+
+REQUIRED_COLUMNS = (
+    "Patient First Name",
+    "Patient Last Name",
+    "Scheduling Location Description",
+    "Appointment DateTime",
+    "Status",
+    "Location Phone Number",
+    "Patient Number",
+    "Appointment Duration",
+    "Location Street1",
+    "Location City",
+    "Location State",
+    "Location Zip",
+    "Location Name",
+    "Appointment ID",
+)
+OPTIONAL_COLUMNS = ("Patient Middle Initial", "Location Street2")
+DURATION_MAX_DIGITS = 9
+
+
+def detect_delimiter(header: str) -> str:
+    """
+    Veradigm drops are comma or pipe separated; the header tells which.
+    """
+    return "|" if header.count("|") > header.count(",") else ","
+
+
+def _column(rows: list, name: str) -> np.ndarray:
+    return np.array([row.get(name) or "" for row in rows], dtype=str)
+
+
+def _text(rows: list, name: str) -> np.ndarray:
+    return np.char.strip(_column(rows, name))
+
+
+def _codepoints(values: np.ndarray, width: int) -> np.ndarray:
+    """
+    Returns values as an (n, width) matrix of code points, 0-padded.
+    """
+    return values.astype(f"U{width}").view(np.uint32).reshape(len(values), width)
+
+
+def _is_digit(codepoints: np.ndarray) -> np.ndarray:
+    return (codepoints >= ord("0")) & (codepoints <= ord("9"))
+
+
+def _digits_to_int(codepoints: np.ndarray) -> np.ndarray:
+    digits = np.where(_is_digit(codepoints), codepoints - ord("0"), 0).astype(np.int64)
+    return (digits * 10 ** np.arange(codepoints.shape[1] - 1, -1, -1)).sum(axis=1)
+
+
+def _parse_datetimes(values: np.ndarray) -> tuple:
+    """
+    Vectorized strptime(value, "%Y%m%d_%H%M%S"). Returns (datetime64[s], ok).
+    """
+    codepoints = _codepoints(values, 15)
+    digits = _is_digit(codepoints)
+    ok = (
+        (np.char.str_len(values) == 15)
+        & (codepoints[:, 8] == ord("_"))
+        & digits[:, :8].all(axis=1)
+        & digits[:, 9:].all(axis=1)
+    )
+
+    year = _digits_to_int(codepoints[:, 0:4])
+    month = _digits_to_int(codepoints[:, 4:6])
+    day = _digits_to_int(codepoints[:, 6:8])
+    hour = _digits_to_int(codepoints[:, 9:11])
+    minute = _digits_to_int(codepoints[:, 11:13])
+    second = _digits_to_int(codepoints[:, 13:15])
+
+    # Years at the edges of datetime's range can overflow once shifted; the
+    # pydantic path reports those.
+    ok &= (year >= 2) & (year <= 9998) & (month >= 1) & (month <= 12)
+    month_start = np.where(ok, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    days_in_month = (
+        (month_start + 1).astype("datetime64[D]") - month_start.astype("datetime64[D]")
+    ).astype(np.int64)
+    ok &= (day >= 1) & (day <= days_in_month) & (hour < 24) & (minute < 60) & (second < 60)
+
+    timestamps = (
+        month_start.astype("datetime64[s]")
+        + np.where(ok, (day - 1) * 86400 + hour * 3600 + minute * 60 + second, 0).astype(
+            "timedelta64[s]"
+        )
+    )
+    return timestamps, ok
+
+
+def parse_rows(rows: list) -> list:
+    """
+    Fast path for a chunk of csv.DictReader rows: checks and converts whole
+    columns at once and returns, per row, the Appointment fields or None when
+    the row needs full pydantic validation.
+
+    A row is accepted only when pydantic would accept it (all required columns
+    present, a valid YYYYMMDD_HHMMSS datetime, a plain digit duration) and the
+    fields equal what the pydantic path builds.
+    """
+    if not rows:
+        return []
+    count = len(rows)
+    # csv.DictReader fills missing trailing columns with None; such rows
+    # (and rows missing a header column) take the pydantic path.
+    ok = np.array([None not in row.values() for row in rows], dtype=bool)
+    if any(name not in rows[0] for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS):
+        ok[:] = False
+
+    local_start, datetime_ok = _parse_datetimes(_column(rows, "Appointment DateTime"))
+    durations = _column(rows, "Appointment Duration")
+    lengths = np.char.str_len(durations)
+    duration_chars = _codepoints(durations, DURATION_MAX_DIGITS)
+    in_value = np.arange(DURATION_MAX_DIGITS)[None, :] < lengths[:, None]
+    duration_ok = np.where(in_value, _is_digit(duration_chars), True).all(axis=1)
+    ok &= datetime_ok & duration_ok & (lengths > 0) & (lengths <= DURATION_MAX_DIGITS)
+    # Right-align the digits so each column is one decimal place
+    padded = np.char.zfill(np.where(ok, durations, "0"), DURATION_MAX_DIGITS)
+    minutes = _digits_to_int(_codepoints(padded, DURATION_MAX_DIGITS))
+
+    start = local_start - CENTRAL_OFFSET
+    end = start + minutes.astype("timedelta64[m]")
+    ok &= end < np.datetime64("9999-01-01")
+
+    location = _text(rows, "Location Name")
+    for name in ("Location Street1", "Location Street2", "Location City", "Location State", "Location Zip"):
+        location = np.char.add(np.char.add(location, ","), _text(rows, name))
+    location = np.char.replace(location, ",,", ",")
+    patient_name = np.char.add(
+        np.char.add(np.char.add(_text(rows, "Patient First Name"), " "), _text(rows, "Patient Middle Initial")),
+        np.char.add(" ", _text(rows, "Patient Last Name")),
+    )
+    appointment_ids = _text(rows, "Appointment ID").tolist()
+    patient_numbers = _text(rows, "Patient Number").tolist()
+    statuses = _text(rows, "Status").tolist()
+    location = location.tolist()
+    patient_name = patient_name.tolist()
+
+    starts = start.astype(datetime).tolist()
+    ends = end.astype(datetime).tolist()
+    return [
+        {
+            "id": appointment_ids[i],
+            "patient_id": patient_numbers[i],
+            "patient_name": patient_name[i],
+            "location": location[i],
+            "start_time": starts[i].replace(tzinfo=utc_tz),
+            "end_time": ends[i].replace(tzinfo=utc_tz),
+            "status": statuses[i],
+        }
+        if ok[i]
+        else None
+        for i in range(count)
+    ]
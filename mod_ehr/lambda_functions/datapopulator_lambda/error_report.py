@@ -0,0 +1,47 @@
+import json
+import shutil
+import tempfile
+
+
+class ErrorReport:
+    """
+    Collects rejected rows as JSON lines in a spooled temp file (in memory
+    until it grows large, then on disk) and uploads it to S3 on exit if any
+    row was rejected.
+    """
+
+    MAX_MEMORY = 1024 * 1024  # bytes kept in memory before spilling to /tmp
+
+    def __init__(self, s3_client, bucket_name: str, key: str, context: dict | None = None) -> None:
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        # Merged into every record, e.g. the shard a line number is relative to
+        self.context = context or {}
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=self.MAX_MEMORY, mode="w+b")
+        return self
+
+    def add(self, line: int, row: dict, errors: list) -> None:
+        self.count += 1
+        record = {**self.context, "line": line, "row": row, "errors": errors}
+        self._file.write(json.dumps(record, default=str).encode("utf-8") + b"\n")
+
+    def extend(self, stream, count: int) -> None:
+        """
+        Appends count records already written by another report.
+        """
+        self.count += count
+        shutil.copyfileobj(stream, self._file)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self.count:
+                self._file.seek(0)
+                self.s3_client.upload_fileobj(self._file, self.bucket_name, self.key)
+                print(f"Wrote {self.count} rejected row(s) to s3://{self.bucket_name}/{self.key}")
+        finally:
+            self._file.close()
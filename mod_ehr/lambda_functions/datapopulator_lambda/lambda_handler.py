@@ -1,23 +1,76 @@
-import contextlib
+import codecs
 import csv
+import hashlib
+import json
 import threading
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from functools import cached_property
+from itertools import chain, islice
+from urllib.parse import unquote_plus
 import pytz
 import boto3
 from health_connector_base.constants import (
     DIFF_MATCH_IN_SEC,
     LOCATION_DIFF,
     MOCK_DATA,
+    PATIENT_BATCH_GET_SIZE,
+    VERADIGM_CHUNK_SIZE,
+    VERADIGM_COLUMNAR,
+    VERADIGM_FILE_CONCURRENCY,
+    VERADIGM_PATIENT_READ_CONCURRENCY,
+    VERADIGM_SHARD_SIZE,
+    VERADIGM_SHARD_THRESHOLD,
+    VERADIGM_SKIP_UNCHANGED,
     VIA_RIDE_MOCK,
 )
+from health_connector_base.custom_attributes import AddressAttribute
+from health_connector_base import fhir, hospital_directory, settings_cache, trip_snapshots
+from health_connector_base.http_client import http_client
 from health_connector_base.location_manager import LocationManager
-from health_connector_base.models import Appointment, FTPLogs, Patient, Settings, Hospital
-from health_connector_base.smart_epic import JWTHelper, SmartEpicClient
-from health_connector_base.via import Via
-from pydantic_models import AppointmentsList
+from health_connector_base.models import Appointment, FTPLogs, Patient, Hospital
+from health_connector_base.patient_mapping import patient_rider_mapping
+from health_connector_base.ride_matching import RideMatcher
+from health_connector_base.smart_epic import (
+    JWTHelper,
+    SmartEpicClient,
+    location_fields,
+)
+from pydantic import ValidationError
+from pynamodb.exceptions import PutError, UpdateError
+from pydantic_models import Appointment as VeradigmAppointment
+import columnar as columnar_parser
+import sharding
+from error_report import ErrorReport
 central_tz = pytz.timezone("America/Chicago")
 utc_tz = pytz.utc
+
+
+def row_content_hash(fields: dict) -> str:
+    """
+    Stable hash of a row's appointment fields, stored on the appointment so
+    an identical row in a later file can be skipped.
+    """
+    encoded = json.dumps(fields, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+class VeradigmFilesError(Exception):
+    """
+    Raised after every file of an S3 event was attempted if any of them
+    failed, so Lambda retries the event.
+    """
+
+    def __init__(self, results: list) -> None:
+        self.results = results
+        failed = [result for result in results if result["status"] == "failed"]
+        super().__init__(
+            f"{len(failed)} of {len(results)} file(s) failed: "
+            + "; ".join(f"{result['file_key']}: {result['error']}" for result in failed)
+        )
+
+
 class AppointmentsMapperWithVia:
     """
     Returns the patient-rider mapping as a dictionary.
@@ -31,46 +84,22 @@ class AppointmentsMapperWithVia:
         self._connections = threading.local()
 
     def get_prior_period(self, hospital_id: str):
-        with contextlib.suppress(Settings.DoesNotExist):
-            return int(Settings.get(hospital_id, "prior_period").value) * 60
+        if (value := settings_cache.get_setting(hospital_id, "prior_period")) is not None:
+            return int(value) * 60
         return DIFF_MATCH_IN_SEC
 
     def get_subsequent_period(self, hospital_id: str):
-        with contextlib.suppress(Settings.DoesNotExist):
-            return int(Settings.get(hospital_id, "subsequent_period").value) * -60
+        if (value := settings_cache.get_setting(hospital_id, "subsequent_period")) is not None:
+            return int(value) * -60
         return -900
 
     def get_patient_mapping(self) -> dict:
         """
         Returns the patient-rider mapping as a dictionary.
         Returns:
-            dict: The patient-rider mapping.
+            dict: The patient-rider mapping, split by provider plus "all".
         """
-
-        return {
-            "epic": {
-                (patient.hospital_id, patient.patient_id): patient.via_rider_id
-                for patient in Patient.scan(
-                    filter_condition=(
-                        Patient.via_rider_id.exists() & (Patient.provider == "epic")
-                    )
-                )
-            },
-            "veradigm": {
-                (patient.hospital_id, patient.patient_id): patient.via_rider_id
-                for patient in Patient.scan(
-                    filter_condition=(
-                        Patient.via_rider_id.exists() & (Patient.provider == "veradigm")
-                    )
-                )
-            },
-            "all": {
-                (patient.hospital_id, patient.patient_id): patient.via_rider_id
-                for patient in Patient.scan(
-                    filter_condition=(Patient.via_rider_id.exists())
-                )
-            },
-        }
+        return patient_rider_mapping.get()
 
     def _get_jwt(self):
         """
@@ -90,7 +119,70 @@ class AppointmentsMapperWithVia:
         Returns:
             dict: The mapped participant details.
         """
-        return participant["actor"]["display"]["@value"]
+        return participant["actor"]["display"]
+
+    def get_ride_matcher(self, trips, hospital_id: str) -> RideMatcher:
+        """
+        Returns a RideMatcher over the rider's trips using the hospital's
+        prior/subsequent matching windows.
+        """
+        return RideMatcher(
+            trips,
+            prior_period=self.get_prior_period(hospital_id),
+            subsequent_period=self.get_subsequent_period(hospital_id),
+            location_diff=LOCATION_DIFF,
+        )
+
+    def trip_window(self, appointments: list, hospital_id: str) -> tuple:
+        """
+        Returns the (start, end) epoch seconds a trip's ETA must fall in to
+        match any of the appointments under the hospital's matching windows.
+        """
+        margin = max(
+            abs(self.get_prior_period(hospital_id)),
+            abs(self.get_subsequent_period(hospital_id)),
+        )
+        return (
+            int(min(appointment.start_time for appointment in appointments).timestamp()) - margin,
+            int(max(appointment.end_time for appointment in appointments).timestamp()) + margin,
+        )
+
+    def get_rider_trips(self, rider_id: str, appointments: list, hospital_id: str) -> list:
+        """
+        Returns the rider's Via trips that can match the appointments, from the
+        shared rider-keyed snapshot so each rider is fetched once per interval
+        across hospitals, populators and runs.
+        """
+        return trip_snapshots.get_rider_trips(rider_id, *self.trip_window(appointments, hospital_id))
+
+    def match_rides(self, appointments: list, trips, hospital_id: str) -> list:
+        """
+        Matches all of a rider's appointments against their trips in one pass,
+        using the coordinates stored on each appointment.
+
+        Args:
+            appointments (list): The rider's Appointment objects.
+            trips (Iterable[dict]): The rider's Via trips.
+            hospital_id (str): The hospital whose matching windows apply.
+
+        Returns:
+            list: A (to_ride, from_ride) pair per appointment, {} where unmatched.
+        """
+        matcher = self.get_ride_matcher(trips, hospital_id)
+        if not matcher.trips:
+            return [({}, {}) for _ in appointments]
+        rides = matcher.match(
+            [
+                (
+                    appointment.resolve_coordinates(),
+                    int(appointment.start_time.timestamp()),
+                    int(appointment.end_time.timestamp()),
+                )
+                for appointment in appointments
+            ]
+        )
+        print(f"Matched {len(appointments)} appointment(s) against {len(matcher.trips)} trip(s)")
+        return rides
 
     def get_matching_ride(
         self, address: str, trips: list, appointment_start_time: int, hospital_id: str
@@ -100,59 +192,9 @@ class AppointmentsMapperWithVia:
         closest to appointment_start_time and whose dropoff location is within
         LOCATION_DIFF km of the appointment address.
         """
-        print(f"Finding to-appointment ride for appointment at {address} with start time {appointment_start_time}")
-        match_ride = {}
-        best_diff = 1e9
-        prior_period = self.get_prior_period(hospital_id)
-        subsequent_period = self.get_subsequent_period(hospital_id)
-        for trip in trips:
-            print(f"Processing trip {trip['trip_id']}")
-
-            dropoff_eta = trip.get("dropoff_eta")
-            if dropoff_eta is None:
-                continue
-
-            cur_diff = int(appointment_start_time - dropoff_eta)
-
-            dropoff = trip.get("dropoff", {})
-            lat = dropoff.get("lat")
-            lng = dropoff.get("lng")
-            if lat is None or lng is None:
-                continue
-
-            pickup = trip.get("pickup", {})
-            pickup_lat = pickup.get("lat")
-            pickup_lng = pickup.get("lng")
-            if pickup_lat is None or pickup_lng is None:
-                continue
-
-            cur_location_diff_float = LocationManager().get_distance_from_address_coords(
-                address,
-                [lat, lng],
-            )
-            pickup_location_diff_float = LocationManager().get_distance_from_address_coords(
-                address,
-                [pickup_lat, pickup_lng],
-            )
-
-            # Ensure the ride is actually heading towards the hospital
-            if pickup_location_diff_float <= cur_location_diff_float:
-                print(f"Skipping trip {trip['trip_id']} as it is heading away from the hospital")
-                continue
-
-            cur_location_diff = int(cur_location_diff_float)
-
-            print(f"subsequent_period: {subsequent_period}, cur_diff: {cur_diff}, prior_period: {prior_period}")
-            print(f"cur_diff: {cur_diff}, cur_location_diff: {cur_location_diff}")
-            if (
-                subsequent_period <= cur_diff <= prior_period
-                and cur_location_diff <= LOCATION_DIFF
-            ):
-                if abs(cur_diff) < best_diff:
-                    best_diff = abs(cur_diff)
-                    match_ride = trip
-        print("Matched to-appointment ride:", match_ride)
-        return match_ride
+        return self.get_ride_matcher(trips, hospital_id).match_to_rides(
+            [(LocationManager().get_coordinates(address), appointment_start_time, None)]
+        )[0]
 
     def get_matching_return_ride(
         self, address: str, trips: list, appointment_end_time: int, hospital_id: str
@@ -162,63 +204,46 @@ class AppointmentsMapperWithVia:
         closest to appointment_end_time and whose pickup location is within
         LOCATION_DIFF km of the appointment address.
         """
-        print(f"Finding from-appointment ride for address: {address}, appointment_end_time: {appointment_end_time}, hospital_id: {hospital_id}")
-        match_ride = {}
-        best_diff = 1e9
-        prior_period = self.get_prior_period(hospital_id)
-        subsequent_period = self.get_subsequent_period(hospital_id)
-        for trip in trips:
-            print(f"Processing trip {trip['trip_id']}")
-
-            pickup_eta = trip.get("pickup_eta")
-            if pickup_eta is None:
-                continue
-
-            # Positive diff means pickup is after end_time (patient leaves after appt ends)
-            cur_diff = int(pickup_eta - appointment_end_time)
-
-            pickup = trip.get("pickup", {})
-            lat = pickup.get("lat")
-            lng = pickup.get("lng")
-            if lat is None or lng is None:
-                continue
-
-            dropoff = trip.get("dropoff", {})
-            dropoff_lat = dropoff.get("lat")
-            dropoff_lng = dropoff.get("lng")
-            if dropoff_lat is None or dropoff_lng is None:
-                continue
-
-            cur_location_diff_float = LocationManager().get_distance_from_address_coords(
-                address,
-                [lat, lng],
-            )
-            dropoff_location_diff_float = LocationManager().get_distance_from_address_coords(
-                address,
-                [dropoff_lat, dropoff_lng],
-            )
+        return self.get_ride_matcher(trips, hospital_id).match_from_rides(
+            [(LocationManager().get_coordinates(address), None, appointment_end_time)]
+        )[0]
 
-            # Ensure the ride is actually heading away from the hospital
-            if dropoff_location_diff_float <= cur_location_diff_float:
-                print(f"Skipping trip {trip['trip_id']} as it is heading towards the hospital")
-                continue
-
-            cur_location_diff = int(cur_location_diff_float)
+    def _build_ride(self, existing_ride: dict, new_to_ride: dict, new_from_ride: dict) -> dict:
+        """
+        Builds the two-leg ride, preserving driver/vehicle info when the matched
+        trip hasn't changed. Handles both the new structured format and legacy
+        flat-ride records.
+        """
+        new_to_ride = new_to_ride or VIA_RIDE_MOCK["to_appointment"]
+        new_from_ride = new_from_ride or VIA_RIDE_MOCK["from_appointment"]
+        existing_ride = existing_ride or {}
+        existing_to = existing_ride.get("to_appointment") or existing_ride or {}
+        existing_from = existing_ride.get("from_appointment") or {}
+
+        if (
+            existing_to.get("trip_id")
+            and new_to_ride.get("trip_id")
+            and existing_to["trip_id"] == new_to_ride["trip_id"]
+        ):
+            if "driver_info" not in new_to_ride and "driver_info" in existing_to:
+                new_to_ride["driver_info"] = existing_to["driver_info"]
+            if "vehicle_info" not in new_to_ride and "vehicle_info" in existing_to:
+                new_to_ride["vehicle_info"] = existing_to["vehicle_info"]
+
+        if (
+            existing_from.get("trip_id")
+            and new_from_ride.get("trip_id")
+            and existing_from["trip_id"] == new_from_ride["trip_id"]
+        ):
+            if "driver_info" not in new_from_ride and "driver_info" in existing_from:
+                new_from_ride["driver_info"] = existing_from["driver_info"]
+            if "vehicle_info" not in new_from_ride and "vehicle_info" in existing_from:
+                new_from_ride["vehicle_info"] = existing_from["vehicle_info"]
 
-            print(f"[return] subsequent_period: {subsequent_period}, cur_diff: {cur_diff}, prior_period: {prior_period}")
-            print(f"[return] cur_diff: {cur_diff}, cur_location_diff: {cur_location_diff}")
-            if (
-                subsequent_period <= cur_diff <= prior_period
-                and cur_location_diff <= LOCATION_DIFF
-            ):
-                if abs(cur_diff) < best_diff:
-                    best_diff = abs(cur_diff)
-                    match_ride = trip
-        print("Matched from-appointment ride:", match_ride)
-        return match_ride
+        return {"to_appointment": new_to_ride, "from_appointment": new_from_ride}
 
     def _map_participants_data(
-        self, appointment: dict, smart_client: SmartEpicClient
+        self, appointment: dict, smart_client: SmartEpicClient, included: dict | None = None
     ) -> dict:
         """
         Maps participant data from an appointment to a dictionary.
@@ -226,22 +251,18 @@ class AppointmentsMapperWithVia:
         Args:
             appointment (dict): The appointment data.
             smart_client (SmartEpicClient): The SmartEpicClient instance.
-            start_time (int): The start time of the appointment.
+            included (dict): Resources _include'd in the Bundle, keyed "Location/<id>" etc.
 
         Returns:
             dict: A dictionary containing mapped participant data.
         """
         result = {}
-        for participant in appointment["participant"]:
-            participant_type = participant["actor"]["reference"]["@value"].split("/")
-            if participant_type[0] == "Patient":
-                result["patient_name"] = participant["actor"]["display"]["@value"]
-                result["patient_id"] = participant_type[-1]
-            elif participant_type[0] == "Location":
-                if location_response := smart_client.get_location_data(
-                    participant_type[-1]
-                ):
-                    result["location"] = location_response
+        for patient_id in fhir.participant_ids(appointment, "Patient"):
+            result["patient_name"] = fhir.participant_display(appointment, "Patient")
+            result["patient_id"] = patient_id
+        for location_id in fhir.participant_ids(appointment, "Location"):
+            if location := smart_client.get_location(location_id, (included or {}).get(f"Location/{location_id}")):
+                result |= location_fields(location)
         return result
 
     def epic_with_via(self, patient_mapping: dict):
@@ -249,35 +270,27 @@ class AppointmentsMapperWithVia:
         appointment_objs = []
         for (hospital_id, patient_key), rider_id in patient_mapping["epic"].items():
             # trips = Via().get_trips(rider_id).get("trips")
-            if appointments := smart_client.get_appointments(patient_key):
-                for appointment in appointments["Bundle"]["entry"]:
+            if bundle := smart_client.get_appointments(patient_key, include=True):
+                appointments, included = bundle
+                for appointment in appointments:
                     try:
-                        appointment = appointment["resource"]["Appointment"]
-                        status = appointment["status"]["@value"]
-                        start_time = datetime.strptime(
-                            appointment["start"]["@value"], "%Y-%m-%dT%H:%M:%SZ"
-                        )
-                        end_time = datetime.strptime(
-                            appointment["end"]["@value"], "%Y-%m-%dT%H:%M:%SZ"
-                        )
-                        result = {
-                            "id": appointment["id"]["@value"],
-                            "status": status,
-                            "start_time": start_time,
-                            "end_time": end_time,
+                        result = fhir.appointment_fields(appointment) | {
                             "provider": "epic",
                             "hospital_id": hospital_id,
-                        } | self._map_participants_data(appointment, smart_client)
+                        } | self._map_participants_data(appointment, smart_client, included)
                         # result |= {
                         #     "ride": self.get_matching_ride(
                         #         result["location"], trips, int(start_time.timestamp()), hospital_id
                         #     )
                         #     or VIA_RIDE_MOCK
                         # }
-                        appointment_objs.append(Appointment(**result))
-                    except KeyError as e:
+                        appointment = Appointment(**result)
+                        appointment.resolve_coordinates()
+                        appointment_objs.append(appointment)
+                    except (KeyError, ValueError) as e:
                         print(e.args)
-        with Appointment.batch_write() as batch:
+        # Locations come straight from Epic, so skip per-row geocode validation
+        with AddressAttribute.validation("off"), Appointment.batch_write() as batch:
             for appointment in appointment_objs:
                 batch.save(appointment)
 
@@ -289,181 +302,650 @@ class AppointmentsMapperWithVia:
         return self._connections.connection
 
     def get_file_data(self, bucket_name: str, file_key: str):
+        """
+        Opens the S3 object as a text stream, so rows are read as they are
+        consumed instead of loading the whole file.
+
+        Returns:
+            tuple: (text stream, LastModified).
+        """
         response = self.s3_connection.get_object(Bucket=bucket_name, Key=file_key)
         return (
-            response["Body"].read().decode("utf-8").splitlines(),
+            codecs.getreader("utf-8-sig")(response["Body"]),
             response["LastModified"],
         )
 
-    def veradigm_with_via(self, patient_mapping: dict, file_key: str, bucket_name: str):
+    def _appointment_fields(self, app: VeradigmAppointment) -> dict:
+        location = f"{app.location_name},{app.location_street1},{app.location_street2},{app.location_city},{app.location_state},{app.location_zip}".replace(
+            ",,", ","
+        )
+        appointment_datetime = app.appointment_datetime.replace(tzinfo=central_tz).astimezone(utc_tz)
+        appointment_end_datetime = appointment_datetime + timedelta(minutes=app.appointment_duration)
+        return {
+            "id": app.appointment_id,
+            "patient_id": app.patient_number,
+            "patient_name": f"{app.patient_first_name} {app.patient_middle_initial} {app.patient_last_name}",
+            "location": location,
+            "start_time": appointment_datetime,
+            "end_time": appointment_end_datetime,
+            "status": app.status,
+        }
+
+    def _validate_row(self, line: int, row: dict, errors: ErrorReport) -> dict | None:
+        try:
+            return self._appointment_fields(VeradigmAppointment.model_validate(row))
+        except ValidationError as e:
+            errors.add(line, row, e.errors(include_url=False, include_context=False))
+        except OverflowError as e:
+            errors.add(line, row, [{"type": "overflow", "msg": str(e)}])
+
+    def iter_veradigm_rows(self, reader: csv.DictReader, errors: ErrorReport, columnar: bool = VERADIGM_COLUMNAR):
+        """
+        Yields the Appointment fields of every valid row, sending the rest to
+        the error report.
+
+        With columnar, each chunk is first parsed column-wise by the numpy
+        fast path; only rows it rejects go through full pydantic validation.
+        """
+        if not columnar:
+            for row in reader:
+                if fields := self._validate_row(reader.line_num, row, errors):
+                    yield fields
+            return
+
+        rows = ((reader.line_num, row) for row in reader)
+        while chunk := list(islice(rows, VERADIGM_CHUNK_SIZE)):
+            parsed = columnar_parser.parse_rows([row for _, row in chunk])
+            for (line, row), fields in zip(chunk, parsed):
+                if fields is None:
+                    fields = self._validate_row(line, row, errors)
+                if fields:
+                    yield fields
+
+    def _to_appointment(self, fields: dict, hospital_id: str) -> Appointment:
+        appointment = Appointment(
+            **fields,
+            provider="veradigm",
+            ride=VIA_RIDE_MOCK,
+            hospital_id=hospital_id,
+        )
+        # One cached geocode per distinct address; stored so matching never geocodes again
+        appointment.resolve_coordinates()
+        return appointment
+
+    def _write_veradigm_chunk(
+        self, appointments: list, patient_mapping: dict, hospital_id: str, patients: dict | None = None
+    ):
+        """
+        Matches rides for one chunk of appointments, then writes them and the
+        patients they mention. Given a patients dict, the patients are
+        collected into it instead, to be upserted once later.
+        """
+        appointments_by_patient = defaultdict(list)
+        for appointment in appointments:
+            appointments_by_patient[appointment.patient_id].append(appointment)
+
+        # Match every patient's appointments against their trips in one pass
+        for patient_number, patient_appointments in appointments_by_patient.items():
+            if rider_id := patient_mapping["veradigm"].get((hospital_id, patient_number)):
+                trips = self.get_rider_trips(rider_id, patient_appointments, hospital_id)
+                rides = self.match_rides(patient_appointments, trips, hospital_id)
+                for appointment, (to_ride, from_ride) in zip(patient_appointments, rides):
+                    appointment.ride = self._build_ride({}, to_ride, from_ride)
+
+        new_patients = {}
+        # Trusted bulk ingestion: rows are not geocoded one by one before writing
+        with AddressAttribute.validation("off"), Appointment.batch_write() as batch:
+            for appointment in appointments:
+                new_patients[appointment.patient_id] = appointment.patient_name
+                batch.save(appointment)
+        if patients is None:
+            self.upsert_veradigm_patients(new_patients, hospital_id)
+        else:
+            patients.update(new_patients)
+
+    def get_patients(self, hospital_id: str, patient_ids: list) -> dict:
+        """
+        Reads the hospital's existing patients with BatchGetItem, in chunks of
+        PATIENT_BATCH_GET_SIZE keys read VERADIGM_PATIENT_READ_CONCURRENCY at
+        a time.
+
+        Returns:
+            dict: patient_id -> Patient, for the ids that exist.
+        """
+        keys = [(hospital_id, patient_id) for patient_id in patient_ids]
+        chunks = [keys[i:i + PATIENT_BATCH_GET_SIZE] for i in range(0, len(keys), PATIENT_BATCH_GET_SIZE)]
+        if not chunks:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(chunks), VERADIGM_PATIENT_READ_CONCURRENCY)) as executor:
+            results = list(executor.map(lambda chunk: list(Patient.batch_get(chunk)), chunks))
+        return {patient.patient_id: patient for result in results for patient in result}
+
+    def upsert_veradigm_patients(self, patients: dict, hospital_id: str):
+        """
+        Creates missing patients and renames changed ones; patients whose
+        name is unchanged are not written.
+
+        Args:
+            patients (dict): patient_id -> name.
+        """
+        existing = self.get_patients(hospital_id, list(patients))
+        written = 0
+        with Patient.batch_write() as batch:
+            for patient_id, patient_name in patients.items():
+                patient = existing.get(patient_id)
+                if patient is None:
+                    patient = Patient(
+                        name=patient_name,
+                        patient_id=patient_id,
+                        provider="veradigm",
+                        hospital_id=hospital_id,
+                    )
+                elif patient.name != patient_name:
+                    patient.name = patient_name
+                else:
+                    continue
+                # Batch writes skip BaseModel.save(), which keeps modified
+                # current for the incremental patient mapping refresh
+                patient.modified = datetime.now(timezone.utc)
+                batch.save(patient)
+                written += 1
+        print(f"Upserted {written} of {len(patients)} patient(s) for hospital {hospital_id}")
+
+    def ingest_veradigm_rows(
+        self,
+        reader: csv.DictReader,
+        errors: ErrorReport,
+        patient_mapping: dict,
+        hospital_id: str,
+        patients: dict | None = None,
+    ) -> tuple:
+        """
+        Validates, matches and writes the reader's rows in chunks of
+        VERADIGM_CHUNK_SIZE. Rows whose content hash matches the stored
+        appointment are skipped before geocoding and ride matching. See
+        _write_veradigm_chunk for patients.
+
+        Returns:
+            tuple: (rows written, rows skipped as unchanged).
+        """
+        rows_ingested = rows_skipped = 0
+        rows = self.iter_veradigm_rows(reader, errors)
+        while chunk := list(islice(rows, VERADIGM_CHUNK_SIZE)):
+            changed = self._changed_rows(chunk, hospital_id)
+            rows_skipped += len(chunk) - len(changed)
+            if changed:
+                appointments = [self._to_appointment(fields, hospital_id) for fields in changed]
+                self._write_veradigm_chunk(appointments, patient_mapping, hospital_id, patients)
+                rows_ingested += len(changed)
+        return rows_ingested, rows_skipped
+
+    def _changed_rows(self, chunk: list, hospital_id: str) -> list:
+        """
+        Adds content_hash to each row's fields and returns the rows whose
+        stored appointment has a different (or no) hash.
+        """
+        chunk = [fields | {"content_hash": row_content_hash(fields)} for fields in chunk]
+        if not VERADIGM_SKIP_UNCHANGED:
+            return chunk
+        keys = {(hospital_id, fields["id"]) for fields in chunk}
+        stored = {
+            appointment.id: appointment.content_hash
+            for appointment in Appointment.batch_get(keys, attributes_to_get=["id", "content_hash"])
+        }
+        return [fields for fields in chunk if stored.get(fields["id"]) != fields["content_hash"]]
+
+    def find_ingested_copy(self, hospital_id: str, etag: str) -> FTPLogs | None:
+        """
+        Returns a fully ingested earlier file of the hospital with this ETag,
+        reading only the hospital's files with that ETag from the etag index.
+        """
+        for log in FTPLogs.etag_index.query(
+            hospital_id,
+            range_key_condition=FTPLogs.etag == etag,
+            filter_condition=FTPLogs.rows_ingested.exists(),
+        ):
+            return log
+        return None
+
+    def get_veradigm_hospital_id(self, file_key: str) -> str | None:
         if "/" not in file_key:
             print(f"Skipping file {file_key} as it is not in a subfolder")
-            return
+            return None
 
         subfolder = file_key.split("/")[0]
-        hospital_id = None
-        for hospital in Hospital.scan(Hospital.s3_subfolder_name == subfolder):
-            hospital_id = hospital.id
-            break
+        if hospital := hospital_directory.by_s3_subfolder(subfolder):
+            return hospital.id
+
+        print(f"No hospital found for subfolder {subfolder}")
+        return None
 
+    def veradigm_with_via(self, patient_mapping: dict, file_key: str, bucket_name: str):
+        """
+        Ingests a Veradigm CSV as a stream, in chunks of VERADIGM_CHUNK_SIZE
+        rows, so memory stays flat regardless of file size. Invalid rows are
+        skipped and reported in {file_key}.errors.jsonl next to the file.
+
+        Files larger than VERADIGM_SHARD_THRESHOLD are split into byte-range
+        shards processed in parallel, see shard_veradigm_file.
+        """
+        hospital_id = self.get_veradigm_hospital_id(file_key)
         if not hospital_id:
-            print(f"No hospital found for subfolder {subfolder}")
             return
 
-        data, last_modified = self.get_file_data(bucket_name, file_key)
-        reader = csv.DictReader(data, delimiter=",")
-        apps = AppointmentsList(appointments=reader)
-        new_patients = {}
-        patient_trips = {}
-        with Appointment.batch_write() as batch:
-            for app in apps.appointments:
-                trips = patient_trips.get(app.patient_number, {})
-                rider_id = patient_mapping["veradigm"].get((hospital_id, app.patient_number))
-                if (
-                    rider_id
-                    and not trips
-                    and not patient_trips.get(app.patient_number)
-                ):
-                    trips = Via().get_trips(rider_id)
-                    patient_trips[app.patient_number] = trips
-                location = f"{app.location_name},{app.location_street1},{app.location_street2},{app.location_city},{app.location_state},{app.location_zip}".replace(
-                    ",,", ","
-                )
-                appointment_datetime = app.appointment_datetime.replace(tzinfo=central_tz).astimezone(utc_tz)
-                appointment_end_datetime = appointment_datetime + timedelta(minutes=app.appointment_duration)
-                trip_list = trips.get("trips", [])
-                to_ride = (
-                    self.get_matching_ride(
-                        location,
-                        trip_list,
-                        int(appointment_datetime.timestamp()),
-                        hospital_id,
-                    )
-                    or VIA_RIDE_MOCK["to_appointment"]
-                )
-                from_ride = (
-                    self.get_matching_return_ride(
-                        location,
-                        trip_list,
-                        int(appointment_end_datetime.timestamp()),
-                        hospital_id,
-                    )
-                    or VIA_RIDE_MOCK["from_appointment"]
-                )
-                appointment = Appointment(
-                    id=app.appointment_id,
-                    patient_id=app.patient_number,
-                    patient_name=f"{app.patient_first_name} {app.patient_middle_initial} {app.patient_last_name}",
-                    location=location,
-                    start_time=appointment_datetime,
-                    end_time=appointment_end_datetime,
-                    status=app.status,
-                    provider="veradigm",
-                    ride={"to_appointment": to_ride, "from_appointment": from_ride},
+        head = self.s3_connection.head_object(Bucket=bucket_name, Key=file_key)
+        etag = head["ETag"].strip('"')
+        if VERADIGM_SKIP_UNCHANGED and (copy := self.find_ingested_copy(hospital_id, etag)):
+            print(f"Skipping {file_key}: same content as {copy.name} (ETag {etag})")
+            if copy.name != file_key:
+                FTPLogs(
+                    name=file_key,
+                    server_last_modified=int(head["LastModified"].timestamp()),
                     hospital_id=hospital_id,
-                )
-                new_patients[appointment.patient_id] = appointment.patient_name
-                batch.save(appointment)
+                    etag=etag,
+                    duplicate_of=copy.name,
+                    rows_ingested=0,
+                    rows_failed=copy.rows_failed,
+                    rows_skipped=(copy.rows_ingested or 0) + (copy.rows_skipped or 0),
+                ).save()
+            return
+
+        if head["ContentLength"] > VERADIGM_SHARD_THRESHOLD:
+            return self.shard_veradigm_file(
+                patient_mapping, file_key, bucket_name, hospital_id, head
+            )
+
+        data, last_modified = self.get_file_data(bucket_name, file_key)
+        header = data.readline()
+        reader = csv.DictReader(
+            chain([header], data), delimiter=columnar_parser.detect_delimiter(header)
+        )
+        with ErrorReport(self.s3_connection, bucket_name, f"{file_key}.errors.jsonl") as errors:
+            rows_ingested, rows_skipped = self.ingest_veradigm_rows(
+                reader, errors, patient_mapping, hospital_id
+            )
+
+        print(
+            f"Ingested {rows_ingested} row(s) from {file_key}, "
+            f"{rows_skipped} unchanged, {errors.count} invalid"
+        )
         with FTPLogs.batch_write() as batch:
             batch.save(
                 FTPLogs(
-                    name=file_key, server_last_modified=int(last_modified.timestamp()), hospital_id=hospital_id
+                    name=file_key,
+                    server_last_modified=int(last_modified.timestamp()),
+                    hospital_id=hospital_id,
+                    rows_ingested=rows_ingested,
+                    rows_failed=errors.count,
+                    rows_skipped=rows_skipped,
+                    error_report_key=errors.key if errors.count else None,
+                    etag=etag,
                 )
             )
-        with Patient.batch_write() as batch:
-            for patient_id, patient_name in new_patients.items():
+
+    def shard_veradigm_file(
+        self, patient_mapping: dict, file_key: str, bucket_name: str, hospital_id: str, head: dict
+    ):
+        """
+        Splits the file into byte ranges of VERADIGM_SHARD_SIZE and hands one
+        "veradigm_shard" event per range to the shard dispatcher. The FTPLogs
+        row tracks progress until the last shard merges the results.
+        """
+        header, data_start = sharding.read_header(self.s3_connection, bucket_name, file_key)
+        shards = sharding.plan_shards(head["ContentLength"], data_start, VERADIGM_SHARD_SIZE)
+        etag = head["ETag"].strip('"')
+        try:
+            # A retried S3 event must not restart shards that are still running
+            FTPLogs(
+                name=file_key,
+                server_last_modified=int(head["LastModified"].timestamp()),
+                hospital_id=hospital_id,
+                etag=etag,
+                shards_total=len(shards),
+                shard_status="sharded",
+            ).save(
+                condition=FTPLogs.name.does_not_exist()
+                | (FTPLogs.etag != etag)
+                | FTPLogs.shard_status.does_not_exist()
+                | (FTPLogs.shard_status == "failed")
+            )
+        except PutError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            print(f"Skipping {file_key}: its shards are already running")
+            return
+        print(f"Splitting {file_key} ({head['ContentLength']} bytes) into {len(shards)} shard(s)")
+
+        events = [
+            {
+                "action": "veradigm_shard",
+                "bucket_name": bucket_name,
+                "file_key": file_key,
+                "hospital_id": hospital_id,
+                "header": header,
+                "shard": shard,
+                "start": start,
+                "end": end,
+            }
+            for shard, (start, end) in enumerate(shards)
+        ]
+        dispatcher = sharding.get_shard_dispatcher(
+            lambda event: self.process_veradigm_shard(event, patient_mapping)
+        )
+        dispatcher.dispatch(events)
+
+    def process_veradigm_shard(self, event: dict, patient_mapping: dict):
+        """
+        Ingests the rows starting inside one shard's byte range, stores its
+        counts and patients under sharding.shard_prefix and adds the shard to
+        the FTPLogs row's shards_completed. The shard that completes the set
+        merges every shard's results.
+
+        A failing shard is recorded in shards_failed and marks the row
+        "failed", then raises so the invocation is retried; a successful
+        retry clears it again. Retries are idempotent: a shard id is only
+        counted once and the merge is claimed by a single shard.
+        """
+        bucket_name, file_key = event["bucket_name"], event["file_key"]
+        hospital_id, shard, header = event["hospital_id"], event["shard"], event["header"]
+        prefix = sharding.shard_prefix(file_key, shard)
+        log = FTPLogs(hospital_id=hospital_id, name=file_key)
+
+        try:
+            lines = sharding.iter_shard_lines(
+                self.s3_connection, bucket_name, file_key, event["start"], event["end"]
+            )
+            reader = csv.DictReader(
+                chain([header], lines), delimiter=columnar_parser.detect_delimiter(header)
+            )
+            # Line numbers in a shard's report count from the start of that shard
+            with ErrorReport(
+                self.s3_connection, bucket_name, f"{prefix}.errors.jsonl", context={"shard": shard}
+            ) as errors:
+                patients = {}
+                rows_ingested, rows_skipped = self.ingest_veradigm_rows(
+                    reader, errors, patient_mapping, hospital_id, patients
+                )
+            self.s3_connection.put_object(
+                Bucket=bucket_name,
+                Key=f"{prefix}.json",
+                Body=json.dumps(
+                    {
+                        "rows_ingested": rows_ingested,
+                        "rows_failed": errors.count,
+                        "rows_skipped": rows_skipped,
+                        "patients": patients,
+                    }
+                ),
+            )
+        except Exception:
+            print(f"Shard {shard} of {file_key} failed")
+            # Best effort: the shard's own error is what the invocation raises
+            try:
+                log.update(
+                    actions=[
+                        FTPLogs.shards_failed.add({str(shard)}),
+                        FTPLogs.shard_status.set("failed"),
+                    ],
+                    condition=FTPLogs.shards_total.exists(),
+                )
+            except Exception as e:
+                print(f"Could not mark shard {shard} of {file_key} failed: {e}")
+            raise
+        print(
+            f"Shard {shard} of {file_key}: ingested {rows_ingested} row(s), "
+            f"{rows_skipped} unchanged, {errors.count} invalid"
+        )
+
+        log.update(
+            actions=[
+                FTPLogs.shards_completed.add({str(shard)}),
+                FTPLogs.shards_failed.delete({str(shard)}),
+            ],
+            condition=FTPLogs.shards_total.exists(),
+        )
+        if len(log.shards_completed) == log.shards_total and self.claim_shard_merge(log):
+            try:
+                self.merge_veradigm_shards(log, bucket_name)
+            except Exception:
+                print(f"Merging the shards of {file_key} failed")
                 try:
-                    patient = Patient.get(hospital_id, patient_id)
-                    if patient.name != patient_name:
-                        patient.name = patient_name
-                        batch.save(patient)
-                except Patient.DoesNotExist:
-                    batch.save(
-                        Patient(
-                            name=patient_name,
-                            patient_id=patient_id,
-                            provider="veradigm",
-                            hospital_id=hospital_id,
-                        )
+                    log.update(actions=[FTPLogs.shard_status.set("failed")])
+                except Exception as e:
+                    print(f"Could not mark {file_key} failed: {e}")
+                raise
+
+    def claim_shard_merge(self, log: FTPLogs) -> bool:
+        """
+        Moves the FTPLogs row to "merging" unless another shard (or an
+        earlier attempt of this one) already merged or is merging.
+        """
+        try:
+            log.update(
+                actions=[FTPLogs.shard_status.set("merging")],
+                condition=FTPLogs.shard_status.is_in("sharded", "failed"),
+            )
+        except UpdateError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            print(f"Shards of {log.name} already merged or merging")
+            return False
+        return True
+
+    def merge_veradigm_shards(self, log: FTPLogs, bucket_name: str):
+        """
+        Upserts the patients of all shards once, sums the shard counts into
+        the FTPLogs row, concatenates the shard error reports into
+        {file_key}.errors.jsonl and deletes the shard objects.
+        """
+        file_key = log.name
+        rows_ingested = rows_skipped = 0
+        patients = {}
+        shard_keys = []
+        with ErrorReport(self.s3_connection, bucket_name, f"{file_key}.errors.jsonl") as errors:
+            for shard in range(log.shards_total):
+                prefix = sharding.shard_prefix(file_key, shard)
+                response = self.s3_connection.get_object(Bucket=bucket_name, Key=f"{prefix}.json")
+                result = json.loads(response["Body"].read())
+                rows_ingested += result["rows_ingested"]
+                rows_skipped += result["rows_skipped"]
+                patients.update(result["patients"])
+                shard_keys.append(f"{prefix}.json")
+                if result["rows_failed"]:
+                    response = self.s3_connection.get_object(
+                        Bucket=bucket_name, Key=f"{prefix}.errors.jsonl"
                     )
+                    errors.extend(response["Body"], result["rows_failed"])
+                    shard_keys.append(f"{prefix}.errors.jsonl")
+
+        self.upsert_veradigm_patients(patients, log.hospital_id)
+        log.update(
+            actions=[
+                FTPLogs.rows_ingested.set(rows_ingested),
+                FTPLogs.rows_failed.set(errors.count),
+                FTPLogs.rows_skipped.set(rows_skipped),
+                FTPLogs.error_report_key.set(errors.key) if errors.count else FTPLogs.error_report_key.remove(),
+                FTPLogs.shard_status.remove(),
+            ]
+        )
+        self.s3_connection.delete_objects(
+            Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in shard_keys]}
+        )
+        print(
+            f"Ingested {rows_ingested} row(s) from {file_key} in {log.shards_total} shard(s), "
+            f"{rows_skipped} unchanged, {errors.count} invalid"
+        )
+
+    def rematch_appointments(self, appointments, rider_mapping: dict) -> list:
+        """
+        Re-matches rides for the given appointments, batching each patient's
+        appointments against their trips.
+
+        Args:
+            appointments (Iterable[Appointment]): Upcoming booked appointments.
+            rider_mapping (dict): (hospital_id, patient_id) -> via_rider_id.
+
+        Returns:
+            list: The appointments with a linked rider, with ride updated.
+        """
+        grouped = defaultdict(list)
+        for appointment in appointments:
+            hospital_id = getattr(appointment, "hospital_id", None)
+            if rider_mapping.get((hospital_id, appointment.patient_id)):
+                grouped[(hospital_id, appointment.patient_id)].append(appointment)
 
-    def process_all(self, patient_mapping):
-        print("Processing all appointments")
-        patient_trips = {}
         appointment_objs = []
-        for appointment in Appointment.scan(
-            filter_condition=(Appointment.end_time >= datetime.now(timezone.utc))
-            & (Appointment.status == "Booked")
-        ):
-            hospital_id = getattr(appointment, 'hospital_id', None)
-            if rider_id := patient_mapping["all"].get((hospital_id, appointment.patient_id)):
-                print("rider_id:",rider_id)
-                start_time = int(appointment.start_time.timestamp())
-                trips = patient_trips.get(appointment.patient_id)
-                if trips is None:
-                    trips = Via().get_trips(rider_id)
-                    patient_trips[appointment.patient_id] = trips
-                end_time = int(appointment.end_time.timestamp())
-                trip_list = trips.get("trips", [])
-                existing_ride = getattr(appointment, "ride", {}) or {}
-
-                new_to_ride = (
-                    self.get_matching_ride(
-                        appointment.location, trip_list, start_time, hospital_id
-                    )
-                    or VIA_RIDE_MOCK["to_appointment"]
+        for (hospital_id, patient_id), patient_appointments in grouped.items():
+            rider_id = rider_mapping[(hospital_id, patient_id)]
+            print("rider_id:", rider_id)
+            trips = self.get_rider_trips(rider_id, patient_appointments, hospital_id)
+            rides = self.match_rides(patient_appointments, trips, hospital_id)
+            for appointment, (new_to_ride, new_from_ride) in zip(patient_appointments, rides):
+                appointment.ride = self._build_ride(
+                    getattr(appointment, "ride", {}), new_to_ride, new_from_ride
                 )
-                new_from_ride = (
-                    self.get_matching_return_ride(
-                        appointment.location, trip_list, end_time, hospital_id
-                    )
-                    or VIA_RIDE_MOCK["from_appointment"]
+                appointment_objs.append(appointment)
+        return appointment_objs
+
+    def get_upcoming_appointments(self, rider_mapping: dict) -> list:
+        """
+        Returns the upcoming Booked appointments of every hospital with a
+        Via-linked patient, querying the sparse booked index per hospital
+        concurrently.
+
+        Args:
+            rider_mapping (dict): (hospital_id, patient_id) -> via_rider_id.
+
+        Returns:
+            list: Appointments with end_time >= now and status Booked.
+        """
+        hospital_ids = sorted({hospital_id for hospital_id, _ in rider_mapping})
+        if not hospital_ids:
+            return []
+        now = datetime.now(timezone.utc)
+
+        def query(hospital_id):
+            return list(
+                Appointment.booked_appointments.query(
+                    hospital_id, range_key_condition=Appointment.end_time >= now
                 )
+            )
 
-                # Preserve driver/vehicle info when the matched trip hasn't changed.
-                # Handle both the new structured format and legacy flat-ride records.
-                existing_to = existing_ride.get("to_appointment") or existing_ride or {}
-                existing_from = existing_ride.get("from_appointment") or {}
-
-                if (
-                    existing_to.get("trip_id")
-                    and new_to_ride.get("trip_id")
-                    and existing_to["trip_id"] == new_to_ride["trip_id"]
-                ):
-                    if "driver_info" not in new_to_ride and "driver_info" in existing_to:
-                        new_to_ride["driver_info"] = existing_to["driver_info"]
-                    if "vehicle_info" not in new_to_ride and "vehicle_info" in existing_to:
-                        new_to_ride["vehicle_info"] = existing_to["vehicle_info"]
-
-                if (
-                    existing_from.get("trip_id")
-                    and new_from_ride.get("trip_id")
-                    and existing_from["trip_id"] == new_from_ride["trip_id"]
-                ):
-                    if "driver_info" not in new_from_ride and "driver_info" in existing_from:
-                        new_from_ride["driver_info"] = existing_from["driver_info"]
-                    if "vehicle_info" not in new_from_ride and "vehicle_info" in existing_from:
-                        new_from_ride["vehicle_info"] = existing_from["vehicle_info"]
-
-                appointment.ride = {
-                    "to_appointment": new_to_ride,
-                    "from_appointment": new_from_ride,
-                }
-                appointment_objs.append(appointment)
+        with ThreadPoolExecutor(max_workers=min(len(hospital_ids), 8)) as executor:
+            return [
+                appointment
+                for appointments in executor.map(query, hospital_ids)
+                for appointment in appointments
+            ]
+
+    def process_all(self, patient_mapping):
+        print("Processing all appointments")
+        appointment_objs = self.rematch_appointments(
+            self.get_upcoming_appointments(patient_mapping["all"]),
+            patient_mapping["all"],
+        )
         with Appointment.batch_write() as batch:
             for appointment in appointment_objs:
                 batch.save(appointment)
 
+    def backfill_coordinates(self):
+        """
+        Stores latitude/longitude/geohash on hospitals and appointments written
+        before they were resolved at ingest.
+        Invoke with the event {"action": "backfill_coordinates"}.
+        """
+        for model in (Hospital, Appointment):
+            updated = 0
+            with AddressAttribute.validation("off"), model.batch_write() as batch:
+                for obj in model.scan(filter_condition=model.latitude.does_not_exist()):
+                    if obj.resolve_coordinates():
+                        batch.save(obj)
+                        updated += 1
+            print(f"Backfilled coordinates on {updated} {model.__name__} row(s)")
+
+    def backfill_booked_appointments(self):
+        """
+        Sets booked_hospital_id on Booked appointments written before the
+        booked index existed, so upcoming-ride matching sees them.
+        Invoke with the event {"action": "backfill_booked_appointments"}.
+        """
+        updated = 0
+        with AddressAttribute.validation("off"), Appointment.batch_write() as batch:
+            for appointment in Appointment.scan(
+                filter_condition=(Appointment.status == "Booked")
+                & Appointment.booked_hospital_id.does_not_exist()
+            ):
+                batch.save(appointment)
+                updated += 1
+        print(f"Backfilled booked_hospital_id on {updated} Appointment row(s)")
+
+    def backfill_rider_links(self):
+        """
+        Sets rider_linked on Via-linked patients written before the
+        rider_linked index existed, so the patient mapping sees them.
+        Invoke with the event {"action": "backfill_rider_links"}.
+        """
+        updated = 0
+        with Patient.batch_write() as batch:
+            for patient in Patient.scan(
+                filter_condition=Patient.via_rider_id.exists()
+                & (Patient.via_rider_id != "")
+                & Patient.rider_linked.does_not_exist()
+            ):
+                patient.modified = datetime.now(timezone.utc)
+                batch.save(patient)
+                updated += 1
+        print(f"Backfilled rider_linked on {updated} Patient row(s)")
+
+    def _process_record(self, record: dict, patient_mapping: dict) -> dict:
+        s3_event = record["s3"]
+        bucket_name = s3_event["bucket"]["name"]
+        # Keys arrive URL-encoded in S3 notifications
+        file_key = unquote_plus(s3_event["object"]["key"])
+        result = {"bucket_name": bucket_name, "file_key": file_key}
+        try:
+            self.veradigm_with_via(patient_mapping, bucket_name=bucket_name, file_key=file_key)
+        except Exception as e:
+            traceback.print_exc()
+            return result | {"status": "failed", "error": str(e)}
+        return result | {"status": "succeeded"}
+
+    def process_records(self, records: list, patient_mapping: dict) -> dict:
+        """
+        Ingests every file of an S3 event on a pool of
+        VERADIGM_FILE_CONCURRENCY workers, sharing one patient mapping (and
+        the process-wide trip snapshots). A failing file does not stop the
+        others, but fails the invocation once they are done: Lambda retries
+        the whole event, and the files that succeeded are skipped as
+        already ingested by their ETag.
+
+        Returns:
+            dict: {"files": [...]} with one status per record, in order.
+
+        Raises:
+            VeradigmFilesError: If any file failed.
+        """
+        with ThreadPoolExecutor(max_workers=min(len(records), VERADIGM_FILE_CONCURRENCY)) as executor:
+            results = list(executor.map(lambda record: self._process_record(record, patient_mapping), records))
+        failed = [result["file_key"] for result in results if result["status"] == "failed"]
+        print(f"Processed {len(results)} file(s), {len(failed)} failed: {failed}")
+        if failed:
+            raise VeradigmFilesError(results)
+        return {"files": results}
+
     def __call__(self, event, context, *args, **kwargs):
+        if event.get("action") == "backfill_coordinates":
+            return self.backfill_coordinates()
+        if event.get("action") == "backfill_rider_links":
+            return self.backfill_rider_links()
+        if event.get("action") == "backfill_booked_appointments":
+            return self.backfill_booked_appointments()
         patient_mapping = self.get_patient_mapping()
+        if event.get("action") == "veradigm_shard":
+            return self.process_veradigm_shard(event, patient_mapping)
         if records := event.get("Records", []):
-            s3_event = records[0]["s3"]
-            bucket_name = s3_event["bucket"]["name"]
-            file_key = s3_event["object"]["key"]
             # Veradigm pushes SFTP
-            self.veradigm_with_via(
-                patient_mapping, bucket_name=bucket_name, file_key=file_key
-            )
+            return self.process_records(records, patient_mapping)
         elif detail_type := event.get("detail-type", ""):
             if detail_type == "Scheduled Event":
                 self.epic_with_via(patient_mapping)
@@ -473,64 +955,10 @@ class AppointmentsMapperWithVia:
 class AppointmentsMapperWithViaMock(AppointmentsMapperWithVia):
 
     def epic_with_via(self, patient_mapping):
-        patient_trips = {}
-        appointment_objs = []
-        for appointment in Appointment.scan(
-            filter_condition=(Appointment.end_time >= datetime.now(timezone.utc))
-            & (Appointment.status == "Booked")
-        ):
-            hospital_id = getattr(appointment, 'hospital_id', None)
-            if rider_id := patient_mapping["epic"].get((hospital_id, appointment.patient_id)):
-                start_time = int(appointment.start_time.timestamp())
-                end_time = int(appointment.end_time.timestamp())
-                trips = patient_trips.get(appointment.patient_id)
-                if trips is None:
-                    trips = Via().get_trips(rider_id)
-                    patient_trips[appointment.patient_id] = trips
-                trip_list = trips.get("trips", [])
-                existing_ride = getattr(appointment, "ride", {}) or {}
-
-                new_to_ride = (
-                    self.get_matching_ride(
-                        appointment.location, trip_list, start_time, hospital_id
-                    )
-                    or VIA_RIDE_MOCK["to_appointment"]
-                )
-                new_from_ride = (
-                    self.get_matching_return_ride(
-                        appointment.location, trip_list, end_time, hospital_id
-                    )
-                    or VIA_RIDE_MOCK["from_appointment"]
-                )
-
-                existing_to = existing_ride.get("to_appointment") or existing_ride or {}
-                existing_from = existing_ride.get("from_appointment") or {}
-
-                if (
-                    existing_to.get("trip_id")
-                    and new_to_ride.get("trip_id")
-                    and existing_to["trip_id"] == new_to_ride["trip_id"]
-                ):
-                    if "driver_info" not in new_to_ride and "driver_info" in existing_to:
-                        new_to_ride["driver_info"] = existing_to["driver_info"]
-                    if "vehicle_info" not in new_to_ride and "vehicle_info" in existing_to:
-                        new_to_ride["vehicle_info"] = existing_to["vehicle_info"]
-
-                if (
-                    existing_from.get("trip_id")
-                    and new_from_ride.get("trip_id")
-                    and existing_from["trip_id"] == new_from_ride["trip_id"]
-                ):
-                    if "driver_info" not in new_from_ride and "driver_info" in existing_from:
-                        new_from_ride["driver_info"] = existing_from["driver_info"]
-                    if "vehicle_info" not in new_from_ride and "vehicle_info" in existing_from:
-                        new_from_ride["vehicle_info"] = existing_from["vehicle_info"]
-
-                appointment.ride = {
-                    "to_appointment": new_to_ride,
-                    "from_appointment": new_from_ride,
-                }
-                appointment_objs.append(appointment)
+        appointment_objs = self.rematch_appointments(
+            self.get_upcoming_appointments(patient_mapping["epic"]),
+            patient_mapping["epic"],
+        )
         with Appointment.batch_write() as batch:
             for appointment in appointment_objs:
                 batch.save(appointment)
@@ -538,10 +966,15 @@ class AppointmentsMapperWithViaMock(AppointmentsMapperWithVia):
 
 def data_populator(event, context, **kwargs):
     print(event, context)
-    if MOCK_DATA:
-        AppointmentsMapperWithViaMock()(event, context)
-    else:
-        AppointmentsMapperWithVia()(event, context)
+    try:
+        if MOCK_DATA:
+            AppointmentsMapperWithViaMock()(event, context)
+        else:
+            AppointmentsMapperWithVia()(event, context)
+    finally:
+        print("Geocode cache stats:", LocationManager.cache_stats())
+        print("HTTP client stats:", http_client.stats())
+        print("Trip snapshot stats:", trip_snapshots.snapshot_stats())
 
 
 if __name__ == "__main__":
@@ -34,7 +34,7 @@ class Appointment(BaseModel):
         try:
             # Attempt to parse the datetime string
             return datetime.strptime(v, "%Y%m%d_%H%M%S")
-        except ValueError as e:
+        except (TypeError, ValueError) as e:
             raise ValueError(
                 "Invalid datetime format. Should be YYYYMMDD_HHMMSS"
             ) from e
@@ -0,0 +1,146 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from health_connector_base.constants import (
+    VERADIGM_MAX_LINE_BYTES,
+    VERADIGM_SHARD_DISPATCH,
+    VERADIGM_SHARD_PREFIX,
+)
+
+HEADER_PROBE_BYTES = 64 * 1024
+READ_BYTES = 1024 * 1024
+
+
+def read_header(s3_client, bucket_name: str, file_key: str) -> tuple:
+    """
+    Returns (header line, byte offset where the first data row starts).
+    """
+    response = s3_client.get_object(
+        Bucket=bucket_name, Key=file_key, Range=f"bytes=0-{HEADER_PROBE_BYTES - 1}"
+    )
+    probe = response["Body"].read()
+    if (newline := probe.find(b"\n")) < 0:
+        raise ValueError(f"No header line in the first {HEADER_PROBE_BYTES} bytes of {file_key}")
+    return probe[: newline + 1].decode("utf-8-sig"), newline + 1
+
+
+def plan_shards(size: int, data_start: int, shard_size: int) -> list:
+    """
+    Splits [data_start, size) into (start, end) byte ranges of about
+    shard_size. Ranges need not fall on line boundaries, see iter_shard_lines.
+    """
+    bounds = list(range(data_start, size, shard_size)) + [size]
+    return [(start, end) for start, end in zip(bounds, bounds[1:])]
+
+
+def shard_prefix(file_key: str, shard: int) -> str:
+    """
+    Key prefix of one shard's results. They live under VERADIGM_SHARD_PREFIX
+    rather than next to the file, where the tenant's SFTP user would see them.
+    """
+    return f"{VERADIGM_SHARD_PREFIX}/{file_key}/{shard}"
+
+
+def _iter_raw_lines(body):
+    """
+    Yields the lines of a stream, each ending with its newline except an
+    unterminated last one.
+    """
+    buffer = b""
+    while data := body.read(READ_BYTES):
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if buffer:
+        yield buffer
+
+
+def _reaches_end(content_range: str) -> bool:
+    # "bytes 1023-2047/4096": whether the range includes the last byte
+    span, _, size = content_range.removeprefix("bytes ").partition("/")
+    return int(span.split("-")[1]) + 1 >= int(size)
+
+
+def iter_shard_lines(s3_client, bucket_name: str, file_key: str, start: int, end: int):
+    """
+    Yields the lines (decoded, with their newline) that begin inside
+    [start, end). Reading starts one byte early so a line beginning exactly at
+    start is recognised, and runs at most VERADIGM_MAX_LINE_BYTES past end to
+    finish the last line. Raises ValueError for a line longer than that.
+
+    Rows must not contain quoted newlines, which Veradigm exports do not.
+    """
+    response = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=file_key,
+        Range=f"bytes={start - 1}-{end + VERADIGM_MAX_LINE_BYTES - 1}",
+    )
+    at_file_end = _reaches_end(response["ContentRange"])
+    body = response["Body"]
+    try:
+        lines = _iter_raw_lines(body)
+        # The byte before start ends the previous line, or is part of a line
+        # that began in the previous shard; either way it is not ours.
+        offset = start - 1 + len(next(lines, b""))
+        for line in lines:
+            if offset >= end:
+                return
+            if not line.endswith(b"\n"):
+                if not at_file_end:
+                    raise ValueError(
+                        f"Line at byte {offset} of {file_key} is longer than {VERADIGM_MAX_LINE_BYTES} bytes"
+                    )
+                line += b"\n"
+            offset += len(line)
+            yield line.decode("utf-8")
+    finally:
+        body.close()
+
+
+class LocalShardDispatcher:
+    """
+    Runs shards on threads in this process: the stand-in for local runs and
+    tests, and for files too small to be worth extra invocations.
+    """
+
+    def __init__(self, handler, max_workers: int = 4) -> None:
+        self.handler = handler
+        self.max_workers = max_workers
+
+    def dispatch(self, events: list) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self.handler, events))
+
+
+class LambdaShardDispatcher:
+    """
+    Sends each shard to an asynchronous invocation of this function.
+    """
+
+    def __init__(self, function_name: str | None = None) -> None:
+        self.function_name = function_name or os.environ["AWS_LAMBDA_FUNCTION_NAME"]
+        self.client = boto3.client("lambda")
+
+    def dispatch(self, events: list) -> None:
+        for event in events:
+            self.client.invoke(
+                FunctionName=self.function_name,
+                InvocationType="Event",
+                Payload=json.dumps(event).encode("utf-8"),
+            )
+
+
+def get_shard_dispatcher(handler):
+    """
+    "lambda" or "local" per VERADIGM_SHARD_DISPATCH; "auto" uses async
+    invocations when running inside Lambda.
+    """
+    mode = VERADIGM_SHARD_DISPATCH
+    if mode == "auto":
+        mode = "lambda" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "local"
+    if mode == "lambda":
+        return LambdaShardDispatcher()
+    return LocalShardDispatcher(handler)
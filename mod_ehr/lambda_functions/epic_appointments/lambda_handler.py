@@ -6,13 +6,14 @@ if os.environ.get("ENVIRONMENT", "LOCAL") == "LOCAL":
 
 from health_connector_base.constants import STRINGS, Status
 from health_connector_base.handlers import Response
+from health_connector_base import fhir
 from health_connector_base.smart_epic import JWTHelper, SmartEpicClient
 
 
 class EpicAppointmentsHandler:
 
     def _map_participants_data(
-        self, appointment: dict, smart_client: SmartEpicClient
+        self, appointment: dict, smart_client: SmartEpicClient, included: dict | None = None
     ) -> dict:
         """
         Maps participant data from an appointment to a dictionary.
@@ -20,22 +21,18 @@ class EpicAppointmentsHandler:
         Args:
             appointment (dict): The appointment data.
             smart_client (SmartEpicClient): The SmartEpicClient instance.
-            start_time (int): The start time of the appointment.
+            included (dict): Resources _include'd in the Bundle, keyed "Location/<id>" etc.
 
         Returns:
             dict: A dictionary containing mapped participant data.
         """
         result = {}
-        for participant in appointment["participant"]:
-            participant_type = participant["actor"]["reference"]["@value"].split("/")
-            if participant_type[0] == "Patient":
-                result["patient_name"] = participant["actor"]["display"]["@value"]
-                result["patient_id"] = participant_type[-1]
-            elif participant_type[0] == "Location":
-                if location_response := smart_client.get_location_data(
-                    participant_type[-1]
-                ):
-                    result["location"] = location_response
+        for patient_id in fhir.participant_ids(appointment, "Patient"):
+            result["patient_name"] = fhir.participant_display(appointment, "Patient")
+            result["patient_id"] = patient_id
+        for location_id in fhir.participant_ids(appointment, "Location"):
+            if location := smart_client.get_location(location_id, (included or {}).get(f"Location/{location_id}")):
+                result["location"] = location["address"]
         return result
 
     def __call__(self, event):
@@ -43,34 +40,42 @@ class EpicAppointmentsHandler:
         if not (patient_id := (event.get("pathParameters") or {}).get("id")):
             return Response(status=Status.HTTP_422_UNPROCESSABLE_ENTITY)
         smart_client = SmartEpicClient(JWTHelper().generate_jwt())
-        if not (appointments := smart_client.get_appointments(patient_id)):
+        minified = (event.get("queryStringParameters") or {}).get("minified") == "True"
+        # The minified view resolves each appointment's location from the Bundle
+        appointments = smart_client.get_appointments(patient_id, include=minified)
+        if not (appointments and appointments[0]):
             return Response(
                 {
                     "message": STRINGS["EPIC_APPOINTMENTS_NOT_FOUND"]
                     % {"patient_id": patient_id}
                 }
             )
-        if (event.get("queryStringParameters") or {}).get("minified") == "True":
+        if minified:
             data = []
-            for appointment in appointments["Bundle"]["entry"]:
+            appointment_resources, included = appointments
+            for appointment in appointment_resources:
                 try:
-                    appointment = appointment["resource"]["Appointment"]
-                    status = appointment["status"]["@value"]
+                    status = appointment["status"]
                     if status != "arrived":
-                        start_time = appointment["start"]["@value"]
-                        end_time = appointment["start"]["@value"]
+                        start_time = appointment["start"]
+                        end_time = appointment["start"]
                         result = {
-                            "id": appointment["id"]["@value"],
+                            "id": appointment["id"],
                             "status": status,
                             "start_time": start_time,
                             "end_time": end_time,
                             "provider": "epic",
-                        } | self._map_participants_data(appointment, smart_client)
+                        } | self._map_participants_data(appointment, smart_client, included)
                         data.append(result)
                 except KeyError as e:
                     print(e.args)
             return Response(data)
-        return Response(appointments)
+        return Response({
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(appointments[0]),
+            "entry": [{"resource": appointment} for appointment in appointments[0]],
+        })
 
 
 def epic_handler(event, context):
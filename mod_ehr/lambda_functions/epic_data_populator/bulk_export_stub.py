@@ -0,0 +1,209 @@
+"""
+Local stand-in for Epic's token and Bulk Data ($export) endpoints, for
+running the populator's bulk mode without an Epic sandbox.
+
+    python bulk_export_stub.py --port 8089 --patients 200 --delay 5
+
+then point the populator at it:
+
+    EPIC_FHIR_BASE_URL=http://localhost:8089/api/FHIR/R4
+    EPIC_TOKEN_URL=http://localhost:8089/oauth2/token
+
+Exports complete --delay seconds after kickoff. Output files are generated
+(--patients patients with --appointments appointments each, spread over
+--locations locations) unless --data points at a directory with
+Patient.ndjson, Location.ndjson and Appointment.ndjson.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EXPORT_PATH = re.compile(r"^/api/FHIR/R4/Group/([^/]+)/\$export$")
+STATUS_PATH = re.compile(r"^/export-status/([^/]+)$")
+FILE_PATH = re.compile(r"^/files/([^/]+)/(\w+)\.ndjson$")
+
+
+def generate_resources(patients: int, appointments: int, locations: int) -> dict:
+    """
+    Returns {resource type: [resource, ...]} for a synthetic Group whose
+    patient ids are "patient-<n>".
+    """
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    resources = {
+        "Location": [
+            {
+                "resourceType": "Location",
+                "id": f"location-{n}",
+                "address": {"line": [f"{100 + n} Main St"], "city": "Chicago", "state": "IL", "postalCode": "60601"},
+            }
+            for n in range(locations)
+        ],
+        "Patient": [],
+        "Appointment": [],
+    }
+    for n in range(patients):
+        resources["Patient"].append({
+            "resourceType": "Patient",
+            "id": f"patient-{n}",
+            "name": [{"use": "usual", "given": [f"First{n}"], "family": f"Last{n}"}],
+            "telecom": [
+                {"system": "phone", "value": f"555-01{n:04d}", "rank": 1},
+                {"system": "email", "value": f"patient{n}@example.com"},
+            ],
+        })
+        for a in range(appointments):
+            begins = start + timedelta(hours=n % 48, days=a)
+            resources["Appointment"].append({
+                "resourceType": "Appointment",
+                "id": f"appointment-{n}-{a}",
+                "status": "accepted",
+                "start": begins.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "end": (begins + timedelta(minutes=30)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "participant": [
+                    {"actor": {"reference": f"Patient/patient-{n}"}},
+                    {"actor": {"reference": f"Location/location-{(n + a) % max(locations, 1)}"}},
+                ],
+            })
+    return resources
+
+
+def load_resources(data_dir: str) -> dict:
+    resources = {}
+    for resource_type in ("Patient", "Location", "Appointment"):
+        path = os.path.join(data_dir, f"{resource_type}.ndjson")
+        if os.path.exists(path):
+            with open(path) as f:
+                resources[resource_type] = [json.loads(line) for line in f if line.strip()]
+    return resources
+
+
+class BulkExportStub(ThreadingHTTPServer):
+    def __init__(self, address, resources: dict, delay: float) -> None:
+        super().__init__(address, StubHandler)
+        self.resources = resources
+        self.delay = delay
+        # job id -> {"ready_at", "types", "request"}
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: BulkExportStub
+
+    def _send(self, status: int, body=None, headers: dict | None = None, content_type: str = "application/json") -> None:
+        payload = b"" if body is None else body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if payload:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization", "").startswith("Bearer "):
+            return True
+        self._send(401, {"error": "missing bearer token"})
+        return False
+
+    def do_POST(self) -> None:
+        if urlparse(self.path).path != "/oauth2/token":
+            return self._send(404)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(200, {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 3600})
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if not self._authorized():
+            return
+        if match := EXPORT_PATH.match(url.path):
+            return self._kickoff(match.group(1), parse_qs(url.query))
+        if match := STATUS_PATH.match(url.path):
+            return self._status(match.group(1))
+        if match := FILE_PATH.match(url.path):
+            return self._file(match.group(1), match.group(2))
+        self._send(404)
+
+    def do_DELETE(self) -> None:
+        match = STATUS_PATH.match(urlparse(self.path).path)
+        with self.server.lock:
+            job = self.server.jobs.pop(match.group(1), None) if match else None
+        self._send(202 if job else 404)
+
+    def _kickoff(self, group_id: str, query: dict) -> None:
+        if self.headers.get("Prefer") != "respond-async":
+            return self._send(400, {"error": "Prefer: respond-async is required"})
+        types = query.get("_type", [",".join(self.server.resources)])[0].split(",")
+        job_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.jobs[job_id] = {
+                "ready_at": time.monotonic() + self.server.delay,
+                "types": types,
+                "request": self.path,
+            }
+        print(f"Export {job_id} of Group {group_id} ({','.join(types)}) since {query.get('_since', ['-'])[0]}")
+        self._send(202, headers={"Content-Location": f"{self.server.base_url}/export-status/{job_id}"})
+
+    def _status(self, job_id: str) -> None:
+        with self.server.lock:
+            job = self.server.jobs.get(job_id)
+        if job is None:
+            return self._send(404)
+        remaining = job["ready_at"] - time.monotonic()
+        if remaining > 0:
+            done = 100 - int(100 * remaining / max(self.server.delay, 1))
+            return self._send(202, headers={"X-Progress": f"{done}% complete", "Retry-After": "1"})
+        self._send(200, {
+            "transactionTime": datetime.now(timezone.utc).isoformat(),
+            "request": f"{self.server.base_url}{job['request']}",
+            "requiresAccessToken": True,
+            "output": [
+                {
+                    "type": resource_type,
+                    "url": f"{self.server.base_url}/files/{job_id}/{resource_type}.ndjson",
+                    "count": len(self.server.resources.get(resource_type, [])),
+                }
+                for resource_type in job["types"]
+                if self.server.resources.get(resource_type)
+            ],
+            "error": [],
+        })
+
+    def _file(self, job_id: str, resource_type: str) -> None:
+        if job_id not in self.server.jobs:
+            return self._send(404)
+        body = "".join(json.dumps(resource) + "\n" for resource in self.server.resources.get(resource_type, []))
+        self._send(200, body.encode("utf-8"), content_type="application/fhir+ndjson")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=5, help="seconds before an export completes")
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--appointments", type=int, default=3, help="appointments per patient")
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--data", help="directory with <Type>.ndjson files to serve instead")
+    args = parser.parse_args()
+
+    resources = load_resources(args.data) if args.data else generate_resources(args.patients, args.appointments, args.locations)
+    server = BulkExportStub((args.host, args.port), resources, args.delay)
+    print(f"Serving Bulk Data stub on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Compares parsing Epic search Bundles the old way (XML through xmltodict,
+walking "@value" dicts) with the JSON paths: one fhir.loads of the whole
+body, and fhir.iter_bundle_resources reading it in chunks the way
+SmartEpicClient does. Each path extracts the same appointment fields.
+Bodies are read from disk in every run, so peak memory includes the body
+for the paths that need it whole, like a response downloaded before parsing.
+
+    python fhir_parse_benchmark.py --recorded responses/
+
+reads recorded responses saved as <name>.xml and <name>.json (the same
+search made with Accept application/fhir+xml and with _format=json).
+Without --recorded, equivalent Bundles are generated in both formats.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from xml.sax.saxutils import quoteattr
+
+import xmltodict
+
+if os.environ.get("ENVIRONMENT", "LOCAL") == "LOCAL":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from health_connector_base import fhir
+from health_connector_base.smart_epic import RESPONSE_CHUNK_SIZE
+
+from bulk_export_stub import generate_resources
+
+
+def to_fhir_xml(resource: dict) -> str:
+    """
+    Serializes a JSON resource the way FHIR XML represents it: primitives as
+    value attributes, repeated elements for arrays.
+    """
+    def element(name: str, value) -> str:
+        if isinstance(value, list):
+            return "".join(element(name, item) for item in value)
+        if isinstance(value, dict):
+            if "resourceType" in value:
+                return f"<{name}>{to_fhir_xml(value)}</{name}>"
+            return f"<{name}>{''.join(element(k, v) for k, v in value.items())}</{name}>"
+        if isinstance(value, bool):
+            value = str(value).lower()
+        return f"<{name} value={quoteattr(str(value))}/>"
+
+    children = "".join(element(k, v) for k, v in resource.items() if k != "resourceType")
+    return f'<{resource["resourceType"]} xmlns="http://hl7.org/fhir">{children}</{resource["resourceType"]}>'
+
+
+def generated_bundles() -> dict:
+    """
+    Returns {name: (xml, json)} search Bundles with their _include'd
+    Locations and Patients, from one patient's appointments to a large page.
+    """
+    bundles = {}
+    for name, patients, appointments in (("small", 1, 5), ("medium", 20, 10), ("large", 200, 25)):
+        resources = generate_resources(patients, appointments, locations=max(patients // 4, 1))
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(resources["Appointment"]),
+            "link": [{"relation": "self", "url": "https://fhir.example.com/Appointment?patient=x"}],
+            "entry": [
+                {"fullUrl": f"https://fhir.example.com/{r['resourceType']}/{r['id']}", "resource": r, "search": {"mode": mode}}
+                for resource_type, mode in (("Appointment", "match"), ("Location", "include"), ("Patient", "include"))
+                for r in resources[resource_type]
+            ],
+        }
+        bundles[name] = (to_fhir_xml(bundle), json.dumps(bundle, indent=2))
+    return bundles
+
+
+def recorded_bundles(directory: str) -> dict:
+    bundles = {}
+    for xml_path in sorted(glob.glob(os.path.join(directory, "*.xml"))):
+        json_path = xml_path[:-len(".xml")] + ".json"
+        if not os.path.exists(json_path):
+            print(f"Skipping {xml_path}: no {json_path}")
+            continue
+        with open(xml_path) as xml_file, open(json_path) as json_file:
+            bundles[os.path.basename(xml_path)[:-len(".xml")]] = (xml_file.read(), json_file.read())
+    return bundles
+
+
+def parse_xmltodict(path: str) -> list:
+    """
+    The previous path: xmltodict tree of the whole body, then "@value" dicts.
+    """
+    with open(path, encoding="utf-8") as f:
+        body = f.read()
+    entries = xmltodict.parse(body).get("Bundle", {}).get("entry", [])
+    if isinstance(entries, dict):
+        entries = [entries]
+    rows = []
+    for entry in entries:
+        if appointment := entry.get("resource", {}).get("Appointment"):
+            rows.append({
+                "id": appointment["id"]["@value"],
+                "status": appointment["status"]["@value"],
+                "start_time": datetime.strptime(appointment["start"]["@value"], fhir.FHIR_DATETIME_FORMAT),
+                "end_time": datetime.strptime(appointment["end"]["@value"], fhir.FHIR_DATETIME_FORMAT),
+            })
+    return rows
+
+
+def parse_json(path: str) -> list:
+    with open(path, "rb") as f:
+        body = f.read()
+    resources = (fhir.extract(entry["resource"]) for entry in fhir.loads(body).get("entry", []))
+    appointments, _ = fhir.split_bundle(resources)
+    return [fhir.appointment_fields(appointment) for appointment in appointments]
+
+
+def parse_json_streamed(path: str) -> list:
+    with open(path, "rb") as f:
+        chunks = iter(lambda: f.read(RESPONSE_CHUNK_SIZE), b"")
+        resources = (fhir.extract(resource) for resource in fhir.iter_bundle_resources(chunks))
+        appointments, _ = fhir.split_bundle(resources)
+    return [fhir.appointment_fields(appointment) for appointment in appointments]
+
+
+def measure(parse, path: str, repeat: int) -> tuple:
+    """
+    Returns (best seconds per parse, peak traced bytes, result).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse(path)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    parse(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recorded", help="directory of <name>.xml / <name>.json responses")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    bundles = recorded_bundles(args.recorded) if args.recorded else generated_bundles()
+    print(f"JSON parser: {'orjson' if fhir.orjson else 'json'}")
+    print(f"{'bundle':<12}{'path':<16}{'size KB':>10}{'ms':>10}{'peak KB':>10}{'rows':>8}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (xml_body, json_body) in bundles.items():
+            xml_path, json_path = (os.path.join(directory, f"{name}.{ext}") for ext in ("xml", "json"))
+            with open(xml_path, "w", encoding="utf-8") as f:
+                f.write(xml_body)
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write(json_body)
+            baseline = None
+            for label, parse, path in (
+                ("xmltodict", parse_xmltodict, xml_path),
+                ("json", parse_json, json_path),
+                ("json streamed", parse_json_streamed, json_path),
+            ):
+                seconds, peak, rows = measure(parse, path, args.repeat)
+                baseline = baseline or seconds
+                print(
+                    f"{name:<12}{label:<16}{os.path.getsize(path) / 1024:>10.1f}{seconds * 1000:>10.2f}"
+                    f"{peak / 1024:>10.0f}{len(rows):>8}{baseline / seconds:>8.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
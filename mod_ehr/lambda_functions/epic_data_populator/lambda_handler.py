@@ -1,8 +1,43 @@
 from datetime import datetime, timedelta, timezone
+from itertools import islice
+from urllib.parse import parse_qs
+
+from health_connector_base import fhir, settings_cache
+from health_connector_base.bulk_export import BulkExportClient, BulkExportError, load_job, save_job
+from health_connector_base.cache import MISSING, LRUCache
+from health_connector_base.constants import (
+    EPIC_BULK_CHUNK_SIZE,
+    EPIC_BULK_EXPORT_INTERVAL,
+    EPIC_PATIENT_BATCH,
+    EPIC_PATIENT_BATCH_SIZE,
+    EPIC_PATIENT_CACHE_TTL,
+)
+from health_connector_base.custom_attributes import AddressAttribute
 from health_connector_base.models import Appointment, Hospital, Patient
-from health_connector_base.smart_epic import JWTHelper, SmartEpicClient
+from health_connector_base.smart_epic import (
+    JWTHelper,
+    SmartEpicClient,
+    cache_location,
+    location_fields,
+)
 from health_connector_base.secrets_manager import KMSClient
 
+# "hospital_id/patient_id" -> Appointment patient fields, across warm runs.
+# PHI, so kept in process memory only, never in the shared cache table.
+_demographics = LRUCache(maxsize=4096, ttl=EPIC_PATIENT_CACHE_TTL)
+
+BULK_EXPORT_TYPES = ["Patient", "Location", "Appointment"]
+# The same appointments the per-patient search (SmartEpicClient.get_appointments) returns
+BULK_EXPORT_TYPE_FILTERS = ["Appointment?status=accepted&service-category=appointment"]
+# Servers may ignore _typeFilter, so its Appointment statuses are also checked while ingesting
+BULK_EXPORT_APPOINTMENT_STATUSES = {
+    status
+    for type_filter in BULK_EXPORT_TYPE_FILTERS
+    if type_filter.startswith("Appointment?")
+    for value in parse_qs(type_filter.partition("?")[2]).get("status", [])
+    for status in value.split(",")
+}
+
 class AppointmentsMapperWithEpic:
 
     def _get_jwt(self, credentials):
@@ -32,93 +67,192 @@ class AppointmentsMapperWithEpic:
             )
         }
         
-    def _map_participant_data_location(self, appointment: dict, smart_client: SmartEpicClient, patient_id: str) -> dict:
+    def _map_participant_data_location(self, appointment: dict, smart_client: SmartEpicClient, demographics: dict, included: dict | None = None) -> dict:
+        included = included or {}
         result = {}
-        for participant in appointment["participant"]:
-            participant_type = participant["actor"]["reference"]["@value"].split("/")
-            if participant_type[0] == "Location":
-                if location_response := smart_client.get_location_data(
-                    participant_type[-1]
-                ):
-                    result["location"] = location_response
-
-        #getting patient info
-        patient_info = smart_client.get_patient_info(patient_id)
-        first_name = ""
-        last_name = ""
-        patient_phone_no = {}
-        patient_email = {}
-        for name_part in patient_info["Patient"]["name"]:
-            if name_part["use"]["@value"] == "usual":
-                if len(name_part["given"])>1:
-                    first_name = " ".join([_["@value"] for _ in name_part["given"]])
-                else:
-                    first_name = name_part["given"]["@value"]
-                last_name = name_part["family"]["@value"]
-                break
-        for contact_part in patient_info["Patient"]["telecom"]:
-            if contact_part["system"]["@value"] == "phone":
-                if ( not patient_phone_no.get(contact_part["value"]["@value"])) or (patient_phone_no.get(contact_part["value"]["@value"]) and int(contact_part.get("rank",{}).get("@value","")) < int(patient_phone_no[contact_part["value"]["@value"]])):
-                    patient_phone_no[contact_part["value"]["@value"]] = int(contact_part.get("rank",{}).get("@value","999"))
-                else:
-                    continue
-            elif contact_part["system"]["@value"] == "email":
-                if ( not patient_email.get(contact_part["value"]["@value"])) or (patient_email.get(contact_part["value"]["@value"]) and int(contact_part.get("rank",{}).get("@value","")) < int(patient_email[contact_part["value"]["@value"]])):
-                    patient_email[contact_part["value"]["@value"]] = int(contact_part.get("rank",{}).get("@value","999"))
-                else:
-                    continue
-            patient_phone_no = dict(sorted(patient_phone_no.items(), key = lambda x: x[1], reverse=False))
-            patient_email = dict(sorted(patient_email.items(), key = lambda x: x[1], reverse=False))
-            result["patient_first_name"] = first_name
-            result["patient_last_name"] = last_name
-            result["patient_phone_no"] = str(list(patient_phone_no.keys())) if patient_phone_no else ""
-            result["patient_email"] = str(list(patient_email.keys())) if patient_email else ""
-            result["patient_id"] = patient_id
-            result["patient_name"] = f"{first_name} {last_name}"
-        return result
+        for location_id in fhir.participant_ids(appointment, "Location"):
+            if location := smart_client.get_location(location_id, included.get(f"Location/{location_id}")):
+                result |= location_fields(location)
+        return result | demographics
+
+    def prefetch_demographics(self, hospital_id: str, patient_ids: list, smart_client: SmartEpicClient) -> None:
+        """
+        Fills the demographics cache for patients not in it with FHIR batch
+        Bundles of EPIC_PATIENT_BATCH_SIZE Patient reads.
+        """
+        missing = [
+            patient_id for patient_id in patient_ids
+            if _demographics.get(f"{hospital_id}/{patient_id}") is MISSING
+        ]
+        for start in range(0, len(missing), EPIC_PATIENT_BATCH_SIZE):
+            patients = smart_client.get_patients(missing[start:start + EPIC_PATIENT_BATCH_SIZE])
+            for patient_id, patient in patients.items():
+                _demographics.set(f"{hospital_id}/{patient_id}", fhir.patient_demographics(patient, patient_id))
+
+    def get_demographics(self, hospital_id: str, patient_id: str, smart_client: SmartEpicClient, included: dict) -> dict:
+        """
+        Returns the patient's demographics, cached for EPIC_PATIENT_CACHE_TTL.
+        On a miss they come from the _include'd Patient in the Bundle, or one
+        Patient read.
+        """
+        key = f"{hospital_id}/{patient_id}"
+        if (demographics := _demographics.get(key)) is not MISSING:
+            return demographics
+        if (patient := included.get(f"Patient/{patient_id}")) is None:
+            if (patient := smart_client.get_patient_info(patient_id)) is None:
+                raise KeyError(f"Patient/{patient_id}")
+        demographics = fhir.patient_demographics(patient, patient_id)
+        _demographics.set(key, demographics)
+        return demographics
 
     def fetch_epic_data(self, patient_mapping: dict, hospital, credentials):
         print("fetch_epic_data called")
         print("hospital:",hospital)
-        smart_client = SmartEpicClient(self._get_jwt(credentials))
+        smart_client = self._smart_client(credentials)
         appointment_objs = []
         print("Fetching Epic data for patients:", patient_mapping)
+        if EPIC_PATIENT_BATCH:
+            self.prefetch_demographics(hospital.id, list(patient_mapping), smart_client)
         for patient_id, rider_id in patient_mapping.items():
             print("patient_id:", patient_id, rider_id)
-            if appointments := smart_client.get_appointments(patient_id):
-                print("Fetched appointments for patient_id:", patient_id, "->", appointments)
-                for appointment in appointments["Bundle"]["entry"]:
+            if bundle := smart_client.get_appointments(patient_id, include=True):
+                appointments, included = bundle
+                print("Fetched appointments for patient_id:", patient_id, "->", len(appointments))
+                # Once per patient, not per appointment
+                try:
+                    demographics = self.get_demographics(hospital.id, patient_id, smart_client, included)
+                except KeyError as e:
+                    print(e.args)
+                    continue
+                for appointment in appointments:
                     try:
-                        appointment = appointment["resource"]["Appointment"]
-                        status = appointment["status"]["@value"]
-                        start_time = datetime.strptime(
-                            appointment["start"]["@value"], "%Y-%m-%dT%H:%M:%SZ"
-                        )
-                        end_time = datetime.strptime(
-                            appointment["end"]["@value"], "%Y-%m-%dT%H:%M:%SZ"
-                        )
-                        result = {
-                            "id": appointment["id"]["@value"],
-                            "status": status,
-                            "start_time": start_time,
-                            "end_time": end_time,
+                        result = fhir.appointment_fields(appointment) | {
                             "provider": "epic",
                             "hospital_id": hospital.id,
-                        # } | self._map_participants_data(appointment, smart_client)
-                        } | self._map_participant_data_location(appointment, smart_client, patient_id)
-                        # result |= {
-                        #     "ride": self.get_matching_ride(
-                        #         result["location"], trips, int(start_time.timestamp())
-                        #     )
-                        #     or VIA_RIDE_MOCK
-                        # }
-                        appointment_objs.append(Appointment(**result))
-                    except KeyError as e:
+                        } | self._map_participant_data_location(appointment, smart_client, demographics, included)
+                        appointment = Appointment(**result)
+                        appointment.resolve_coordinates()
+                        appointment_objs.append(appointment)
+                    except (KeyError, ValueError) as e:
                         print(e.args)
-        with Appointment.batch_write() as batch:
+        # Locations come straight from Epic, so skip per-row geocode validation
+        with AddressAttribute.validation("off"), Appointment.batch_write() as batch:
             for appointment in appointment_objs:
                 batch.save(appointment)
 
+    def _smart_client(self, credentials) -> SmartEpicClient:
+        # Signs a client assertion only when no cached token is valid
+        return SmartEpicClient(
+            client_id=credentials["epic_client_id"],
+            jwt_factory=lambda: self._get_jwt(credentials),
+        )
+
+    def run_bulk_export(self, patient_mapping: dict, hospital, credentials, group_id: str) -> None:
+        """
+        Advances the hospital's Bulk Data export of the Epic Group by one step:
+        checks a running export and ingests it once complete, or starts the
+        next one when EPIC_BULK_EXPORT_INTERVAL has passed since the last.
+
+        Args:
+            patient_mapping (dict): Linked patient_id -> via_rider_id.
+            hospital (Hospital): The Epic hospital.
+            credentials (dict): The hospital's Epic credentials.
+            group_id (str): The Epic Group holding the hospital's patients.
+        """
+        smart_client = self._smart_client(credentials)
+        client = BulkExportClient(smart_client)
+        job = load_job(hospital.id)
+
+        if status_url := job.get("status_url"):
+            try:
+                if (manifest := client.poll(status_url)) is None:
+                    return
+                written = self.ingest_bulk_export(client, manifest, hospital, patient_mapping, smart_client)
+            except BulkExportError as e:
+                # The export failed or expired (404/410/5xx, or its files are
+                # gone): start a new one with the same _since on the next run
+                # instead of polling this one until the job's TTL
+                print(f"Bulk export for hospital {hospital.id} failed, starting over: {e}")
+                save_job(hospital.id, {"since": job.get("since")})
+                return
+            client.delete(status_url)
+            save_job(hospital.id, {
+                # Next export only returns what changed since this one
+                "since": manifest.get("transactionTime") or job.get("kicked_off_at"),
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            })
+            print(f"Bulk export for hospital {hospital.id} wrote {written} appointments")
+            return
+
+        if completed_at := job.get("completed_at"):
+            elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(completed_at)
+            if elapsed < timedelta(seconds=EPIC_BULK_EXPORT_INTERVAL):
+                print(f"Last bulk export for hospital {hospital.id} completed {elapsed} ago, not due yet")
+                return
+
+        kicked_off_at = datetime.now(timezone.utc).isoformat()
+        status_url = client.kickoff(
+            group_id, BULK_EXPORT_TYPES, since=job.get("since"), type_filters=BULK_EXPORT_TYPE_FILTERS
+        )
+        print(f"Started bulk export for hospital {hospital.id}: {status_url}")
+        save_job(hospital.id, {"status_url": status_url, "kicked_off_at": kicked_off_at, "since": job.get("since")})
+
+    def ingest_bulk_export(self, client: BulkExportClient, manifest: dict, hospital, patient_mapping: dict, smart_client: SmartEpicClient) -> int:
+        """
+        Streams a completed export into the Appointment table. Locations and
+        linked patients go to their caches first, so appointments resolve
+        them without further requests; appointments are written in chunks of
+        EPIC_BULK_CHUNK_SIZE. Appointments not in a status the export's
+        _typeFilter asks for, or already ended, are skipped.
+
+        Returns:
+            int: The number of appointments written.
+        """
+        # appointment_fields times are naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for location in client.iter_resources(manifest, "Location"):
+            try:
+                cache_location(location["id"], fhir.location_address(location))
+            except KeyError as e:
+                print(e.args)
+
+        for patient in client.iter_resources(manifest, "Patient"):
+            if (patient_id := patient.get("id")) in patient_mapping:
+                _demographics.set(f"{hospital.id}/{patient_id}", fhir.patient_demographics(patient, patient_id))
+
+        appointments = (
+            appointment for appointment in client.iter_resources(manifest, "Appointment")
+            if any(patient_id in patient_mapping for patient_id in fhir.participant_ids(appointment, "Patient"))
+        )
+        written = 0
+        while chunk := list(islice(appointments, EPIC_BULK_CHUNK_SIZE)):
+            appointment_objs = []
+            for appointment in chunk:
+                try:
+                    fields = fhir.appointment_fields(appointment)
+                    if fields["status"] not in BULK_EXPORT_APPOINTMENT_STATUSES or fields["end_time"] < now:
+                        continue
+                    patient_id = next(
+                        patient_id for patient_id in fhir.participant_ids(appointment, "Patient")
+                        if patient_id in patient_mapping
+                    )
+                    # Cached above unless the patient was not in this export
+                    demographics = self.get_demographics(hospital.id, patient_id, smart_client, {})
+                    result = fields | {
+                        "provider": "epic",
+                        "hospital_id": hospital.id,
+                    } | self._map_participant_data_location(appointment, smart_client, demographics)
+                    appointment = Appointment(**result)
+                    appointment.resolve_coordinates()
+                    appointment_objs.append(appointment)
+                except (KeyError, ValueError) as e:
+                    print(e.args)
+            with AddressAttribute.validation("off"), Appointment.batch_write() as batch:
+                for appointment in appointment_objs:
+                    batch.save(appointment)
+            written += len(appointment_objs)
+        return written
+
     def __call__(self, event, context, *args, **kwargs):
         print("AppointmentsMapperWithEpic invoked")
 
@@ -145,7 +279,12 @@ class AppointmentsMapperWithEpic:
                     print(f"No epic patients with via_rider_id found for hospital {hospital.id}")
                     continue
 
-                self.fetch_epic_data(patient_mapping, hospital, credentials)
+                # Large tenants export their patients' data in bulk instead
+                # of searching appointments patient by patient
+                if group_id := settings_cache.get_setting(hospital.id, "epic_bulk_group_id"):
+                    self.run_bulk_export(patient_mapping, hospital, credentials, group_id)
+                else:
+                    self.fetch_epic_data(patient_mapping, hospital, credentials)
             except Exception as e:
                 print(f"Failed to process hospital {hospital.id} ({hospital.name}). Error: {e}")
                 continue
@@ -0,0 +1,108 @@
+"""
+Client for the FHIR Bulk Data ($export) flow: kick off a Group export, poll
+its status URL, then stream the NDJSON output files.
+
+Exports run for minutes, far longer than one populator run, so the job
+(status URL and the transactionTime of the last completed export, used as
+_since for the next one) is persisted in the shared cache table and picked
+up by the next scheduled run.
+"""
+from health_connector_base import fhir
+from health_connector_base.cache import MISSING, get_shared_store
+from health_connector_base.constants import EPIC_BULK_JOB_TTL, Status
+from health_connector_base.http_client import http_client
+
+NAMESPACE = "epic_exports"
+
+
+class BulkExportError(Exception):
+    pass
+
+
+def load_job(hospital_id: str) -> dict:
+    """
+    Returns the hospital's export job: {"status_url"} while an export runs,
+    {"since", "completed_at"} after one completed, {} before the first.
+    """
+    job = get_shared_store().get(NAMESPACE, hospital_id)
+    return {} if job is MISSING or job is None else job
+
+
+def save_job(hospital_id: str, job: dict) -> None:
+    get_shared_store().set(NAMESPACE, hospital_id, job, ttl=EPIC_BULK_JOB_TTL)
+
+
+class BulkExportClient:
+    def __init__(self, smart_client) -> None:
+        self.smart_client = smart_client
+
+    def _request(self, method: str, url: str, **kwargs):
+        if not self.smart_client.token:
+            self.smart_client.set_access_token()
+        if not self.smart_client.token:
+            raise BulkExportError("No Epic access token")
+        return self.smart_client._request(method, url, **kwargs)
+
+    def kickoff(self, group_id: str, types: list, since: str | None = None, type_filters: list | None = None) -> str:
+        """
+        Starts an export of the Group's resources of the given types.
+
+        Returns:
+            str: The status URL to poll.
+        """
+        params = {"_type": ",".join(types)}
+        if since:
+            params["_since"] = since
+        if type_filters:
+            params["_typeFilter"] = ",".join(type_filters)
+        r = self._request(
+            "GET",
+            f"{self.smart_client.base_url}/Group/{group_id}/$export",
+            params=params,
+            headers={"Accept": "application/fhir+json", "Prefer": "respond-async"},
+        )
+        if r.status_code != Status.HTTP_202_ACCEPTED or not r.headers.get("Content-Location"):
+            raise BulkExportError(f"Export kickoff for Group {group_id} failed with status {r.status_code}: {r.text[:500]}")
+        return r.headers["Content-Location"]
+
+    def poll(self, status_url: str) -> dict | None:
+        """
+        Checks the export once.
+
+        Returns:
+            dict | None: The completion manifest, or None while it still runs.
+        """
+        r = self._request("GET", status_url, headers={"Accept": "application/json"})
+        if r.status_code == Status.HTTP_202_ACCEPTED:
+            print(f"Export {status_url} in progress: {r.headers.get('X-Progress', 'no progress reported')}")
+            return None
+        if r.status_code != Status.HTTP_200_OK:
+            raise BulkExportError(f"Export {status_url} failed with status {r.status_code}: {r.text[:500]}")
+        return r.json()
+
+    def iter_resources(self, manifest: dict, resource_type: str):
+        """
+        Streams the resources of one type from every output file in the
+        manifest, without loading a file into memory.
+        """
+        headers = {"Accept": "application/fhir+ndjson"}
+        for output in manifest.get("output", []):
+            if output.get("type") != resource_type:
+                continue
+            if manifest.get("requiresAccessToken", True):
+                r = self._request("GET", output["url"], headers=headers, stream=True)
+            else:
+                # e.g. pre-signed storage URLs, which reject an Authorization header
+                r = http_client.get(output["url"], headers=headers, stream=True)
+            with r:
+                if not r.ok:
+                    raise BulkExportError(f"Download of {output['url']} failed with status {r.status_code}")
+                yield from fhir.iter_ndjson(r.iter_lines())
+
+    def delete(self, status_url: str) -> None:
+        """
+        Tells the server the output files are no longer needed.
+        """
+        r = self._request("DELETE", status_url)
+        if not r.ok:
+            print(f"Export {status_url} cleanup failed with status {r.status_code}")
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+MISSING = object()
+
+
+class CacheStats:
+    """
+    Thread-safe named counters for a cache (hits, misses, backend calls...).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def get(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with an optional per-entry TTL (in seconds).
+
+    Module-level instances survive across warm Lambda invocations.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class LocalStore:
+    """
+    Process-local stand-in for the shared cache table, used when
+    CACHE_TABLE_NAME is not configured (local runs, tests).
+    """
+
+    _data = {}
+    _lock = threading.Lock()
+
+    def get(self, namespace: str, key: str):
+        return self.get_entry(namespace, key)[0]
+
+    def get_entry(self, namespace: str, key: str) -> tuple:
+        """
+        Returns (value, expires_at epoch seconds or None), or (MISSING, None).
+        """
+        with self._lock:
+            value, expires_at = self._data.get((namespace, key), (MISSING, None))
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[(namespace, key)]
+                return MISSING, None
+            return value, expires_at
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[(namespace, key)] = (value, expires_at)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class DynamoDBStore:
+    """
+    Shared cache tier backed by the CacheEntry table. Failures are logged and
+    treated as cache misses so the cache never breaks the request path.
+    """
+
+    @property
+    def model(self):
+        # Imported lazily: models -> custom_attributes -> location_manager -> cache
+        from health_connector_base.models import CacheEntry
+
+        return CacheEntry
+
+    def get(self, namespace: str, key: str):
+        return self.get_entry(namespace, key)[0]
+
+    def get_entry(self, namespace: str, key: str) -> tuple:
+        """
+        Returns (value, expires_at epoch seconds or None), or (MISSING, None).
+        """
+        try:
+            entry = self.model.get(namespace, key)
+        except self.model.DoesNotExist:
+            return MISSING, None
+        except Exception as e:
+            print(f"Cache read failed for {namespace}/{key}: {e}")
+            return MISSING, None
+        if not entry.expires_at:
+            return (entry.value or {}).get("value"), None
+        # DynamoDB deletes expired items lazily, so expiry is checked here too.
+        if entry.expires_at <= datetime.now(timezone.utc):
+            return MISSING, None
+        return (entry.value or {}).get("value"), entry.expires_at.timestamp()
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None) -> None:
+        try:
+            self.model(
+                namespace,
+                key,
+                value={"value": value},
+                expires_at=timedelta(seconds=ttl) if ttl is not None else None,
+            ).save()
+        except Exception as e:
+            print(f"Cache write failed for {namespace}/{key}: {e}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self.model(namespace, key).delete()
+        except Exception as e:
+            print(f"Cache delete failed for {namespace}/{key}: {e}")
+
+
+def get_shared_store():
+    """
+    Returns the shared cache tier: the CacheEntry table when configured,
+    otherwise the process-local stand-in.
+    """
+    from health_connector_base.models import CacheEntry
+
+    if CacheEntry.Meta.table_name:
+        return DynamoDBStore()
+    return LocalStore()
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRU in front of the shared store.
+
+    Loader results of None are cached as negative entries for negative_ttl
+    seconds so repeated failed lookups do not reach the backend either.
+    """
+
+    _NEGATIVE = {"negative": True}
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        negative_ttl: float | None = None,
+        maxsize: int = 1024,
+        store=None,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._store = store
+        self.stats = CacheStats()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_shared_store()
+        return self._store
+
+    def get(self, key: str):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.stats.incr("local_hits")
+            return value
+        value, expires_at = self.store.get_entry(self.namespace, key)
+        if value is not MISSING:
+            self.stats.incr("shared_hits")
+            ttl = self.negative_ttl if value == self._NEGATIVE else self.ttl
+            if expires_at is not None:
+                # Never outlive the shared entry
+                remaining = max(expires_at - time.time(), 0)
+                ttl = remaining if ttl is None else min(ttl, remaining)
+            self.local.set(key, value, ttl=ttl)
+            return value
+        self.stats.incr("misses")
+        return MISSING
+
+    def set(self, key: str, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl=ttl)
+        self.store.set(self.namespace, key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        self.store.delete(self.namespace, key)
+
+    def get_or_load(self, key: str, loader):
+        """
+        Returns the cached value for key, calling loader() on a miss and caching
+        its result. Negative (None) results are cached when negative_ttl is set.
+        """
+        value = self.get(key)
+        if value == self._NEGATIVE:
+            self.stats.incr("negative_hits")
+            return None
+        if value is not MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        elif self.negative_ttl:
+            self.set(key, self._NEGATIVE, ttl=self.negative_ttl)
+        return value
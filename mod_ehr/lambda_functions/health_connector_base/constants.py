@@ -94,6 +94,59 @@ VIA_RIDE_MOCK = {
 DIFF_MATCH_IN_SEC = 1.5 * 60 * 60  # one 1/2 hr
 MOCK_DATA = os.environ.get("MOCK_DATA", True)
 LOCATION_DIFF = 1  # km
+GEOCODE_CACHE_TTL = int(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 60 * 60))  # sec
+GEOCODE_NEGATIVE_TTL = int(os.environ.get("GEOCODE_NEGATIVE_TTL", 24 * 60 * 60))  # sec
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", 2048))
+# "always": geocode on every save, "changed": only new/changed addresses, "off": never
+ADDRESS_VALIDATION_MODE = os.environ.get("ADDRESS_VALIDATION_MODE", "changed")
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))  # sec
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))  # sec
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))  # connections kept per host
+VIA_DETAILS_CONCURRENCY = int(os.environ.get("VIA_DETAILS_CONCURRENCY", 8))  # per API key
+# Reuse the last trip details when a trip's status and ETAs have not changed
+VIA_SKIP_UNCHANGED_DETAILS = os.environ.get("VIA_SKIP_UNCHANGED_DETAILS", "true").lower() == "true"
+VIA_DETAILS_CACHE_TTL = int(os.environ.get("VIA_DETAILS_CACHE_TTL", 24 * 60 * 60))  # sec
+VIA_TRIP_PAGE_SIZE = int(os.environ.get("VIA_TRIP_PAGE_SIZE", 100))
+VIA_MAX_TRIP_PAGES = int(os.environ.get("VIA_MAX_TRIP_PAGES", 20))  # per trip status
+TRIP_SNAPSHOT_TTL = int(os.environ.get("TRIP_SNAPSHOT_TTL", 120))  # sec, one Via refresh per rider per interval
+TRIP_SNAPSHOT_CACHE_SIZE = int(os.environ.get("TRIP_SNAPSHOT_CACHE_SIZE", 1024))
+SETTINGS_CACHE_TTL = int(os.environ.get("SETTINGS_CACHE_TTL", 60 * 60))  # sec
+HOSPITAL_DIRECTORY_TTL = int(os.environ.get("HOSPITAL_DIRECTORY_TTL", 5 * 60))  # sec, S3 subfolder -> hospital
+# How often a warm cached hospital's settings are checked against the write stamp
+SETTINGS_CHECK_INTERVAL = int(os.environ.get("SETTINGS_CHECK_INTERVAL", 60))  # sec
+# Full rebuild of the patient -> rider mapping; incremental refreshes in between
+PATIENT_MAPPING_REBUILD_INTERVAL = int(os.environ.get("PATIENT_MAPPING_REBUILD_INTERVAL", 15 * 60))  # sec
+PATIENT_MAPPING_CLOCK_SKEW = 60  # sec, overlap of incremental refreshes
+# S3 records of one event ingested at once, sharing the patient mapping and trip snapshots
+VERADIGM_FILE_CONCURRENCY = int(os.environ.get("VERADIGM_FILE_CONCURRENCY", 4))
+VERADIGM_CHUNK_SIZE = int(os.environ.get("VERADIGM_CHUNK_SIZE", 500))  # rows matched and written at once
+# Skip Veradigm files whose ETag was already ingested and rows whose content hash is unchanged
+VERADIGM_SKIP_UNCHANGED = os.environ.get("VERADIGM_SKIP_UNCHANGED", "true").lower() == "true"
+# Overridable so the Epic clients can be pointed at a sandbox or the local bulk export stub
+EPIC_FHIR_BASE_URL = os.environ.get("EPIC_FHIR_BASE_URL", "https://fhir.epic.com/interconnect-fhir-oauth/api/FHIR/R4")
+EPIC_TOKEN_URL = os.environ.get("EPIC_TOKEN_URL", "https://fhir.epic.com/interconnect-fhir-oauth/oauth2/token")
+EPIC_BULK_CHUNK_SIZE = int(os.environ.get("EPIC_BULK_CHUNK_SIZE", 500))  # exported appointments written at once
+# Minimum time between the end of one Bulk Data export and the next kickoff
+EPIC_BULK_EXPORT_INTERVAL = int(os.environ.get("EPIC_BULK_EXPORT_INTERVAL", 15 * 60))  # sec
+EPIC_BULK_JOB_TTL = int(os.environ.get("EPIC_BULK_JOB_TTL", 24 * 60 * 60))  # sec, abandoned export jobs are forgotten
+EPIC_LOCATION_CACHE_TTL = int(os.environ.get("EPIC_LOCATION_CACHE_TTL", 7 * 24 * 60 * 60))  # sec
+EPIC_PATIENT_CACHE_TTL = int(os.environ.get("EPIC_PATIENT_CACHE_TTL", 60 * 60))  # sec, patient demographics
+# Read uncached patients up front with FHIR batch Bundles instead of one GET each
+EPIC_PATIENT_BATCH = os.environ.get("EPIC_PATIENT_BATCH", "false").lower() == "true"
+EPIC_PATIENT_BATCH_SIZE = int(os.environ.get("EPIC_PATIENT_BATCH_SIZE", 50))
+PATIENT_BATCH_GET_SIZE = 100  # keys per BatchGetItem, the DynamoDB maximum
+VERADIGM_PATIENT_READ_CONCURRENCY = int(os.environ.get("VERADIGM_PATIENT_READ_CONCURRENCY", 4))
+# Parse Veradigm chunks column-wise with numpy, pydantic only for rows that fail the fast checks
+VERADIGM_COLUMNAR = os.environ.get("VERADIGM_COLUMNAR", "true").lower() == "true"
+# Files larger than the threshold are split into byte-range shards processed in parallel
+VERADIGM_SHARD_THRESHOLD = int(os.environ.get("VERADIGM_SHARD_THRESHOLD", 64 * 1024 * 1024))  # bytes
+VERADIGM_SHARD_SIZE = int(os.environ.get("VERADIGM_SHARD_SIZE", 32 * 1024 * 1024))  # bytes
+# "lambda" (async self-invocation), "local" (threads) or "auto" (lambda when deployed)
+VERADIGM_SHARD_DISPATCH = os.environ.get("VERADIGM_SHARD_DISPATCH", "auto").lower()
+# Shard results are kept under this prefix of the SFTP bucket, outside every tenant's home directory
+VERADIGM_SHARD_PREFIX = os.environ.get("VERADIGM_SHARD_PREFIX", "_shards")
+VERADIGM_MAX_LINE_BYTES = int(os.environ.get("VERADIGM_MAX_LINE_BYTES", 64 * 1024))  # longest CSV row a shard reads past its end
 STRINGS = {
     "INVALID_ADDRESS": "Address is not valid",
     "CHOICE_INVALID": "Value '%(value)s' is not one of the valid choices",
@@ -1,8 +1,16 @@
+import threading
+from contextlib import contextmanager
 from typing import Any, Callable
 from datetime import datetime
-from health_connector_base.constants import STRINGS
+from health_connector_base.cache import MISSING, LRUCache
+from health_connector_base.constants import (
+    ADDRESS_VALIDATION_MODE,
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    STRINGS,
+)
 from health_connector_base.exceptions import ValidationError
-from health_connector_base.location_manager import LocationManager
+from health_connector_base.location_manager import LocationManager, normalize_address
 from pynamodb.attributes import UnicodeAttribute, UTCDateTimeAttribute
 
 
@@ -42,7 +50,62 @@ class CustomUTCDateTimeAttribute(UTCDateTimeAttribute):
 
 
 class AddressAttribute(UnicodeAttribute):
+    """
+    Address that must resolve with the geocoder before it is saved.
+
+    Validation modes:
+        "always": every serialize geocodes the address.
+        "changed": only addresses that are new or changed are geocoded; values
+            read from the table or already validated are remembered.
+        "off": no validation, for trusted bulk ingestion paths.
+    """
+
+    modes = ("always", "changed", "off")
+    _validated = LRUCache(maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL)
+    _local = threading.local()
+
+    @classmethod
+    def validation_mode(cls) -> str:
+        return getattr(cls._local, "mode", None) or ADDRESS_VALIDATION_MODE
+
+    @classmethod
+    @contextmanager
+    def validation(cls, mode: str):
+        """
+        Overrides the validation mode for the current thread, e.g.
+        ``with AddressAttribute.validation("off"), Appointment.batch_write() as batch:``
+        """
+        if mode not in cls.modes:
+            raise ValueError(STRINGS["CHOICE_INVALID"] % {"value": mode})
+        previous = getattr(cls._local, "mode", None)
+        cls._local.mode = mode
+        try:
+            yield
+        finally:
+            cls._local.mode = previous
+
+    @classmethod
+    def validated_coordinates(cls, address: str) -> list | None:
+        """
+        Returns the coordinates remembered when address was validated, if any.
+        """
+        return cls._validated.get(normalize_address(address), None)
+
     def serialize(self, value: Any) -> Any:
-        if not LocationManager().is_valid_address(value):
+        mode = self.validation_mode()
+        if mode == "off":
+            return value
+        key = normalize_address(value)
+        if mode == "changed" and self._validated.get(key) is not MISSING:
+            return value
+        if not (coordinates := LocationManager().is_valid_address(value)):
             raise ValidationError(STRINGS["INVALID_ADDRESS"])
+        self._validated.set(key, coordinates)
         return value
+
+    def deserialize(self, value: Any) -> Any:
+        # Stored addresses were validated when written; only changes need a lookup.
+        key = normalize_address(value)
+        if self._validated.get(key) is MISSING:
+            self._validated.set(key, None)
+        return super().deserialize(value)
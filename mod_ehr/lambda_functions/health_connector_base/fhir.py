@@ -0,0 +1,252 @@
+"""
+Mapping of FHIR R4 resources in JSON form (Bulk Data NDJSON, _format=json
+responses) to the fields the Appointment model stores.
+"""
+import codecs
+import json
+from datetime import datetime
+from typing import TypedDict
+
+try:
+    import orjson
+except ImportError:  # not installed outside the Lambda layer
+    orjson = None
+
+FHIR_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+DEFAULT_TELECOM_RANK = 999
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+# Elements the mappers below read. Everything else (narrative, extensions,
+# identifiers, ...) is dropped as soon as a Bundle entry is parsed.
+RESOURCE_ELEMENTS = {
+    "Appointment": ("resourceType", "id", "status", "start", "end", "participant"),
+    "Location": ("resourceType", "id", "address"),
+    "Patient": ("resourceType", "id", "name", "telecom"),
+}
+
+
+class AppointmentFields(TypedDict):
+    id: str
+    status: str
+    start_time: datetime
+    end_time: datetime
+
+
+class PatientDemographics(TypedDict):
+    patient_first_name: str
+    patient_last_name: str
+    patient_phone_no: str
+    patient_email: str
+    patient_id: str
+    patient_name: str
+
+
+def loads(data: str | bytes):
+    """
+    Parses one JSON document, with orjson when it is available.
+    """
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def iter_ndjson(lines):
+    """
+    Yields one resource per non-empty line of an NDJSON stream (str or bytes
+    lines).
+    """
+    for line in lines:
+        if line and line.strip():
+            yield loads(line)
+
+
+class _JSONReader:
+    """
+    Reads JSON values one at a time from text or bytes chunks, keeping only
+    the unread remainder of the stream in memory.
+    """
+
+    def __init__(self, chunks) -> None:
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def _fill(self) -> bool:
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.utf8.decode(chunk)
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        self.done = True
+        return False
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def consume(self, char: str) -> bool:
+        self._skip_whitespace()
+        if self.buffer.startswith(char, self.pos):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char: str) -> None:
+        if not self.consume(char):
+            raise ValueError(f"Expected {char!r} in JSON stream, found {self.buffer[self.pos:self.pos + 20]!r}")
+
+    def value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number ending the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self._fill()
+
+
+def iter_bundle_resources(chunks):
+    """
+    Yields the resource of each entry of a JSON Bundle read in chunks (e.g.
+    Response.iter_content()), so only one entry is parsed and held at a time.
+    Other Bundle members (link, total, ...) are skipped.
+    """
+    reader = _JSONReader(chunks)
+    reader.expect("{")
+    while not reader.consume("}"):
+        name = reader.value()
+        reader.expect(":")
+        if name != "entry":
+            reader.value()
+        else:
+            reader.expect("[")
+            while not reader.consume("]"):
+                if resource := reader.value().get("resource"):
+                    yield resource
+                reader.consume(",")
+        reader.consume(",")
+
+
+def extract(resource: dict) -> dict:
+    """
+    Returns the resource with only the elements in RESOURCE_ELEMENTS, or
+    unchanged for another resource type.
+    """
+    if (elements := RESOURCE_ELEMENTS.get(resource.get("resourceType"))) is None:
+        return resource
+    return {name: resource[name] for name in elements if name in resource}
+
+
+def split_bundle(resources) -> tuple:
+    """
+    Splits a Bundle's resources into its Appointments and the resources
+    pulled in with _include (or read in a batch), keyed "Location/<id>" etc.
+    """
+    appointments, included = [], {}
+    for resource in resources:
+        if resource.get("resourceType") == "Appointment":
+            appointments.append(resource)
+        elif resource.get("id"):
+            included[f"{resource['resourceType']}/{resource['id']}"] = resource
+    return appointments, included
+
+
+def reference_id(reference: dict, resource_type: str) -> str | None:
+    """
+    Returns the id from a Reference to resource_type ("Location/123" or an
+    absolute URL ending in it), or None for another type.
+    """
+    parts = (reference or {}).get("reference", "").split("/")
+    if len(parts) >= 2 and parts[-2] == resource_type:
+        return parts[-1]
+    return None
+
+
+def participant_ids(appointment: dict, resource_type: str) -> list:
+    """
+    Returns the ids of the appointment's participants of resource_type.
+    """
+    return [
+        resource_id
+        for participant in appointment.get("participant", [])
+        if (resource_id := reference_id(participant.get("actor"), resource_type))
+    ]
+
+
+def participant_display(appointment: dict, resource_type: str) -> str | None:
+    """
+    Returns the display name of the appointment's first participant of
+    resource_type. Raises KeyError when that participant has none.
+    """
+    for participant in appointment.get("participant", []):
+        if reference_id(participant.get("actor"), resource_type):
+            return participant["actor"]["display"]
+    return None
+
+
+def appointment_fields(appointment: dict) -> AppointmentFields:
+    """
+    Returns id, status, start_time and end_time of an Appointment resource.
+    Raises KeyError when one of them is missing.
+    """
+    return {
+        "id": appointment["id"],
+        "status": appointment["status"],
+        "start_time": datetime.strptime(appointment["start"], FHIR_DATETIME_FORMAT),
+        "end_time": datetime.strptime(appointment["end"], FHIR_DATETIME_FORMAT),
+    }
+
+
+def location_address(location: dict) -> str:
+    """
+    Joins the Location's address parts with commas, in the order the XML
+    reader produces them (lines, city, district, state, postal code, country).
+    """
+    address = location["address"]
+    parts = list(address.get("line", []))
+    parts += [address[name] for name in ("city", "district", "state", "postalCode", "country") if address.get(name)]
+    return ",".join(parts)
+
+
+def _ranked(telecom: list, system: str) -> list:
+    ranks = {}
+    for contact in telecom:
+        if contact.get("system") != system or not (value := contact.get("value")):
+            continue
+        rank = int(contact.get("rank", DEFAULT_TELECOM_RANK))
+        ranks[value] = min(rank, ranks.get(value, rank))
+    return sorted(ranks, key=ranks.get)
+
+
+def patient_demographics(patient: dict, patient_id: str) -> PatientDemographics:
+    """
+    Maps a Patient resource to the Appointment's patient fields: the usual
+    name, and phone numbers and emails ordered by rank.
+    """
+    first_name = last_name = ""
+    for name in patient.get("name", []):
+        if name.get("use") == "usual":
+            first_name = " ".join(name.get("given", []))
+            last_name = name.get("family", "")
+            break
+    phones = _ranked(patient.get("telecom", []), "phone")
+    emails = _ranked(patient.get("telecom", []), "email")
+    return {
+        "patient_first_name": first_name,
+        "patient_last_name": last_name,
+        "patient_phone_no": str(phones) if phones else "",
+        "patient_email": str(emails) if emails else "",
+        "patient_id": patient_id,
+        "patient_name": f"{first_name} {last_name}",
+    }
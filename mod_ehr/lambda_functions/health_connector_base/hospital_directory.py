@@ -0,0 +1,37 @@
+from health_connector_base.cache import MISSING, LRUCache
+from health_connector_base.constants import HOSPITAL_DIRECTORY_TTL
+from health_connector_base.models import Hospital
+
+# s3_subfolder_name -> Hospital for every hospital with a subfolder, built
+# from one scan of the (small) hospitals table. A subfolder missing from it
+# triggers a rebuild, so a newly provisioned hospital is found on its first
+# upload.
+_directory = LRUCache(maxsize=1, ttl=HOSPITAL_DIRECTORY_TTL)
+
+
+def _build() -> dict:
+    directory = {
+        hospital.s3_subfolder_name: hospital
+        for hospital in Hospital.scan(filter_condition=Hospital.s3_subfolder_name.exists())
+    }
+    _directory.set("by_s3_subfolder", directory)
+    return directory
+
+
+def by_s3_subfolder(subfolder: str) -> Hospital | None:
+    """
+    Returns the hospital whose SFTP uploads land in this S3 subfolder, from
+    the warm directory or a rebuild of it.
+    """
+    directory = _directory.get("by_s3_subfolder")
+    if directory is MISSING or subfolder not in directory:
+        directory = _build()
+    return directory.get(subfolder)
+
+
+def invalidate() -> None:
+    """
+    Drops the directory; called when a hospital is saved or deleted in this
+    process. Other containers pick changes up within HOSPITAL_DIRECTORY_TTL.
+    """
+    _directory.clear()
@@ -0,0 +1,113 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from health_connector_base.cache import CacheStats
+from health_connector_base.constants import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+)
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    Shared outbound HTTP client: one keep-alive session per host, default
+    connect/read timeouts, and jittered-backoff retries on 429/5xx and
+    connection errors. Only idempotent methods are retried, so POSTs that
+    create trips or bookings are never sent twice.
+
+    Keeps per-host request/error counters and latency, see stats().
+    """
+
+    def __init__(
+        self,
+        timeout: tuple = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        max_retries: int = HTTP_MAX_RETRIES,
+        pool_size: int = HTTP_POOL_SIZE,
+    ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def _retry(self) -> Retry:
+        return Retry(
+            total=self.max_retries,
+            backoff_factor=0.3,
+            backoff_jitter=0.3,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+
+    def session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        base = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if base not in self._sessions:
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=self._retry(),
+                )
+                session = requests.Session()
+                session.mount(base, adapter)
+                self._sessions[base] = session
+            return self._sessions[base]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        started = time.perf_counter()
+        try:
+            response = self.session(url).request(method, url, **kwargs)
+        except requests.RequestException:
+            self._stats.incr(f"{host}.errors")
+            raise
+        finally:
+            self._stats.incr(f"{host}.requests")
+            self._stats.incr(f"{host}.seconds", time.perf_counter() - started)
+        if response.status_code >= 400:
+            self._stats.incr(f"{host}.errors")
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Returns {host: {requests, errors, avg_latency_seconds}} since start.
+        """
+        hosts = {}
+        for name, value in self._stats.as_dict().items():
+            host, counter = name.rsplit(".", 1)
+            hosts.setdefault(host, {})[counter] = value
+        return {
+            host: {
+                "requests": int(counters.get("requests", 0)),
+                "errors": int(counters.get("errors", 0)),
+                "avg_latency_seconds": round(
+                    counters.get("seconds", 0) / counters["requests"], 4
+                )
+                if counters.get("requests")
+                else 0,
+            }
+            for host, counters in hosts.items()
+        }
+
+
+# Shared by all integrations so connections survive across warm invocations.
+http_client = HttpClient()
@@ -1,30 +1,98 @@
-import threading
+import time
 
 from geopy.distance import geodesic
-from geopy.geocoders import GoogleV3
 from health_connector_base import SecretsManager
+from health_connector_base.cache import TieredCache
+from health_connector_base.constants import (
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    GEOCODE_NEGATIVE_TTL,
+)
+from health_connector_base.http_client import http_client
 
 PROXIMITY_TIME = 15  # min
 PROXIMITY_DISTANCE = 1  # km
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Shared by every LocationManager instance, so it lives across warm invocations.
+_geocode_cache = TieredCache(
+    "geocode",
+    ttl=GEOCODE_CACHE_TTL,
+    negative_ttl=GEOCODE_NEGATIVE_TTL,
+    maxsize=GEOCODE_CACHE_SIZE,
+)
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = 9) -> str:
+    """
+    Encodes coordinates as a geohash (precision 9 is a ~5m cell).
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+    while len(geohash) < precision:
+        value, value_range = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(geohash)
+
+
+def normalize_address(address: str) -> str:
+    """
+    Normalizes an address into a cache key: lower-cased, whitespace collapsed
+    and empty comma-separated parts dropped ("610,10th St,,Perry" and
+    "610, 10th st, Perry" share a key).
+    """
+    parts = (" ".join(part.split()) for part in (address or "").lower().split(","))
+    return ", ".join(part for part in parts if part)
 
 
 class LocationManager:
-    _connections = threading.local()
+    _api_key = None
 
     @property
-    def geolocator(self):
-        connection = getattr(self._connections, "geo_connection", None)
-        if not connection:
-            self._connections.geo_connection = GoogleV3(
-                api_key=SecretsManager().get_secret_value("google_map_api_key"),
-                user_agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-                timeout=None,
+    def api_key(self) -> str:
+        if not LocationManager._api_key:
+            LocationManager._api_key = SecretsManager().get_secret_value(
+                "google_map_api_key"
             )
-        return self._connections.geo_connection
+        return LocationManager._api_key
+
+    def _geocode(self, address: str) -> list | None:
+        started = time.perf_counter()
+        try:
+            response = http_client.get(
+                GOOGLE_GEOCODE_URL, params={"address": address, "key": self.api_key}
+            )
+        finally:
+            _geocode_cache.stats.incr("api_calls")
+            _geocode_cache.stats.incr("api_seconds", time.perf_counter() - started)
+        response.raise_for_status()
+        data = response.json()
+        if data["status"] == "ZERO_RESULTS":
+            return None
+        if data["status"] != "OK":
+            # Quota/auth errors must not be cached as "address not found"
+            raise ValueError(f"Geocoding failed with status {data['status']}")
+        location = data["results"][0]["geometry"]["location"]
+        return [location["lat"], location["lng"]]
 
     def get_coordinates(self, address: str) -> list:
-        if location := self.geolocator.geocode(address):
-            return [location.latitude, location.longitude]
+        if not (key := normalize_address(address)):
+            return None
+        return _geocode_cache.get_or_load(key, lambda: self._geocode(address))
 
     def get_distance(self, coordinates_1, coordinates_2) -> int:
         return geodesic(coordinates_1, coordinates_2).kilometers
@@ -34,4 +102,20 @@ class LocationManager:
             return self.get_distance(address_coords, coord)
 
     def is_valid_address(self, address: str):
-        return self.geolocator.geocode(address)
+        return self.get_coordinates(address)
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """
+        Returns geocode cache counters along with the API calls and latency the
+        cache saved, estimated from the average latency of real geocoder calls.
+        """
+        stats = _geocode_cache.stats.as_dict()
+        api_calls = stats.get("api_calls", 0)
+        avg_latency = stats.get("api_seconds", 0) / api_calls if api_calls else 0
+        saved_calls = stats.get("local_hits", 0) + stats.get("shared_hits", 0)
+        return stats | {
+            "saved_api_calls": saved_calls,
+            "avg_api_latency_seconds": round(avg_latency, 4),
+            "estimated_saved_seconds": round(saved_calls * avg_latency, 2),
+        }
@@ -11,15 +11,24 @@ from health_connector_base.custom_attributes import (
 from health_connector_base.custom_attributes import (
     CustomUTCDateTimeAttribute as UTCDateTimeAttribute,
 )
-from pynamodb.attributes import BooleanAttribute, JSONAttribute, NumberAttribute, UnicodeAttribute
+from health_connector_base.location_manager import LocationManager, encode_geohash
+from pynamodb.attributes import (
+    BooleanAttribute,
+    JSONAttribute,
+    NumberAttribute,
+    TTLAttribute,
+    UnicodeAttribute,
+    UnicodeSetAttribute,
+)
 from pynamodb.expressions.condition import Condition
 from pynamodb.models import Model
-from pynamodb.indexes import GlobalSecondaryIndex, AllProjection
+from pynamodb.indexes import GlobalSecondaryIndex, AllProjection, IncludeProjection
 
 
 class BaseModel(Model):
-    created = UTCDateTimeAttribute(default_for_new=datetime.now(timezone.utc))
-    modified = UTCDateTimeAttribute(default=datetime.now(timezone.utc))
+    # Callables, so new items get the time they are created rather than the import time
+    created = UTCDateTimeAttribute(default_for_new=lambda: datetime.now(timezone.utc))
+    modified = UTCDateTimeAttribute(default=lambda: datetime.now(timezone.utc))
 
     def save(
         self, condition: Condition | None = None, *, add_version_condition: bool = True
@@ -29,6 +38,49 @@ class BaseModel(Model):
             condition, add_version_condition=add_version_condition
         )
 
+class GeoLocatedMixin:
+    """
+    For models with a `location` address plus stored latitude/longitude/geohash,
+    so readers never have to geocode the address again.
+    """
+
+    @property
+    def coordinates(self) -> list | None:
+        if self.latitude is None or self.longitude is None:
+            return None
+        return [float(self.latitude), float(self.longitude)]
+
+    def resolve_coordinates(self, force: bool = False) -> list | None:
+        """
+        Fills latitude/longitude/geohash from the location address, unless they
+        are already set. Returns the coordinates, or None if it did not geocode.
+        """
+        if not force and (coordinates := self.coordinates):
+            return coordinates
+        coordinates = AddressAttribute.validated_coordinates(
+            self.location
+        ) or LocationManager().get_coordinates(self.location)
+        if coordinates:
+            self.latitude, self.longitude = coordinates
+            self.geohash = encode_geohash(*coordinates)
+        else:
+            self.latitude = self.longitude = self.geohash = None
+        return coordinates
+
+    def coordinate_actions(self) -> list:
+        """
+        Returns update() actions that persist the current coordinates.
+        """
+        cls = type(self)
+        if self.coordinates is None:
+            return [cls.latitude.remove(), cls.longitude.remove(), cls.geohash.remove()]
+        return [
+            cls.latitude.set(self.latitude),
+            cls.longitude.set(self.longitude),
+            cls.geohash.set(self.geohash),
+        ]
+
+
 class PatientIdIndex(GlobalSecondaryIndex):
     """
     GSI where the partition key is patient_id
@@ -47,12 +99,27 @@ class AppointmentsByHospitalsIndex(GlobalSecondaryIndex):
     hospital_id = UnicodeAttribute(hash_key=True)
     end_time = UTCDateTimeAttribute(range_key=True)
 
-class Appointment(BaseModel):
+class BookedAppointmentsIndex(GlobalSecondaryIndex):
+    """
+    Sparse GSI holding only Booked appointments, keyed by hospital and
+    end_time, so upcoming-ride matching never reads appointment history.
+    """
+    class Meta:
+        index_name = "booked_hospital_id-end_time-index"
+        projection = AllProjection()
+
+    booked_hospital_id = UnicodeAttribute(hash_key=True)
+    end_time = UTCDateTimeAttribute(range_key=True)
+
+class Appointment(GeoLocatedMixin, BaseModel):
     hospital_id = UnicodeAttribute(hash_key=True)
     id = UnicodeAttribute(range_key=True, default_for_new=lambda: str(uuid.uuid4()))
     patient_id = UnicodeAttribute()
     patient_name = UnicodeAttribute()
     location = AddressAttribute()
+    latitude = NumberAttribute(null=True)
+    longitude = NumberAttribute(null=True)
+    geohash = UnicodeAttribute(null=True)
     start_time = UTCDateTimeAttribute()
     end_time = UTCDateTimeAttribute()
     status = UnicodeAttribute()
@@ -60,6 +127,9 @@ class Appointment(BaseModel):
     ride = JSONAttribute(default=lambda: VIA_RIDE_MOCK)
     patient_id_index = PatientIdIndex()
     appointments_by_hospitals = AppointmentsByHospitalsIndex()
+    # hospital_id while status is Booked, absent otherwise (sparse index key)
+    booked_hospital_id = UnicodeAttribute(null=True)
+    booked_appointments = BookedAppointmentsIndex()
     patient_first_name = UnicodeAttribute(null=True, default="")
     patient_last_name = UnicodeAttribute(null=True, default="")
     patient_phone_no = UnicodeAttribute(null=True, default="")
@@ -67,10 +137,38 @@ class Appointment(BaseModel):
     coordinator_notes = UnicodeAttribute(null=True, default="")
     alt_transport_confirmed_to = BooleanAttribute(null=True, default=False)
     alt_transport_confirmed_from = BooleanAttribute(null=True, default=False)
+    # Hash of the source row an ingested appointment was written from
+    content_hash = UnicodeAttribute(null=True)
 
     class Meta:
         table_name = os.environ.get("APPOINTMENT_TABLE_NAME")
 
+    def serialize(self, *args, **kwargs) -> Dict[str, Any]:
+        # Every save and batch write keeps the sparse index key in sync
+        self.booked_hospital_id = self.hospital_id if self.status == "Booked" else None
+        return super().serialize(*args, **kwargs)
+
+    def booked_actions(self, changes: dict) -> list:
+        """
+        Returns the update actions that keep booked_hospital_id in sync when
+        `changes` are applied with update() rather than save().
+        """
+        if changes.get("status", self.status) == "Booked":
+            return [Appointment.booked_hospital_id.set(self.hospital_id)]
+        return [Appointment.booked_hospital_id.remove()]
+
+
+class PatientsByRiderLinkIndex(GlobalSecondaryIndex):
+    """
+    Sparse GSI over patients that have been linked to a Via rider, partitioned
+    by provider and sorted by modified for incremental refreshes.
+    """
+    class Meta:
+        index_name = "rider_linked-modified-index"
+        projection = IncludeProjection(["via_rider_id", "provider"])
+
+    rider_linked = UnicodeAttribute(hash_key=True)
+    modified = UTCDateTimeAttribute(range_key=True)
 
 class Patient(BaseModel):
     hospital_id = UnicodeAttribute(hash_key=True)
@@ -78,10 +176,32 @@ class Patient(BaseModel):
     name = UnicodeAttribute()
     via_rider_id = UnicodeAttribute(null=True, default="")
     provider = ChoiceUnicodeAttribute(choices=["epic", "veradigm"], default="epic")
+    # Provider of a patient that has (or had) a Via rider, absent otherwise.
+    # Kept when the rider is removed so incremental refreshes see the unlink.
+    rider_linked = UnicodeAttribute(null=True)
+    rider_linked_index = PatientsByRiderLinkIndex()
 
     class Meta:
         table_name = os.environ.get("PATIENTS_TABLE_NAME")
 
+    def serialize(self, *args, **kwargs) -> Dict[str, Any]:
+        # Every save and batch write keeps the sparse index key in sync
+        if self.via_rider_id:
+            self.rider_linked = self.provider
+        return super().serialize(*args, **kwargs)
+
+    def rider_link_actions(self, changes: dict) -> list:
+        """
+        Returns the update actions that keep rider_linked and modified in sync
+        when `changes` are applied with update() rather than save().
+        """
+        via_rider_id = changes.get("via_rider_id", self.via_rider_id)
+        provider = changes.get("provider", self.provider)
+        actions = [Patient.modified.set(datetime.now(timezone.utc))]
+        if via_rider_id or self.rider_linked:
+            actions.append(Patient.rider_linked.set(provider))
+        return actions
+
 class Settings(BaseModel):
     hospital_id = UnicodeAttribute(hash_key=True)
     name = UnicodeAttribute(range_key=True)
@@ -90,21 +210,68 @@ class Settings(BaseModel):
     class Meta:
         table_name = os.environ.get("SETTINGS_TABLE_NAME")
 
+    def save(self, *args, **kwargs) -> Dict[str, Any]:
+        response = super().save(*args, **kwargs)
+        # Imported lazily: settings_cache imports this module
+        from health_connector_base import settings_cache
+
+        settings_cache.invalidate(self.hospital_id, self.modified)
+        return response
+
+    def delete(self, *args, **kwargs) -> Any:
+        response = super().delete(*args, **kwargs)
+        from health_connector_base import settings_cache
+
+        settings_cache.invalidate(self.hospital_id)
+        return response
+
+class FTPLogsByEtagIndex(GlobalSecondaryIndex):
+    """
+    Finds earlier uploads of a hospital with the same content (S3 ETag).
+    """
+    class Meta:
+        index_name = "hospital_id-etag-index"
+        projection = IncludeProjection(["rows_ingested", "rows_failed", "rows_skipped"])
+
+    hospital_id = UnicodeAttribute(hash_key=True)
+    etag = UnicodeAttribute(range_key=True)
+
 class FTPLogs(BaseModel):
     hospital_id = UnicodeAttribute(hash_key=True)
     name = UnicodeAttribute(range_key=True)
     server_last_modified = NumberAttribute()
+    rows_ingested = NumberAttribute(null=True)
+    rows_failed = NumberAttribute(null=True)
+    error_report_key = UnicodeAttribute(null=True)
+    # Rows identical to the stored appointment, not re-written
+    rows_skipped = NumberAttribute(null=True)
+    etag = UnicodeAttribute(null=True)
+    # Earlier file with the same ETag when this upload was skipped as a copy
+    duplicate_of = UnicodeAttribute(null=True)
+    # Set while a sharded file is in progress: the ids of the shards that
+    # finished and of those whose last attempt failed. The shard that
+    # completes the set merges.
+    shards_total = NumberAttribute(null=True)
+    shards_completed = UnicodeSetAttribute(null=True)
+    shards_failed = UnicodeSetAttribute(null=True)
+    # "sharded" while shards run, "merging", or "failed" after a shard or the
+    # merge raised; removed once the merge finished
+    shard_status = UnicodeAttribute(null=True)
+    etag_index = FTPLogsByEtagIndex()
 
     class Meta:
         table_name = os.environ.get("FTPLOGS_TABLE_NAME")
 
-class Hospital(BaseModel):
+class Hospital(GeoLocatedMixin, BaseModel):
     id = UnicodeAttribute(hash_key=True)
     name = UnicodeAttribute()
     subdomain = UnicodeAttribute()
     status = UnicodeAttribute()
     timezone = UnicodeAttribute(default="CT")
     location = AddressAttribute()
+    latitude = NumberAttribute(null=True)
+    longitude = NumberAttribute(null=True)
+    geohash = UnicodeAttribute(null=True)
     provider = ChoiceUnicodeAttribute(choices=["epic", "veradigm"], default="epic")
     # epic_client_id = UnicodeAttribute(null=True, default=None)
     # epic_private_key = UnicodeAttribute(null=True, default=None)
@@ -117,3 +284,32 @@ class Hospital(BaseModel):
 
     class Meta:
         table_name = os.environ.get("HOSPITALS_TABLE_NAME")
+
+    def save(self, *args, **kwargs) -> Dict[str, Any]:
+        response = super().save(*args, **kwargs)
+        # Imported lazily: hospital_directory imports this module
+        from health_connector_base import hospital_directory
+
+        hospital_directory.invalidate()
+        return response
+
+    def delete(self, *args, **kwargs) -> Any:
+        response = super().delete(*args, **kwargs)
+        from health_connector_base import hospital_directory
+
+        hospital_directory.invalidate()
+        return response
+
+
+class CacheEntry(BaseModel):
+    """
+    Shared cache tier (geocodes, ...) keyed by namespace and cache key.
+    Expired items are removed by the DynamoDB TTL on expires_at.
+    """
+    namespace = UnicodeAttribute(hash_key=True)
+    cache_key = UnicodeAttribute(range_key=True)
+    value = JSONAttribute(null=True)
+    expires_at = TTLAttribute(null=True)
+
+    class Meta:
+        table_name = os.environ.get("CACHE_TABLE_NAME")
@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from health_connector_base.constants import (
+    PATIENT_MAPPING_CLOCK_SKEW,
+    PATIENT_MAPPING_REBUILD_INTERVAL,
+)
+from health_connector_base.models import Patient
+
+PROVIDERS = ("epic", "veradigm")
+
+
+class PatientRiderMapping:
+    """
+    Warm-container snapshot of (hospital_id, patient_id) -> via_rider_id for
+    every Via-linked patient, built from the sparse rider_linked index.
+
+    The first build (and one every PATIENT_MAPPING_REBUILD_INTERVAL seconds,
+    to drop deleted patients) queries each provider's partition in full; in
+    between only patients modified since the last build are read.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.links = {provider: {} for provider in PROVIDERS}
+        self.high_water = None
+        self.built_at = None
+
+    def _query(self, provider: str, since) -> list:
+        condition = Patient.modified > since if since else None
+        return list(Patient.rider_linked_index.query(provider, range_key_condition=condition))
+
+    def _fetch(self, since) -> dict:
+        with ThreadPoolExecutor(max_workers=len(PROVIDERS)) as executor:
+            results = executor.map(lambda provider: self._query(provider, since), PROVIDERS)
+            return dict(zip(PROVIDERS, results))
+
+    def refresh(self) -> None:
+        with self._lock:
+            full = (
+                self.built_at is None
+                or time.monotonic() - self.built_at > PATIENT_MAPPING_REBUILD_INTERVAL
+            )
+            since = None
+            if not full and self.high_water:
+                since = self.high_water - timedelta(seconds=PATIENT_MAPPING_CLOCK_SKEW)
+            patients_by_provider = self._fetch(since)
+            if full:
+                self.links = {provider: {} for provider in PROVIDERS}
+                self.built_at = time.monotonic()
+            updated = 0
+            for provider, patients in patients_by_provider.items():
+                for patient in patients:
+                    key = (patient.hospital_id, patient.patient_id)
+                    for links in self.links.values():
+                        links.pop(key, None)
+                    if patient.via_rider_id:
+                        self.links[provider][key] = patient.via_rider_id
+                    if patient.modified and (not self.high_water or patient.modified > self.high_water):
+                        self.high_water = patient.modified
+                    updated += 1
+            print(f"{'Rebuilt' if full else 'Refreshed'} patient mapping from {updated} patient(s)")
+
+    def get(self) -> dict:
+        """
+        Returns {"epic": {...}, "veradigm": {...}, "all": {...}} keyed by
+        (hospital_id, patient_id), refreshed first.
+        """
+        self.refresh()
+        with self._lock:
+            mapping = {provider: dict(links) for provider, links in self.links.items()}
+        mapping["all"] = {
+            key: rider_id for provider in PROVIDERS for key, rider_id in mapping[provider].items()
+        }
+        return mapping
+
+
+# Module level so the snapshot survives across warm invocations
+patient_rider_mapping = PatientRiderMapping()
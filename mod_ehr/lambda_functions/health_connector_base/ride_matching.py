@@ -0,0 +1,182 @@
+import numpy as np
+from geopy.distance import geodesic
+from health_connector_base.constants import LOCATION_DIFF
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 110.0  # lower bound of km per degree of latitude, for the bbox
+# Haversine (sphere) differs from the WGS-84 geodesic by less than ~0.6%; any
+# decision closer than this to a threshold is re-checked with geodesic.
+HAVERSINE_TOLERANCE = 0.01
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Vectorized great-circle distance in km between points given in degrees.
+    """
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _point(trip: dict, name: str) -> tuple:
+    point = trip.get(name) or {}
+    lat, lng = point.get("lat"), point.get("lng")
+    if lat is None or lng is None:
+        return np.nan, np.nan
+    return lat, lng
+
+
+def _eta(trip: dict, name: str) -> float:
+    eta = trip.get(name)
+    return np.nan if eta is None else eta
+
+
+class RideMatcher:
+    """
+    Matches all of a rider's Via trips against their appointments in one pass.
+
+    Gives the same results as the per-trip scalar matching: a to-appointment
+    ride is the trip whose dropoff_eta is closest to the appointment start, with
+    the dropoff within location_diff km (truncated) of the appointment and the
+    pickup farther away; a from-appointment ride mirrors it on pickup_eta and
+    the appointment end. Ties go to the earliest trip in the list.
+
+    Args:
+        trips (list): The rider's Via trips.
+        prior_period (int): Latest allowed time delta in seconds.
+        subsequent_period (int): Earliest allowed time delta in seconds.
+        location_diff (int): Max truncated distance in km from the appointment.
+    """
+
+    def __init__(
+        self,
+        trips: list,
+        prior_period: int,
+        subsequent_period: int,
+        location_diff: int = LOCATION_DIFF,
+    ) -> None:
+        self.trips = list(trips)
+        self.prior_period = prior_period
+        self.subsequent_period = subsequent_period
+        self.location_diff = location_diff
+        self.pickup = np.array(
+            [_point(trip, "pickup") for trip in self.trips], dtype=float
+        ).reshape(-1, 2)
+        self.dropoff = np.array(
+            [_point(trip, "dropoff") for trip in self.trips], dtype=float
+        ).reshape(-1, 2)
+        self.pickup_eta = np.array(
+            [_eta(trip, "pickup_eta") for trip in self.trips], dtype=float
+        )
+        self.dropoff_eta = np.array(
+            [_eta(trip, "dropoff_eta") for trip in self.trips], dtype=float
+        )
+        self.has_points = ~(
+            np.isnan(self.pickup).any(axis=1) | np.isnan(self.dropoff).any(axis=1)
+        )
+
+    def match(self, appointments: list) -> list:
+        """
+        Returns a (to_ride, from_ride) pair for every appointment, with {} where
+        no trip matches.
+
+        Args:
+            appointments (list): (coordinates, start_timestamp, end_timestamp)
+                tuples; coordinates is [lat, lng] or None if it did not geocode.
+        """
+        coords, starts, ends = self._appointment_arrays(appointments)
+        to_rides = self._best_trips(
+            coords, starts, self.dropoff_eta, self.dropoff, self.pickup, sign=1
+        )
+        from_rides = self._best_trips(
+            coords, ends, self.pickup_eta, self.pickup, self.dropoff, sign=-1
+        )
+        return list(zip(to_rides, from_rides))
+
+    def match_to_rides(self, appointments: list) -> list:
+        coords, starts, _ = self._appointment_arrays(appointments)
+        return self._best_trips(
+            coords, starts, self.dropoff_eta, self.dropoff, self.pickup, sign=1
+        )
+
+    def match_from_rides(self, appointments: list) -> list:
+        coords, _, ends = self._appointment_arrays(appointments)
+        return self._best_trips(
+            coords, ends, self.pickup_eta, self.pickup, self.dropoff, sign=-1
+        )
+
+    @staticmethod
+    def _appointment_arrays(appointments: list) -> tuple:
+        coords = np.array(
+            [c if c else (np.nan, np.nan) for c, _, _ in appointments], dtype=float
+        ).reshape(-1, 2)
+        starts = np.array([start for _, start, _ in appointments], dtype=float)
+        ends = np.array([end for _, _, end in appointments], dtype=float)
+        return coords, starts, ends
+
+    def _best_trips(self, coords, times, etas, anchor, other, sign) -> list:
+        """
+        Picks the best trip per appointment for one leg. anchor is the trip end
+        that must be near the appointment and other the end that must be
+        farther away; sign orients the time delta (1: time - eta, -1: eta - time).
+        """
+        if not len(self.trips) or not len(coords):
+            return [{} for _ in range(len(coords))]
+
+        # Time window on the full (appointments x trips) grid
+        diff = np.trunc(sign * (times[:, None] - etas[None, :]))
+        candidate = (
+            self.has_points[None, :]
+            & ~np.isnan(etas)[None, :]
+            & ~np.isnan(coords).any(axis=1)[:, None]
+            & (self.subsequent_period <= diff)
+            & (diff <= self.prior_period)
+        )
+
+        # Cheap bounding-box pre-filter: int(km) <= location_diff means km < location_diff + 1
+        limit_km = (self.location_diff + 1) * (1 + HAVERSINE_TOLERANCE)
+        lat_limit = limit_km / KM_PER_DEGREE
+        lng_limit = lat_limit / np.maximum(np.cos(np.radians(coords[:, 0])), 1e-6)
+        d_lng = np.abs(anchor[None, :, 1] - coords[:, None, 1])
+        d_lng = np.minimum(d_lng, 360 - d_lng)
+        candidate &= (np.abs(anchor[None, :, 0] - coords[:, None, 0]) <= lat_limit) & (
+            d_lng <= lng_limit[:, None]
+        )
+
+        rows, cols = np.nonzero(candidate)
+        if len(rows):
+            near, away = self._distance_checks(coords[rows], anchor[cols], other[cols])
+            keep = near & away
+            candidate[rows[~keep], cols[~keep]] = False
+
+        score = np.where(candidate, np.abs(diff), np.inf)
+        best = np.argmin(score, axis=1)
+        best_score = score[np.arange(len(coords)), best]
+        return [
+            self.trips[idx] if value < 1e9 else {}
+            for idx, value in zip(best, best_score)
+        ]
+
+    def _distance_checks(self, points, anchor, other) -> tuple:
+        """
+        Returns (near, heading) masks: the anchor end is within location_diff km
+        and the other end is farther from the appointment than the anchor.
+        Haversine decides; cases within tolerance of a threshold use geodesic.
+        """
+        anchor_km = haversine_km(points[:, 0], points[:, 1], anchor[:, 0], anchor[:, 1])
+        other_km = haversine_km(points[:, 0], points[:, 1], other[:, 0], other[:, 1])
+        threshold = self.location_diff + 1
+        near = anchor_km < threshold
+        heading = other_km > anchor_km
+        unsure = (np.abs(anchor_km - threshold) <= HAVERSINE_TOLERANCE * threshold) | (
+            np.abs(other_km - anchor_km) <= HAVERSINE_TOLERANCE * (other_km + anchor_km) + 1e-9
+        )
+        for i in np.nonzero(unsure)[0]:
+            exact_anchor = geodesic(points[i].tolist(), anchor[i].tolist()).kilometers
+            exact_other = geodesic(points[i].tolist(), other[i].tolist()).kilometers
+            near[i] = int(exact_anchor) <= self.location_diff
+            heading[i] = not exact_other <= exact_anchor
+        return near, heading
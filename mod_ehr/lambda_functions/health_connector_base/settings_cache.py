@@ -0,0 +1,68 @@
+import time
+from datetime import datetime, timezone
+
+from health_connector_base.cache import MISSING, LRUCache, get_shared_store
+from health_connector_base.constants import SETTINGS_CACHE_TTL, SETTINGS_CHECK_INTERVAL
+from health_connector_base.models import Settings
+
+NAMESPACE = "settings"
+
+# hospital_id -> {"settings": {name: value}, "version": float, "checked_at": float}
+_settings = LRUCache(maxsize=256, ttl=SETTINGS_CACHE_TTL)
+_store = None
+
+
+def _shared_store():
+    global _store
+    if _store is None:
+        _store = get_shared_store()
+    return _store
+
+
+def _load(hospital_id: str) -> dict:
+    settings, version = {}, 0.0
+    for setting in Settings.query(hospital_id):
+        settings[setting.name] = setting.value
+        if setting.modified:
+            version = max(version, setting.modified.timestamp())
+    # The write stamp also covers deletes, which leave no modified row behind
+    stamp = _shared_store().get(NAMESPACE, hospital_id)
+    if stamp is not MISSING and stamp:
+        version = max(version, stamp)
+    return {"settings": settings, "version": version, "checked_at": time.monotonic()}
+
+
+def get_settings(hospital_id: str) -> dict:
+    """
+    Returns {name: value} for all of the hospital's settings, loaded with one
+    Settings.query and memoized across calls and warm invocations.
+
+    A cached entry is re-validated at most every SETTINGS_CHECK_INTERVAL
+    seconds against the stamp settings writes leave in the shared cache tier,
+    and reloaded when a newer write happened.
+    """
+    entry = _settings.get(hospital_id)
+    if entry is not MISSING:
+        if time.monotonic() - entry["checked_at"] < SETTINGS_CHECK_INTERVAL:
+            return entry["settings"]
+        stamp = _shared_store().get(NAMESPACE, hospital_id)
+        if stamp is MISSING or not stamp or stamp <= entry["version"]:
+            entry["checked_at"] = time.monotonic()
+            return entry["settings"]
+    entry = _load(hospital_id)
+    _settings.set(hospital_id, entry)
+    return entry["settings"]
+
+
+def get_setting(hospital_id: str, name: str, default=None):
+    return get_settings(hospital_id).get(name, default)
+
+
+def invalidate(hospital_id: str, modified: datetime | None = None) -> None:
+    """
+    Records that the hospital's settings changed at `modified` so every
+    cached copy reloads, and drops the local copy right away.
+    """
+    modified = modified or datetime.now(timezone.utc)
+    _settings.delete(hospital_id)
+    _shared_store().set(NAMESPACE, hospital_id, modified.timestamp())
@@ -1,20 +1,80 @@
 import time
 import uuid
+from functools import lru_cache
 
 import jwt
-import requests
-import xmltodict
-from health_connector_base import SecretsManager
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from health_connector_base import fhir
+from health_connector_base.cache import MISSING, LRUCache, TieredCache
+from health_connector_base.constants import (
+    EPIC_FHIR_BASE_URL,
+    EPIC_LOCATION_CACHE_TTL,
+    EPIC_TOKEN_URL,
+    Status,
+)
+from health_connector_base.http_client import http_client
+from health_connector_base.location_manager import LocationManager, encode_geohash
+
+TOKEN_REFRESH_MARGIN = 60  # sec, a cached token is dropped this long before it expires
+DEFAULT_TOKEN_TTL = 300  # sec, when the token response has no expires_in
+RESPONSE_CHUNK_SIZE = 64 * 1024  # bytes read at a time from streamed Bundles
+FHIR_JSON = "application/fhir+json"
+
+# client_id -> access token, with a TTL from expires_in. Kept per process for
+# warm invocations only: bearer tokens are never written to the shared cache
+# table.
+_access_tokens = LRUCache(maxsize=256)
+
+
+# Location id -> {"address": str, "coordinates": [lat, lng] | None}. Clinic
+# locations rarely change and are shared by most appointments.
+_locations = TieredCache("epic_locations", ttl=EPIC_LOCATION_CACHE_TTL, maxsize=1024)
+
+APPOINTMENT_INCLUDES = ["Appointment:location", "Appointment:patient"]
+
+
+def location_fields(location: dict) -> dict:
+    """
+    Returns the Appointment fields for a cached location, coordinates
+    included so the appointment needs no geocode lookup.
+    """
+    fields = {"location": location["address"]}
+    if coordinates := location.get("coordinates"):
+        fields |= {
+            "latitude": coordinates[0],
+            "longitude": coordinates[1],
+            "geohash": encode_geohash(*coordinates),
+        }
+    return fields
+
+
+def _location_entry(address: str) -> dict:
+    return {"address": address, "coordinates": LocationManager().get_coordinates(address)}
+
+
+def cache_location(location_id: str, address: str) -> dict:
+    """
+    Stores a Location read some other way (e.g. a Bulk Data export) in the
+    location cache and returns its entry.
+    """
+    location = _location_entry(address)
+    _locations.set(location_id, location)
+    return location
+
+
+@lru_cache(maxsize=64)
+def _load_private_key(pem: str):
+    # Parsing the PEM dominates RS256 signing; the key object is reused
+    return load_pem_private_key(pem.encode("utf-8"), password=None)
 
 
 class JWTHelper(object):
     def __init__(self, client_id=None, private_key=None, jwks_url=None, jwks_kid=None):
-        secrets_manager = SecretsManager()
         self.client_id = client_id
         self.jwt_private_key = private_key
         self.JWKS_URL = jwks_url
         self.JWKS_kid = jwks_kid
-        self.token_url = "https://fhir.epic.com/interconnect-fhir-oauth/oauth2/token"
+        self.token_url = EPIC_TOKEN_URL
         self.auth_headers = {"Content-Type": "application/x-www-form-urlencoded"}
         self.token_expiry_offset = 180  # in seconds
         self.token_buffer = 10  # in seconds
@@ -44,30 +104,95 @@ class JWTHelper(object):
         return {"alg": "RS256", "typ": "JWT", "kid": self.JWKS_kid, "jku": self.JWKS_URL}
 
     def generate_jwt(self) -> str:
+        key = self.jwt_private_key
+        if isinstance(key, str) and key.lstrip().startswith("-----BEGIN"):
+            key = _load_private_key(key)
         return jwt.encode(
             payload=self.jwt_payload,
-            key=self.jwt_private_key,
+            key=key,
             algorithm="RS256",
             headers=self.jwt_headers,
         )
 
 
 class SmartEpicClient:
-    def __init__(self, jwt_input: str):
-        self.token_url = "https://fhir.epic.com/interconnect-fhir-oauth/oauth2/token"
-        self.base_url = "https://fhir.epic.com/interconnect-fhir-oauth/api/FHIR/R4"
+    def __init__(self, jwt_input: str | None = None, client_id: str | None = None, jwt_factory=None):
+        """
+        Args:
+            jwt_input: A signed client assertion.
+            client_id: Caches the access token per Epic client across clients
+                and warm invocations.
+            jwt_factory: Called for the client assertion only when a token
+                has to be requested, instead of passing jwt_input.
+        """
+        self.token_url = EPIC_TOKEN_URL
+        self.base_url = EPIC_FHIR_BASE_URL
         self.jwt = jwt_input
+        self.jwt_factory = jwt_factory
+        self.client_id = client_id
         self.token = None
 
-    def set_access_token(self) -> None:
-        r = requests.post(
+    def set_access_token(self, force: bool = False) -> None:
+        if self.client_id and not force:
+            if (token := _access_tokens.get(self.client_id)) is not MISSING:
+                self.token = token
+                return
+        if self.jwt_factory and (self.jwt is None or force):
+            # A client assertion is single use (jti), so sign a fresh one
+            self.jwt = self.jwt_factory()
+        r = http_client.post(
             self.token_url,
             data=self.request_body(),
             headers={"Content-Type": "application/x-www-form-urlencoded"},
         )
         print("response for set access token:",r)
         if r.ok:
-            self.token = r.json()["access_token"]
+            body = r.json()
+            self.token = body["access_token"]
+            if self.client_id:
+                ttl = int(body.get("expires_in") or DEFAULT_TOKEN_TTL) - TOKEN_REFRESH_MARGIN
+                if ttl > 0:
+                    _access_tokens.set(self.client_id, self.token, ttl=ttl)
+
+    def _request(self, method: str, url: str, headers: dict | None = None, **kwargs):
+        """
+        Sends a FHIR request with the access token, requesting a new token
+        once if Epic answers 401 (e.g. a cached token was revoked).
+        """
+        r = http_client.request(method, url, headers=self.add_auth_header(dict(headers or {})), **kwargs)
+        if r.status_code == Status.HTTP_401_UNAUTHORIZED and self.client_id:
+            r.close()
+            _access_tokens.delete(self.client_id)
+            self.set_access_token(force=True)
+            if self.token:
+                r = http_client.request(method, url, headers=self.add_auth_header(dict(headers or {})), **kwargs)
+        return r
+
+    def _get(self, url: str, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def _get_resource(self, url: str) -> dict | None:
+        """
+        Reads one resource as JSON. Returns None when the read fails.
+        """
+        r = self._get(url, params={"_format": "json"}, headers={"Accept": FHIR_JSON})
+        return fhir.loads(r.content) if r.ok else None
+
+    def _bundle_resources(self, method: str, url: str, **kwargs) -> list | None:
+        """
+        Sends a search or batch request for a JSON Bundle and parses it entry
+        by entry while it downloads, never holding the whole response.
+
+        Returns:
+            list | None: The entries' resources (see fhir.extract), or None
+            when it failed.
+        """
+        headers = {"Accept": FHIR_JSON} | kwargs.pop("headers", {})
+        with self._request(method, url, headers=headers, stream=True, **kwargs) as r:
+            if not r.ok:
+                print(f"Epic {method} {url} failed with status {r.status_code}")
+                return None
+            return [fhir.extract(resource) for resource in fhir.iter_bundle_resources(r.iter_content(RESPONSE_CHUNK_SIZE))]
 
     def add_auth_header(self, headers: dict) -> dict:
         headers["Authorization"] = f"Bearer {self.token}"
@@ -80,54 +205,100 @@ class SmartEpicClient:
             "client_assertion": self.jwt,
         }
 
-    def get_appointments(self, patient_id: str) -> str:
-        print("get_appointments called")
+    def get_appointments(self, patient_id: str, include: bool = False) -> tuple | None:
+        """
+        Searches the patient's accepted appointments. With include, each
+        appointment's Location and Patient come in the same Bundle, saving a
+        GET per appointment.
+
+        Returns:
+            tuple | None: (Appointment resources, _include'd resources keyed
+            "Location/<id>" etc.), or None when the search failed.
+        """
         if not self.token:
             self.set_access_token()
-            print("self.token:",self.token)
-        if self.token and patient_id:
-            print("calling the request")
-            r = requests.get(
-                f"{self.base_url}/Appointment",
-                headers=self.add_auth_header({}),
-                params={
-                    "service-category": "appointment",
-                    "status": "accepted",
-                    "patient": patient_id,
-                },
-            )
-            if r.ok:
-                print("r.text:",r)
-                return xmltodict.parse(r.text)
-        return ""
+        if not (self.token and patient_id):
+            return None
+        resources = self._bundle_resources(
+            "GET",
+            f"{self.base_url}/Appointment",
+            params={
+                "service-category": "appointment",
+                "status": "accepted",
+                "patient": patient_id,
+                "_format": "json",
+            }
+            | ({"_include": APPOINTMENT_INCLUDES} if include else {}),
+        )
+        return None if resources is None else fhir.split_bundle(resources)
+
+    def get_location(self, location_id: str, resource: dict | None = None) -> dict | None:
+        """
+        Returns {"address", "coordinates"} for a Location id, cached for
+        EPIC_LOCATION_CACHE_TTL. An already fetched (e.g. _include'd) Location
+        resource fills the cache without a request.
+        """
+        if not location_id:
+            return None
+
+        def load():
+            location = resource
+            if location is None:
+                if not self.token:
+                    self.set_access_token()
+                if not self.token:
+                    return None
+                if (location := self._get_resource(f"{self.base_url}/Location/{location_id}")) is None:
+                    return None
+            return _location_entry(fhir.location_address(location))
+
+        return _locations.get_or_load(location_id, load)
 
     def get_location_data(self, location_id: str) -> str:
+        if location := self.get_location(location_id):
+            return location["address"]
+        return ""
+
+    def get_patients(self, patient_ids: list) -> dict:
+        """
+        Reads several patients with one FHIR batch Bundle of Patient GETs.
+
+        Returns:
+            dict: patient_id -> Patient resource, for the reads that succeeded.
+        """
         if not self.token:
             self.set_access_token()
-        if self.token and location_id:
-
-            r = requests.get(
-                f"{self.base_url}/Location/{location_id}",
-                headers=self.add_auth_header({}),
-            )
-            if r.ok:
-                address = ",".join(
-                    _["@value"]
-                    for _ in xmltodict.parse(r.text)["Location"]["address"].values()
-                )
-                return address
-        return ""
+        if not (self.token and patient_ids):
+            return {}
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "batch",
+            "entry": [
+                {"request": {"method": "GET", "url": f"Patient/{patient_id}"}}
+                for patient_id in patient_ids
+            ],
+        }
+        resources = self._bundle_resources(
+            "POST",
+            self.base_url,
+            params={"_format": "json"},
+            json=bundle,
+            headers={"Content-Type": FHIR_JSON},
+        )
+        if resources is None:
+            return {}
+        return {
+            resource["id"]: resource
+            for resource in resources
+            if resource.get("resourceType") == "Patient" and resource.get("id")
+        }
 
-    def get_patient_info(self, patient_id: str) -> str:
+    def get_patient_info(self, patient_id: str) -> dict | None:
+        """
+        Returns the Patient resource, or None when it could not be read.
+        """
         if not self.token:
             self.set_access_token()
         if self.token and patient_id:
-            r = requests.get(
-                f"{self.base_url}/Patient/{patient_id}",
-                headers=self.add_auth_header({})
-            )
-            # print("r.text:",xmltodict.parse(r.text))
-            if r.ok:
-                return xmltodict.parse(r.text)
-            
-        return ""
\ No newline at end of file
+            return self._get_resource(f"{self.base_url}/Patient/{patient_id}")
+        return None
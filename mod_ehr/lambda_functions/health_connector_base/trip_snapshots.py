@@ -0,0 +1,62 @@
+from health_connector_base.cache import MISSING, TieredCache
+from health_connector_base.constants import TRIP_SNAPSHOT_CACHE_SIZE, TRIP_SNAPSHOT_TTL
+from health_connector_base.via import Via, trip_in_window
+
+# Keyed by Via rider id, so a rider linked to patients in several hospitals is
+# fetched once per TRIP_SNAPSHOT_TTL across every populator and warm invocation.
+_snapshots = TieredCache("trips", ttl=TRIP_SNAPSHOT_TTL, maxsize=TRIP_SNAPSHOT_CACHE_SIZE)
+
+
+def _covers(window: list | None, window_start: int | None, window_end: int | None) -> bool:
+    if window is None:
+        return True
+    cached_start, cached_end = window
+    if cached_start is not None and (window_start is None or window_start < cached_start):
+        return False
+    if cached_end is not None and (window_end is None or window_end > cached_end):
+        return False
+    return True
+
+
+def _union(window: list | None, window_start: int | None, window_end: int | None) -> list:
+    if window is None:
+        return [window_start, window_end]
+    cached_start, cached_end = window
+    return [
+        None if None in (cached_start, window_start) else min(cached_start, window_start),
+        None if None in (cached_end, window_end) else max(cached_end, window_end),
+    ]
+
+
+def get_rider_trips(
+    rider_id: str, window_start: int | None = None, window_end: int | None = None
+) -> list:
+    """
+    Returns the rider's Via trips whose ETAs fall in the window, from the
+    rider's snapshot when it is fresh and covers the window.
+
+    A snapshot that is fresh but too narrow is refreshed over the union of
+    both windows so the wider request keeps serving the earlier callers.
+    """
+    snapshot = _snapshots.get(rider_id)
+    if snapshot is not MISSING and _covers(snapshot["window"], window_start, window_end):
+        _snapshots.stats.incr("reused")
+        return [
+            trip for trip in snapshot["trips"] if trip_in_window(trip, window_start, window_end)
+        ]
+
+    window = [window_start, window_end]
+    if snapshot is not MISSING:
+        window = _union(snapshot["window"], window_start, window_end)
+    trips = list(Via().iter_trips(rider_id, *window))
+    _snapshots.stats.incr("refreshed")
+    _snapshots.set(rider_id, {"window": window, "trips": trips})
+    return [trip for trip in trips if trip_in_window(trip, window_start, window_end)]
+
+
+def invalidate(rider_id: str) -> None:
+    _snapshots.delete(rider_id)
+
+
+def snapshot_stats() -> dict:
+    return _snapshots.stats.as_dict()
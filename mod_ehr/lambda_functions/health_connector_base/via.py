@@ -1,81 +1,257 @@
 import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from health_connector_base import SecretsManager
+from health_connector_base.cache import MISSING, LRUCache
+from health_connector_base.constants import (
+    VIA_DETAILS_CACHE_TTL,
+    VIA_DETAILS_CONCURRENCY,
+    VIA_MAX_TRIP_PAGES,
+    VIA_TRIP_PAGE_SIZE,
+    VIA_SKIP_UNCHANGED_DETAILS,
+    Status,
+)
+from health_connector_base.http_client import http_client
 import json
 
+VIA_AUTH_URL = "https://trip-api.auth.us-east-1.amazoncognito.com/oauth2/token"
+TOKEN_REFRESH_MARGIN = 60  # sec, refresh this long before expires_in runs out
+DEFAULT_TOKEN_TTL = 3600  # sec, when the token response has no expires_in
+
+
+class _ViaCredentials:
+    """
+    Process-wide Via credentials and OAuth token, shared by every Via() so warm
+    invocations and concurrent trip fetches reuse one secrets read and token.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._secrets = None
+        self.token = None
+        self.expires_at = 0.0
+
+    @property
+    def secrets(self) -> dict:
+        with self._lock:
+            if self._secrets is None:
+                secrets_manager = SecretsManager()
+                secrets = {
+                    name: secrets_manager.get_secret_value(name)
+                    for name in ("via_client_id", "via_client_secret", "via_api_key")
+                }
+                if not all(secrets.values()):
+                    # Not cached, so a transient Secrets Manager failure is retried
+                    return secrets
+                self._secrets = secrets
+            return self._secrets
+
+    def get_token(self, stale_token: str | None = None) -> str | None:
+        """
+        Returns a valid access token, refreshing it shortly before it expires.
+        Passing the token a request was rejected with forces one refresh, unless
+        another thread already replaced it.
+        """
+        secrets = self.secrets
+        with self._lock:
+            if stale_token is not None and self.token != stale_token:
+                return self.token
+            if (
+                stale_token is None
+                and self.token
+                and time.monotonic() < self.expires_at - TOKEN_REFRESH_MARGIN
+            ):
+                return self.token
+            response = http_client.post(
+                VIA_AUTH_URL,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                data={"grant_type": "client_credentials"},
+                auth=(secrets["via_client_id"], secrets["via_client_secret"]),
+            )
+            if response.ok:
+                body = response.json()
+                self.token = body.get("access_token")
+                self.expires_at = time.monotonic() + int(
+                    body.get("expires_in") or DEFAULT_TOKEN_TTL
+                )
+            else:
+                print(f"Via token request failed with status {response.status_code}")
+                self.token = None
+            return self.token
+
+
+_credentials = _ViaCredentials()
+
+# Bounds concurrent /trips/details calls per API key across all callers
+_detail_limits = {}
+_detail_limits_lock = threading.Lock()
+# trip_id -> (status/ETA fingerprint, details), reused while the trip is unchanged
+_trip_details = LRUCache(maxsize=4096, ttl=VIA_DETAILS_CACHE_TTL)
+
+
+def _detail_limit(api_key: str) -> threading.BoundedSemaphore:
+    with _detail_limits_lock:
+        if api_key not in _detail_limits:
+            _detail_limits[api_key] = threading.BoundedSemaphore(VIA_DETAILS_CONCURRENCY)
+        return _detail_limits[api_key]
+
+
+def _trip_fingerprint(ride: dict) -> tuple:
+    return (ride.get("trip_status"), ride.get("pickup_eta"), ride.get("dropoff_eta"))
+
+
+def trip_in_window(trip: dict, window_start: int | None, window_end: int | None) -> bool:
+    etas = [eta for eta in (trip.get("pickup_eta"), trip.get("dropoff_eta")) if eta is not None]
+    if not etas:
+        return True
+    if window_start is not None and max(etas) < window_start:
+        return False
+    if window_end is not None and min(etas) > window_end:
+        return False
+    return True
+
+
 class Via(object):
     def __init__(self):
-        secrets_manager = SecretsManager()
-        self.client_id = secrets_manager.get_secret_value("via_client_id")
-        self.client_secret = secrets_manager.get_secret_value("via_client_secret")
-        self.via_api_key = secrets_manager.get_secret_value("via_api_key")
-        self.via_auth_url = (
-            "https://trip-api.auth.us-east-1.amazoncognito.com/oauth2/token"
-        )
+        secrets = _credentials.secrets
+        self.client_id = secrets["via_client_id"]
+        self.client_secret = secrets["via_client_secret"]
+        self.via_api_key = secrets["via_api_key"]
+        self.via_auth_url = VIA_AUTH_URL
         self.via_api_url = "us-east-1.trip-api.ridewithvia.com"
-        self.token = None
         self.TRIP_STATUSES = ["CONFIRMED", "FINISHED", "ASSIGNED", "ARRIVED", "BOARDED"]
 
+    @property
+    def token(self):
+        return _credentials.token
+
     def set_token(self):
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        data = {"grant_type": "client_credentials"}
-        response = requests.post(
-            self.via_auth_url,
-            headers=headers,
-            data=data,
-            auth=(self.client_id, self.client_secret),
-        )
-        if response.ok:
-            self.token = response.json().get("access_token")
+        _credentials.get_token()
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Sends a request to the Via API with the shared token, refreshing the
+        token exactly once if Via answers 401.
+        """
+        token = _credentials.get_token()
+        url = f"https://{self.via_api_url}{path}"
+        headers = {"x-api-key": self.via_api_key, "Authorization": token}
+        response = http_client.request(method, url, headers=headers, **kwargs)
+        if response.status_code == Status.HTTP_401_UNAUTHORIZED:
+            headers["Authorization"] = _credentials.get_token(stale_token=token)
+            response = http_client.request(method, url, headers=headers, **kwargs)
+        return response
 
     @property
     def auth_header(self):
         return {"x-api-key": self.via_api_key, "Authorization": self.token}
 
     # TODO Map Ride Vehicle Details from Data
-    def get_ride_details(self, rides):
-        if not self.token:
-            self.set_token()
+    def get_ride_details(self, rides, skip_unchanged: bool = VIA_SKIP_UNCHANGED_DETAILS):
+        """
+        Adds driver_info and vehicle_info to each ride, fetching details on a
+        thread pool bounded per API key. With skip_unchanged, rides whose status
+        and ETAs match the last fetch reuse those details without a call.
+        """
+        pending = []
         for ride in rides:
-            body = {"trip_id": ride["trip_id"]}
-            r = requests.get(
-                f"https://{self.via_api_url}/trips/details/",
-                params=body,
-                headers=self.auth_header,
-            )
-            print('response', r.json())
-            if r.ok:
-                with contextlib.suppress(KeyError):
-                    resp = r.json()
-                    ride.update({"driver_info": resp["trip_details"]["driver_info"]})
-                    ride.update({"vehicle_info": resp["trip_details"]["vehicle_info"]})
+            cached = _trip_details.get(ride.get("trip_id")) if skip_unchanged else MISSING
+            if cached is not MISSING and cached[0] == _trip_fingerprint(ride):
+                ride.update(cached[1])
+            else:
+                pending.append(ride)
+        if pending:
+            with ThreadPoolExecutor(max_workers=VIA_DETAILS_CONCURRENCY) as executor:
+                list(executor.map(self._add_ride_details, pending))
         return rides
 
+    def _add_ride_details(self, ride: dict) -> None:
+        with _detail_limit(self.via_api_key):
+            r = self._request("GET", "/trips/details/", params={"trip_id": ride["trip_id"]})
+        print('response', r.json())
+        if r.ok:
+            with contextlib.suppress(KeyError):
+                resp = r.json()
+                details = {
+                    "driver_info": resp["trip_details"]["driver_info"],
+                    "vehicle_info": resp["trip_details"]["vehicle_info"],
+                }
+                ride.update(details)
+                _trip_details.set(ride["trip_id"], (_trip_fingerprint(ride), details))
+
     def get_trips(self, rider_id) -> dict:
-        if not self.token:
-            self.set_token()
-
-        data = {"page_list_size": 100, "rider_id": rider_id}
-        trips = []
-        for status in self.TRIP_STATUSES:
-            data["trip_status"] = status
-            r = requests.get(
-                f"https://{self.via_api_url}/trips/get",
-                params=data,
-                headers=self.auth_header,
-            )
-            if r.ok:
-                resp = r.json().get("trips", [])
-                trips += self.get_ride_details(resp)
-        print(trips)
+        trips = list(self.iter_trips(rider_id))
+        print(f"Fetched {len(trips)} trip(s) for rider {rider_id}")
         return {"trips": trips}
-    
+
+    def iter_trips(self, rider_id, window_start: int | None = None, window_end: int | None = None):
+        """
+        Yields the rider's trips (with details) for every status in
+        TRIP_STATUSES, following pagination.
+
+        Statuses are fetched concurrently but yielded in TRIP_STATUSES order so
+        the result is the same as a serial fetch. With a window (epoch seconds),
+        trips whose ETAs fall outside it are dropped, and a status stops paging
+        once a page has no trip in the window after in-window trips were seen.
+        """
+        pages = {status: queue.Queue() for status in self.TRIP_STATUSES}
+        with ThreadPoolExecutor(max_workers=len(self.TRIP_STATUSES)) as executor:
+            for status in self.TRIP_STATUSES:
+                executor.submit(
+                    self._fetch_status_pages, rider_id, status, window_start, window_end, pages[status]
+                )
+            for status in self.TRIP_STATUSES:
+                while (page := pages[status].get()) is not None:
+                    if isinstance(page, Exception):
+                        raise page
+                    yield from page
+
+    def _fetch_status_pages(self, rider_id, status, window_start, window_end, pages: queue.Queue) -> None:
+        # /trips/get ("List rides by any criteria", see the Via Docs in the
+        # README) returns at most page_list_size trips per call and pages with a
+        # 1-based page_number; a page shorter than page_list_size is the last.
+        # Should the server behave differently, paging must not silently loop
+        # or truncate: a page repeating the previous one (page_number ignored)
+        # ends paging, and oversized pages and the VIA_MAX_TRIP_PAGES cap are
+        # logged.
+        params = {"page_list_size": VIA_TRIP_PAGE_SIZE, "rider_id": rider_id, "trip_status": status}
+        seen_in_window = False
+        previous_ids = None
+        try:
+            for page_number in range(1, VIA_MAX_TRIP_PAGES + 1):
+                r = self._request("GET", "/trips/get", params=params | {"page_number": page_number})
+                if not r.ok:
+                    print(f"Via trips request failed for status {status}: {r.status_code}")
+                    return
+                trips = r.json().get("trips", [])
+                page_ids = [trip.get("trip_id") for trip in trips]
+                if trips and page_ids == previous_ids:
+                    print(f"Via returned page {page_number - 1} of {status} trips again for page {page_number}; stopped paging")
+                    return
+                previous_ids = page_ids
+                if len(trips) > VIA_TRIP_PAGE_SIZE:
+                    print(f"Via returned {len(trips)} {status} trips for a page of {VIA_TRIP_PAGE_SIZE}")
+                in_window = [trip for trip in trips if trip_in_window(trip, window_start, window_end)]
+                if in_window:
+                    seen_in_window = True
+                    pages.put(self.get_ride_details(in_window))
+                elif seen_in_window:
+                    return
+                if len(trips) < VIA_TRIP_PAGE_SIZE:
+                    return
+            print(f"Stopped paging {status} trips for rider {rider_id} after {VIA_MAX_TRIP_PAGES} pages")
+        except Exception as e:
+            # Re-raised in the consumer, as the serial fetch would have
+            pages.put(e)
+        finally:
+            pages.put(None)
+
     def get_rider_validation(self, rider_id: str|None, rider_email: str|None, rider_phone: str|None, first_name: str|None, last_name: str|None):
         print("get rider validation function called")
-        if not self.token:
-            self.set_token()
-        
         parameters = {}
         if rider_id:
             parameters["rider_id"] = rider_id
@@ -87,11 +263,7 @@ class Via(object):
             raise ValueError("We require either rider_id, email, or phone number")
         
 
-        r = requests.get(
-            f"https://{self.via_api_url}/riders",
-            params=parameters,
-            headers=self.auth_header,
-        )
+        r = self._request("GET", "/riders", params=parameters)
         print("r", r.json())
         riders_list = []
         if r.status_code == 200:
@@ -108,14 +280,7 @@ class Via(object):
             }))
 
     def request_new_trip(self, request_body):
-        if not self.token:
-            self.set_token()
-        
-        r = requests.post(
-            f"https://{self.via_api_url}/trips/request",
-            json=request_body,
-            headers=self.auth_header,
-        )
+        r = self._request("POST", "/trips/request", json=request_body)
         print("r", r.json())
         if r.status_code == 200:
             return r.json()
@@ -126,13 +291,7 @@ class Via(object):
             }))
 
     def book_trip(self, trip_id):
-        if not self.token:
-            self.set_token()
-        r = requests.post(
-            f"https://{self.via_api_url}/trips/book",
-            json={"trip_id": trip_id},
-            headers=self.auth_header,
-        )
+        r = self._request("POST", "/trips/book", json={"trip_id": trip_id})
         print("r", r.json())
         if r.status_code == 200:
             return r.json() 
@@ -143,13 +302,7 @@ class Via(object):
             }))
         
     def get_trip_details(self, trip_id):
-        if not self.token:
-            self.set_token()
-        r = requests.get(
-            f"https://{self.via_api_url}/trips/details",
-            params={"trip_id": trip_id},
-            headers=self.auth_header,
-        )
+        r = self._request("GET", "/trips/details", params={"trip_id": trip_id})
         print("r", r.json())
         if r.status_code == 200:
             return r.json() 
@@ -97,6 +97,7 @@ class HospitalAPIHandler(APIHandler):
 
         obj = self.model(**body)
         obj.status = "PENDING"
+        obj.resolve_coordinates()
         try:
             obj.save(self.model.id.does_not_exist())
         except PutError:
@@ -141,8 +142,10 @@ class HospitalAPIHandler(APIHandler):
             if k in body:
                 del body[k]
 
+        location_changed = "location" in body and body["location"] != obj.location
         for k, v in body.items():
             setattr(obj, k, v)
+        obj.resolve_coordinates(force=location_changed)
         obj.save()
 
         payload = json.loads(json.dumps(obj, cls=PynamoDBEncoder))
@@ -118,6 +118,7 @@ class PatientAPIHandler(APIHandler):
                     actions.append(getattr(self.model, key).set(value))
             
             if actions:
+                actions += patient.rider_link_actions(body)
                 patient.update(actions=actions)
 
             return Response(body=json.loads(json.dumps(patient, cls=PynamoDBEncoder)), status=Status.HTTP_200_OK)
@@ -2,8 +2,8 @@ from health_connector_base.handlers import APIHandler, Response
 import json 
 from health_connector_base.constants import Status
 from health_connector_base.via import Via
-from health_connector_base import SecretsManager
-import requests
+from health_connector_base.location_manager import LocationManager
+from health_connector_base import trip_snapshots
 
 def validating_rider_handler(event, context):
     body = json.loads(event.get("body",""))
@@ -71,22 +71,9 @@ def validating_rider_handler(event, context):
         )
     
 def get_lat_lng(address):
-    secrets_manager = SecretsManager()
-    API_KEY = secrets_manager.get_secret_value("google_map_api_key")
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {
-        "address": address,
-        "key": API_KEY
-    }
-
-    response = requests.get(url, params=params)
-    data = response.json()
-
-    if data["status"] == "OK":
-        location = data["results"][0]["geometry"]["location"]
-        return location["lat"], location["lng"]
-    else:
-        return None, None
+    if coordinates := LocationManager().get_coordinates(address):
+        return coordinates[0], coordinates[1]
+    return None, None
 
 def set_trip_request_body(body):
     dest_lat, dest_lng = get_lat_lng(body.get("destination_address", ""))
@@ -165,6 +152,9 @@ def ride_booking_handler(event, context):
         
             #Book trip
             Booking_resp = Via().book_trip(request_trip_id)
+            if body.get("via_rider_id"):
+                # The next populator run must see the new trip
+                trip_snapshots.invalidate(body["via_rider_id"])
             if Booking_resp.get("trip_status") == "CONFIRMED":
 
                 #get trip details
@@ -1,8 +1,11 @@
 import json
 import boto3
+import contextlib
+import hashlib
 import os
 import hmac
-from boto3.dynamodb.conditions import Attr
+import time
+from boto3.dynamodb.conditions import Key
 
 
 secrets_client = boto3.client("secretsmanager")
@@ -12,103 +15,231 @@ table = dynamodb.Table(os.environ["TABLE_NAME"])
 ROLE_ARN = os.environ["ROLE_ARN"]
 BUCKET = os.environ["BUCKET_NAME"]
 ENV = os.environ["ENV"]
+SFTP_USERNAME_INDEX = "sftp_username-index"
+CREDENTIAL_CACHE_TTL = int(os.environ.get("CREDENTIAL_CACHE_TTL", 300))  # sec
+# A cached password that fails is re-read from Secrets Manager (it may have
+# been rotated) at most this often, so bad passwords cannot hammer it
+CREDENTIAL_RELOAD_INTERVAL = int(os.environ.get("CREDENTIAL_RELOAD_INTERVAL", 30))  # sec
+HASH_ITERATIONS = 10_000
+METRICS_NAMESPACE = "HealthConnect/SftpAuth"
+
+# Survives across warm invocations. The password is only kept as a salted
+# PBKDF2 hash: username -> {"hospital_id", "subfolder", "modified", "salt",
+# "password_hash", "loaded_at"}
+_credentials = {}
+
+
+@contextlib.contextmanager
+def _timed(timings: dict, step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = timings.get(step, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def _emit_metrics(timings: dict, cache_hit: bool) -> None:
+    """
+    Prints per-step latencies in CloudWatch Embedded Metric Format, so they
+    become metrics without any extra API call.
+    """
+    metrics = {f"{step}Latency": round(ms, 2) for step, ms in timings.items()}
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Environment"]],
+                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in metrics]
+                + [{"Name": "CredentialCacheHit", "Unit": "Count"}],
+            }],
+        },
+        "Environment": ENV,
+        "CredentialCacheHit": int(cache_hit),
+        **metrics,
+    }))
+
+
+def _hash_password(password: str, salt: bytes) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, HASH_ITERATIONS)
+
+
+def _verify(credentials: dict, password: str, timings: dict) -> bool:
+    with _timed(timings, "PasswordCheck"):
+        return hmac.compare_digest(
+            _hash_password(password, credentials["salt"]), credentials["password_hash"]
+        )
+
+
+def _find_hospital(username: str, timings: dict) -> dict | None:
+    with _timed(timings, "HospitalLookup"):
+        response = table.query(
+            IndexName=SFTP_USERNAME_INDEX,
+            KeyConditionExpression=Key("sftp_username").eq(username),
+            Limit=1,
+        )
+    items = response.get("Items", [])
+    return items[0] if items else None
+
+
+def _cached_credentials(username: str, timings: dict) -> tuple:
+    """
+    Returns (credentials, hospital item) for a cached username whose hospital
+    is still active and unchanged, else (None, the item if it was read).
+
+    Deactivating a hospital or changing its SFTP password through the
+    dashboard saves the hospital, which updates modified, so checking the
+    item on every hit applies both at the next login (after index
+    propagation) while still saving the secret fetch and password hashing.
+    """
+    credentials = _credentials.get(username)
+    if not credentials or time.monotonic() - credentials["loaded_at"] >= CREDENTIAL_CACHE_TTL:
+        return None, None
+    hospital_item = _find_hospital(username, timings)
+    if (
+        hospital_item is not None
+        and hospital_item.get("status") == "Active"
+        and hospital_item.get("id") == credentials["hospital_id"]
+        and hospital_item.get("modified") == credentials["modified"]
+    ):
+        return credentials, hospital_item
+    print(f"[AUTH] Hospital for user {username} changed since its credentials were cached")
+    _credentials.pop(username, None)
+    return None, hospital_item
+
+
+def _load_credentials(username: str, timings: dict, hospital_item: dict | None = None) -> dict | None:
+    """
+    Resolves the username to its active hospital with one index query
+    (unless the item was just read), reads the hospital secret and caches
+    the hashed password.
+    """
+    # 1. Find hospital info from DynamoDB using the SFTP username
+    if hospital_item is None:
+        hospital_item = _find_hospital(username, timings)
+    if hospital_item is None:
+        print(f"[AUTH] User not found: {username}")
+        return None
+
+    hospital_id = hospital_item.get("id")
+    subfolder = hospital_item.get("s3_subfolder_name")
+
+    if not hospital_id or not subfolder:
+        print(f"[ERROR] Incomplete hospital data for user: {username}")
+        return None
+
+    if hospital_item.get("status") != "Active":
+        print(f"[AUTH] Hospital for user {username} is not active.")
+        return None
+
+    # 2. Construct the secret name
+    secret_id = f"{ENV}-hospital-{hospital_id}"
+    print(f"Retrieving secret with ID: {secret_id}")
+
+    # 3. Retrieve the secret from Secrets Manager
+    try:
+        with _timed(timings, "SecretFetch"):
+            get_secret_value_response = secrets_client.get_secret_value(SecretId=secret_id)
+    except secrets_client.exceptions.ResourceNotFoundException:
+        print(f"[ERROR] Secret not found for user: {username} with constructed secret_id: {secret_id}")
+        return None
+    secret_dict = json.loads(get_secret_value_response["SecretString"])
+
+    stored_password = secret_dict.get("sftp_password")
+
+    if not stored_password:
+        print(f"[ERROR] Secret {secret_id} is missing 'sftp_password'.")
+        return None
+
+    salt = os.urandom(16)
+    with _timed(timings, "PasswordHash"):
+        password_hash = _hash_password(stored_password, salt)
+    credentials = {
+        "hospital_id": hospital_id,
+        "subfolder": subfolder,
+        "modified": hospital_item.get("modified"),
+        "salt": salt,
+        "password_hash": password_hash,
+        "loaded_at": time.monotonic(),
+    }
+    _credentials[username] = credentials
+    return credentials
+
+
+def _auth_response(subfolder: str) -> dict:
+    return {
+        "isAuthenticated": True,
+        "Role": ROLE_ARN,
+        "HomeDirectory": f"/{BUCKET}/{subfolder}",
+        "Policy": json.dumps(
+            {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Sid": "VisualEditor0",
+                        "Effect": "Allow",
+                        "Action": [
+                            "s3:ListBucket",
+                            "s3:GetBucketLocation"
+                        ],
+                        "Resource": f"arn:aws:s3:::{BUCKET}"
+                    },
+                    {
+                        "Sid": "VisualEditor1",
+                        "Effect": "Allow",
+                        "Action": [
+                            "s3:PutObject",
+                            "s3:GetObjectAcl",
+                            "s3:GetObject",
+                            "s3:PutObjectRetention",
+                            "s3:DeleteObjectVersion",
+                            "s3:GetObjectAttributes",
+                            "s3:PutObjectLegalHold",
+                            "s3:DeleteObject"
+                        ],
+                        "Resource": f"arn:aws:s3:::{BUCKET}/{subfolder}/*"
+                    }
+                ]
+            }
+        ),
+    }
+
  
 def lambda_handler(event, context):
     username = event.get("username")
     provided_password = event.get("password")
     print(f"Authenticating user: {username}")
-    print(f"Provided password: {provided_password}")
  
     if not username or not provided_password:
         print("[ERROR] No username or password provided")
         return {"isAuthenticated": False}
  
-    secret_id = '' # Initialize secret_id
+    timings = {}
+    started = time.perf_counter()
+    cache_hit = False
     try:
-        # 1. Find hospital info from DynamoDB using the SFTP username
-        response = table.scan(
-            FilterExpression=Attr("sftp_username").eq(username)
-        )
+        credentials, hospital_item = _cached_credentials(username, timings)
+        cache_hit = credentials is not None
+        # 4. Compare password hashes, reloading once for a miss or a cached
+        # password that may have been rotated since
+        authenticated = credentials is not None and _verify(credentials, provided_password, timings)
+        if not authenticated and (
+            credentials is None
+            or time.monotonic() - credentials["loaded_at"] >= CREDENTIAL_RELOAD_INTERVAL
+        ):
+            credentials = _load_credentials(username, timings, hospital_item)
+            authenticated = credentials is not None and _verify(credentials, provided_password, timings)
 
-        items = response.get("Items", [])
-        if not items:
-            print(f"[AUTH] User not found: {username}")
-            return {"isAuthenticated": False}
-        
-        hospital_item = items[0]
-        hospital_id = hospital_item.get("id")
-        subfolder = hospital_item.get("s3_subfolder_name")
-
-        if not hospital_id or not subfolder:
-            print(f"[ERROR] Incomplete hospital data for user: {username}")
-            return {"isAuthenticated": False}
-            
-        if hospital_item.get("status") != "Active":
-            print(f"[AUTH] Hospital for user {username} is not active.")
-            return {"isAuthenticated": False}
-
-        # 2. Construct the secret name
-        secret_id = f"{ENV}-hospital-{hospital_id}"
-        print(f"Retrieving secret with ID: {secret_id}")
-
-        # 3. Retrieve the secret from Secrets Manager
-        get_secret_value_response = secrets_client.get_secret_value(SecretId=secret_id)
-        secret_string = get_secret_value_response["SecretString"]
-        secret_dict = json.loads(secret_string)
-
-        stored_password = secret_dict.get("sftp_password")
-
-        if not stored_password:
-            print(f"[ERROR] Secret {secret_id} is missing 'sftp_password'.")
-            return {"isAuthenticated": False}
-
-        # 4. Compare passwords
-        if provided_password == stored_password:
+        if authenticated:
             print(f"[AUTH] Successful authentication for user: {username}")
             # 5. Return success response
-            return {
-                "isAuthenticated": True,
-                "Role": ROLE_ARN,
-                "HomeDirectory": f"/{BUCKET}/{subfolder}",
-                "Policy": json.dumps(
-                    {
-                        "Version": "2012-10-17",
-                        "Statement": [
-                            {
-                                "Sid": "VisualEditor0",
-                                "Effect": "Allow",
-                                "Action": [
-                                    "s3:ListBucket",
-                                    "s3:GetBucketLocation"
-                                ],
-                                "Resource": f"arn:aws:s3:::{BUCKET}"
-                            },
-                            {
-                                "Sid": "VisualEditor1",
-                                "Effect": "Allow",
-                                "Action": [
-                                    "s3:PutObject",
-                                    "s3:GetObjectAcl",
-                                    "s3:GetObject",
-                                    "s3:PutObjectRetention",
-                                    "s3:DeleteObjectVersion",
-                                    "s3:GetObjectAttributes",
-                                    "s3:PutObjectLegalHold",
-                                    "s3:DeleteObject"
-                                ],
-                                "Resource": f"arn:aws:s3:::{BUCKET}/{subfolder}/*"
-                            }
-                        ]
-                    }
-                )
-            }
-        else:
-            print(f"[AUTH] Invalid password for user: {username}")
-            return {"isAuthenticated": False}
- 
-    except secrets_client.exceptions.ResourceNotFoundException:
-        print(f"[ERROR] Secret not found for user: {username} with constructed secret_id: {secret_id}")
+            return _auth_response(credentials["subfolder"])
+        print(f"[AUTH] Invalid password for user: {username}")
         return {"isAuthenticated": False}
+ 
     except Exception as e:
         print(f"[ERROR] An unexpected error occurred: {e}")
         return {"isAuthenticated": False}
+    finally:
+        timings["Total"] = (time.perf_counter() - started) * 1000
+        _emit_metrics(timings, cache_hit)
@@ -0,0 +1,48 @@
+"""
+Shared setup for the lambda_functions tests: makes health_connector_base
+importable the way the Lambda layer does, and keeps every test on the
+process-local cache store.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+LAMBDA_FUNCTIONS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("ENVIRONMENT", "LOCAL")
+# No table names: the shared cache tier falls back to LocalStore
+os.environ.pop("CACHE_TABLE_NAME", None)
+
+if LAMBDA_FUNCTIONS not in sys.path:
+    sys.path.insert(0, LAMBDA_FUNCTIONS)
+
+
+def load_handler(function_dir: str, module: str = "lambda_handler"):
+    """
+    Imports a Lambda's module under a unique name, with the function's
+    directory on sys.path for its sibling modules (every Lambda has its own
+    lambda_handler.py).
+    """
+    directory = os.path.join(LAMBDA_FUNCTIONS, function_dir)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = f"{function_dir}_{module}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, f"{module}.py"))
+    handler = importlib.util.module_from_spec(spec)
+    sys.modules[name] = handler
+    spec.loader.exec_module(handler)
+    return handler
+
+
+@pytest.fixture(autouse=True)
+def local_store():
+    from health_connector_base.cache import LocalStore
+
+    LocalStore._data.clear()
+    yield LocalStore._data
+    LocalStore._data.clear()
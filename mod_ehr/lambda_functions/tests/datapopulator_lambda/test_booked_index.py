@@ -0,0 +1,97 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from conftest import load_handler
+from health_connector_base.custom_attributes import AddressAttribute
+from health_connector_base.models import Appointment
+from pynamodb.expressions.update import RemoveAction, SetAction
+
+handler = load_handler("datapopulator_lambda")
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def no_geocoding():
+    with AddressAttribute.validation("off"):
+        yield
+
+
+def appointment(hospital_id: str, id: str, status: str = "Booked", ends_in: timedelta = timedelta(hours=2)) -> Appointment:
+    return Appointment(
+        hospital_id=hospital_id,
+        id=id,
+        patient_id="p1",
+        patient_name="Ann Lee",
+        location="610 10th St, Perry",
+        start_time=NOW + ends_in - timedelta(minutes=30),
+        end_time=NOW + ends_in,
+        status=status,
+    )
+
+
+class BookedIndex:
+    """
+    The sparse index: only rows serialized with a booked_hospital_id, queried
+    by hospital with an end_time condition.
+    """
+
+    def __init__(self, rows: list) -> None:
+        self.rows = [row for row in rows if "booked_hospital_id" in row.serialize()]
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def query(self, hospital_id, range_key_condition=None, **kwargs):
+        with self.lock:
+            self.queries.append(hospital_id)
+        assert range_key_condition.operator == ">="
+        since = range_key_condition.values[1].value["S"]
+        return iter([
+            row for row in self.rows
+            if row.hospital_id == hospital_id
+            and Appointment.end_time.serialize(row.end_time) >= since
+        ])
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = BookedIndex([
+        appointment("h1", "upcoming"),
+        appointment("h1", "ended", ends_in=-timedelta(hours=1)),
+        appointment("h1", "cancelled", status="Cancelled"),
+        appointment("h2", "other-hospital"),
+        appointment("h3", "unlinked-hospital"),
+    ])
+    monkeypatch.setattr(Appointment.booked_appointments, "query", index.query)
+    monkeypatch.setattr(Appointment, "scan", lambda *args, **kwargs: pytest.fail("scanned the table"))
+    return index
+
+
+def test_only_booked_rows_carry_the_index_key():
+    assert appointment("h1", "a").serialize()["booked_hospital_id"] == {"S": "h1"}
+    assert "booked_hospital_id" not in appointment("h1", "b", status="Completed").serialize()
+
+
+def test_update_actions_follow_the_status_change():
+    row = appointment("h1", "a", status="Pending")
+
+    [booked] = row.booked_actions({"status": "Booked"})
+    [unbooked] = row.booked_actions({"status": "Cancelled"})
+
+    assert isinstance(booked, SetAction) and booked.values[1].value == {"S": "h1"}
+    assert isinstance(unbooked, RemoveAction)
+
+
+def test_upcoming_appointments_are_queried_per_linked_hospital(index):
+    mapping = {("h1", "p1"): "r1", ("h1", "p2"): "r2", ("h2", "p3"): "r3"}
+
+    upcoming = handler.AppointmentsMapperWithVia().get_upcoming_appointments(mapping)
+
+    assert sorted(row.id for row in upcoming) == ["other-hospital", "upcoming"]
+    assert sorted(index.queries) == ["h1", "h2"]
+
+
+def test_no_linked_patients_means_no_queries(index):
+    assert handler.AppointmentsMapperWithVia().get_upcoming_appointments({}) == []
+    assert index.queries == []
@@ -0,0 +1,127 @@
+"""
+The numpy column parser must produce exactly what the pydantic row path
+does, and defer every row it is not sure about.
+"""
+import csv
+
+import pytest
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+columnar = load_handler("datapopulator_lambda", "columnar")
+
+COLUMNS = columnar.REQUIRED_COLUMNS + columnar.OPTIONAL_COLUMNS
+
+BASE = {
+    "Patient First Name": "Ann",
+    "Patient Middle Initial": "B",
+    "Patient Last Name": "Lee",
+    "Scheduling Location Description": "Clinic",
+    "Appointment DateTime": "20261020_093000",
+    "Status": "Booked",
+    "Location Phone Number": "555-0100",
+    "Patient Number": "p1",
+    "Appointment Duration": "45",
+    "Location Street1": "10th St",
+    "Location Street2": "",
+    "Location City": "Perry",
+    "Location State": "IA",
+    "Location Zip": "50220",
+    "Location Name": "610",
+    "Appointment ID": "a1",
+}
+
+# (description, changed columns)
+VARIANTS = [
+    ("plain", {}),
+    ("padded values", {"Patient First Name": "  Ann ", "Location City": " Perry", "Status": "Booked "}),
+    ("no middle initial", {"Patient Middle Initial": ""}),
+    ("second street line", {"Location Street2": "Suite 4"}),
+    ("summer time", {"Appointment DateTime": "20260704_170000"}),
+    ("midnight into next day", {"Appointment DateTime": "20261231_233000", "Appointment Duration": "90"}),
+    ("leap day", {"Appointment DateTime": "20280229_080000"}),
+    ("no leap day", {"Appointment DateTime": "20270229_080000"}),
+    ("day 31 of a 30 day month", {"Appointment DateTime": "20261131_080000"}),
+    ("hour 24", {"Appointment DateTime": "20261020_240000"}),
+    ("separator", {"Appointment DateTime": "20261020T093000"}),
+    ("short datetime", {"Appointment DateTime": "20261020_0930"}),
+    ("empty datetime", {"Appointment DateTime": ""}),
+    ("duration with sign", {"Appointment Duration": "+30"}),
+    ("duration with spaces", {"Appointment Duration": " 30 "}),
+    ("duration with decimals", {"Appointment Duration": "30.0"}),
+    ("negative duration", {"Appointment Duration": "-15"}),
+    ("empty duration", {"Appointment Duration": ""}),
+    ("huge duration", {"Appointment Duration": "9999999999"}),
+    ("unicode digits", {"Appointment Duration": "٣٠"}),
+    ("end of calendar", {"Appointment DateTime": "99981231_230000", "Appointment Duration": "999999999"}),
+    ("year one", {"Appointment DateTime": "00010101_000000"}),
+]
+
+
+def parse_both(rows: list) -> tuple:
+    """
+    Runs rows through both paths of iter_veradigm_rows, returning the fields
+    each yields and the line numbers each rejects.
+    """
+
+    class Rejected:
+        def __init__(self) -> None:
+            self.lines = []
+
+        def add(self, line, row, errors):
+            self.lines.append(line)
+
+    results = []
+    for use_columnar in (True, False):
+        reader = csv.DictReader(_lines(rows), delimiter="|")
+        rejected = Rejected()
+        fields = list(handler.AppointmentsMapperWithVia().iter_veradigm_rows(reader, rejected, columnar=use_columnar))
+        results.append((fields, rejected.lines))
+    return results
+
+
+def _lines(rows: list) -> list:
+    return ["|".join(COLUMNS)] + ["|".join(row.get(name, "") for name in COLUMNS) for row in rows]
+
+
+@pytest.mark.parametrize("changes", [changes for _, changes in VARIANTS], ids=[name for name, _ in VARIANTS])
+def test_each_variant_parses_like_the_row_path(changes):
+    (fast, fast_rejected), (slow, slow_rejected) = parse_both([BASE | changes])
+
+    assert fast == slow
+    assert fast_rejected == slow_rejected
+
+
+def test_a_mixed_file_parses_like_the_row_path(monkeypatch):
+    monkeypatch.setattr(handler, "VERADIGM_CHUNK_SIZE", 4)
+    rows = [BASE | changes | {"Appointment ID": f"a{index}"} for index, (_, changes) in enumerate(VARIANTS)]
+
+    (fast, fast_rejected), (slow, slow_rejected) = parse_both(rows)
+
+    assert fast == slow
+    assert fast_rejected == slow_rejected
+    assert fast_rejected, "the corpus should include rejected rows"
+
+
+def test_clean_rows_take_the_fast_path():
+    rows = [BASE, BASE | {"Patient Middle Initial": ""}, BASE | {"Appointment Duration": "+30"}]
+
+    parsed = columnar.parse_rows(rows)
+
+    assert parsed[0] is not None and parsed[1] is not None
+    # Deferred to pydantic, which decides what a signed duration means
+    assert parsed[2] is None
+
+
+def test_rows_missing_trailing_columns_are_deferred():
+    lines = _lines([BASE])
+    lines[1] = lines[1].rsplit("|", 3)[0]
+
+    reader = csv.DictReader(lines, delimiter="|")
+
+    assert columnar.parse_rows(list(reader)) == [None]
+
+
+def test_the_delimiter_is_taken_from_the_header():
+    assert columnar.detect_delimiter("|".join(COLUMNS)) == "|"
+    assert columnar.detect_delimiter(",".join(COLUMNS)) == ","
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+FTPLogs = handler.FTPLogs
+
+UPLOADED = datetime(2026, 10, 2, 8, 30, tzinfo=timezone.utc)
+
+# The hospital's earlier uploads, as the etag index holds them
+EARLIER_UPLOADS = [
+    FTPLogs(hospital_id="h1", name="h1/monday.csv", etag="aaa", rows_ingested=90, rows_failed=2, rows_skipped=8),
+    FTPLogs(hospital_id="h1", name="h1/tuesday.csv", etag="bbb"),  # still sharding
+    FTPLogs(hospital_id="h2", name="h2/monday.csv", etag="bbb", rows_ingested=5, rows_failed=0, rows_skipped=0),
+]
+
+
+@pytest.fixture
+def etag_queries(monkeypatch):
+    queries = []
+
+    def query(hash_key, range_key_condition=None, filter_condition=None):
+        queries.append((hash_key, str(range_key_condition), str(filter_condition)))
+        etag = range_key_condition.values[1].value["S"]
+        return iter(
+            log for log in EARLIER_UPLOADS
+            if log.hospital_id == hash_key and log.etag == etag and log.rows_ingested is not None
+        )
+
+    monkeypatch.setattr(FTPLogs.etag_index, "query", query)
+    return queries
+
+
+def test_lookup_is_keyed_on_the_etag(etag_queries):
+    mapper = handler.AppointmentsMapperWithVia()
+
+    assert mapper.find_ingested_copy("h1", "aaa").name == "h1/monday.csv"
+    assert mapper.find_ingested_copy("h1", "bbb") is None
+    assert etag_queries[0][0] == "h1"
+    assert "etag" in etag_queries[0][1]
+    assert "rows_ingested" in etag_queries[0][2]
+
+
+class HeadOnlyS3:
+    def head_object(self, Bucket, Key):
+        return {"ETag": '"aaa"', "LastModified": UPLOADED, "ContentLength": 1024}
+
+    def get_object(self, **kwargs):
+        pytest.fail("a duplicate upload was downloaded")
+
+
+def test_a_renamed_copy_is_logged_as_a_duplicate_without_reading_it(etag_queries, monkeypatch):
+    saved = []
+    monkeypatch.setattr(FTPLogs, "save", lambda self, *args, **kwargs: saved.append(self))
+    mapper = handler.AppointmentsMapperWithVia()
+    mapper._connections.connection = HeadOnlyS3()
+    monkeypatch.setattr(mapper, "get_veradigm_hospital_id", lambda file_key: "h1")
+
+    mapper.veradigm_with_via({}, "h1/monday-resent.csv", "sftp-bucket")
+
+    [log] = saved
+    assert (log.name, log.duplicate_of, log.etag) == ("h1/monday-resent.csv", "h1/monday.csv", "aaa")
+    assert (log.rows_ingested, log.rows_failed, log.rows_skipped) == (0, 2, 98)
+    assert log.server_last_modified == int(UPLOADED.timestamp())
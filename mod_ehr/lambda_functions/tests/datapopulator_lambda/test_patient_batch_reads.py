@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+Patient = handler.Patient
+
+
+class PatientsTable:
+    """
+    Answers Patient.batch_get from `stored`, recording each call's keys and
+    the most calls in flight at once.
+    """
+
+    def __init__(self, stored: set) -> None:
+        self.stored = stored
+        self.calls = []
+        self.lock = threading.Lock()
+        self.in_flight = self.peak = 0
+
+    def batch_get(self, items, **kwargs):
+        with self.lock:
+            self.calls.append(list(items))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        for hospital_id, patient_id in items:
+            if (hospital_id, patient_id) in self.stored:
+                yield Patient(hospital_id=hospital_id, patient_id=patient_id, name=f"name of {patient_id}")
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = PatientsTable({("h1", f"p{index}") for index in range(0, 10, 2)})
+    monkeypatch.setattr(Patient, "batch_get", table.batch_get)
+    monkeypatch.setattr(handler, "PATIENT_BATCH_GET_SIZE", 3)
+    monkeypatch.setattr(handler, "VERADIGM_PATIENT_READ_CONCURRENCY", 2)
+    return table
+
+
+def test_patients_are_read_in_batches_of_keys(table):
+    patient_ids = [f"p{index}" for index in range(10)]
+
+    found = handler.AppointmentsMapperWithVia().get_patients("h1", patient_ids)
+
+    assert sorted(found) == ["p0", "p2", "p4", "p6", "p8"]
+    assert found["p4"].name == "name of p4"
+    assert sorted(len(call) for call in table.calls) == [1, 3, 3, 3]
+    assert sorted(key for call in table.calls for key in call) == sorted(("h1", p) for p in patient_ids)
+    assert table.peak <= 2
+
+
+def test_no_patients_means_no_reads(table):
+    assert handler.AppointmentsMapperWithVia().get_patients("h1", []) == {}
+    assert table.calls == []
+
+
+def test_upsert_reads_existing_patients_once_per_chunk(table, monkeypatch):
+    written = []
+
+    class Batch:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def save(self, patient):
+            written.append(patient.patient_id)
+
+    monkeypatch.setattr(Patient, "batch_write", classmethod(lambda cls: Batch()))
+    names = {f"p{index}": f"name of p{index}" for index in range(6)}
+    names["p2"] = "renamed"
+
+    handler.AppointmentsMapperWithVia().upsert_veradigm_patients(names, "h1")
+
+    assert len(table.calls) == 2
+    assert sorted(written) == ["p1", "p2", "p3", "p5"]
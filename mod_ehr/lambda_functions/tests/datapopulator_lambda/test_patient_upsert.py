@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+Patient = handler.Patient
+
+
+class BatchStub:
+    def __init__(self) -> None:
+        self.saved = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def save(self, item):
+        self.saved.append(item)
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    batch = BatchStub()
+    monkeypatch.setattr(Patient, "batch_write", classmethod(lambda cls: batch))
+    return batch
+
+
+def test_upsert_writes_new_and_renamed_patients_with_a_current_modified(batch, monkeypatch):
+    long_ago = datetime.now(timezone.utc) - timedelta(days=30)
+    existing = {
+        "same": Patient(hospital_id="h1", patient_id="same", name="Ann", modified=long_ago),
+        "renamed": Patient(hospital_id="h1", patient_id="renamed", name="Bob", via_rider_id="r1", modified=long_ago),
+    }
+    mapper = handler.AppointmentsMapperWithVia()
+    monkeypatch.setattr(mapper, "get_patients", lambda hospital_id, patient_ids: existing)
+    started = datetime.now(timezone.utc)
+
+    mapper.upsert_veradigm_patients({"same": "Ann", "renamed": "Robert", "new": "Cy"}, "h1")
+
+    assert sorted(p.patient_id for p in batch.saved) == ["new", "renamed"]
+    assert all(p.modified >= started for p in batch.saved)
+    assert next(p for p in batch.saved if p.patient_id == "renamed").name == "Robert"
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+
+
+def s3_record(key: str) -> dict:
+    return {"s3": {"bucket": {"name": "sftp-bucket"}, "object": {"key": key}}}
+
+
+@pytest.fixture
+def mapper(monkeypatch):
+    mapper = handler.AppointmentsMapperWithVia()
+    mapper.attempted = []
+    lock = threading.Lock()
+
+    def veradigm_with_via(patient_mapping, file_key, bucket_name):
+        with lock:
+            mapper.attempted.append(file_key)
+        if "broken" in file_key:
+            raise ValueError(f"cannot parse {file_key}")
+
+    monkeypatch.setattr(mapper, "veradigm_with_via", veradigm_with_via)
+    return mapper
+
+
+def test_all_files_succeeding_returns_their_statuses(mapper):
+    result = mapper.process_records([s3_record("h1/a+b.csv"), s3_record("h2/c%2Cd.csv")], {})
+
+    assert result == {
+        "files": [
+            {"bucket_name": "sftp-bucket", "file_key": "h1/a b.csv", "status": "succeeded"},
+            {"bucket_name": "sftp-bucket", "file_key": "h2/c,d.csv", "status": "succeeded"},
+        ]
+    }
+
+
+def test_a_failed_file_fails_the_invocation_after_the_others_ran(mapper):
+    records = [s3_record("h1/one.csv"), s3_record("h1/broken.csv"), s3_record("h2/three.csv")]
+
+    with pytest.raises(handler.VeradigmFilesError, match="1 of 3 file") as raised:
+        mapper.process_records(records, {})
+
+    assert sorted(mapper.attempted) == ["h1/broken.csv", "h1/one.csv", "h2/three.csv"]
+    assert [result["status"] for result in raised.value.results] == ["succeeded", "failed", "succeeded"]
+    assert "cannot parse h1/broken.csv" in str(raised.value)
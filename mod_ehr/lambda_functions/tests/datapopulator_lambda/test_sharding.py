@@ -0,0 +1,310 @@
+import io
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+from conftest import load_handler
+from pynamodb.exceptions import PutError, UpdateError
+
+handler = load_handler("datapopulator_lambda")
+sharding = handler.sharding
+FTPLogs = handler.FTPLogs
+
+HEADER = "patient_id,name\n"
+
+
+def csv_file(rows: int) -> bytes:
+    # Uneven line lengths so shard bounds land at every position in a line
+    return (HEADER + "".join(f"p{n},{'x' * (n % 7)}\n" for n in range(rows))).encode("utf-8")
+
+
+class S3Stub:
+    def __init__(self, objects: dict | None = None) -> None:
+        self.objects = dict(objects or {})
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        first, last = 0, len(data) - 1
+        if Range:
+            self.ranges.append(Range)
+            first, _, last = Range.removeprefix("bytes=").partition("-")
+            first, last = int(first), min(int(last), len(data) - 1)
+        return {
+            "Body": io.BytesIO(data[first:last + 1]),
+            "ContentRange": f"bytes {first}-{last}/{len(data)}",
+        }
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body.encode("utf-8") if isinstance(Body, str) else Body
+
+    def upload_fileobj(self, fileobj, Bucket, Key):
+        self.objects[Key] = fileobj.read()
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+
+
+def read_all_shards(s3, data: bytes, shard_size: int) -> list:
+    _, data_start = sharding.read_header(s3, "bucket", "h/file.csv")
+    return [
+        line
+        for start, end in sharding.plan_shards(len(data), data_start, shard_size)
+        for line in sharding.iter_shard_lines(s3, "bucket", "h/file.csv", start, end)
+    ]
+
+
+def test_plan_shards_covers_the_data_without_gaps():
+    assert sharding.plan_shards(100, 10, 40) == [(10, 50), (50, 90), (90, 100)]
+    assert sharding.plan_shards(50, 10, 40) == [(10, 50)]
+    assert sharding.plan_shards(10, 10, 40) == []
+
+
+@pytest.mark.parametrize("shard_size", [1, 2, 5, 7, 13, 64, 10_000])
+def test_every_row_is_read_by_exactly_one_shard(shard_size):
+    data = csv_file(200)
+    s3 = S3Stub({"h/file.csv": data})
+
+    lines = read_all_shards(s3, data, shard_size)
+
+    assert "".join(lines) == data.decode("utf-8")[len(HEADER):]
+
+
+def test_shard_reads_are_bounded_by_the_longest_line(monkeypatch):
+    monkeypatch.setattr(sharding, "VERADIGM_MAX_LINE_BYTES", 32)
+    data = csv_file(500)
+    s3 = S3Stub({"h/file.csv": data})
+
+    lines = read_all_shards(s3, data, 256)
+
+    assert len(lines) == 500
+    for requested in s3.ranges[1:]:
+        first, last = map(int, requested.removeprefix("bytes=").split("-"))
+        assert last - first <= 256 + 32
+
+
+def test_a_file_without_trailing_newline_keeps_its_last_row():
+    data = csv_file(20)[:-1]
+    s3 = S3Stub({"h/file.csv": data})
+
+    lines = read_all_shards(s3, data, 16)
+
+    assert lines[-1] == "p19,xxxxx\n"
+    assert len(lines) == 20
+
+
+def test_a_line_longer_than_the_bound_is_rejected(monkeypatch):
+    monkeypatch.setattr(sharding, "VERADIGM_MAX_LINE_BYTES", 8)
+    data = (HEADER + "p0,short\n" + "p1," + "y" * 40 + "\n").encode("utf-8")
+    s3 = S3Stub({"h/file.csv": data})
+    _, data_start = sharding.read_header(s3, "bucket", "h/file.csv")
+
+    with pytest.raises(ValueError, match="longer than 8 bytes"):
+        list(sharding.iter_shard_lines(s3, "bucket", "h/file.csv", data_start, data_start + 12))
+
+
+def test_shard_results_stay_out_of_the_tenant_folder():
+    assert sharding.shard_prefix("tenant/a.csv", 3) == "_shards/tenant/a.csv/3"
+
+
+class LogTable:
+    """
+    Applies FTPLogs.update actions to one stored row, as UpdateItem with
+    ALL_NEW would.
+    """
+
+    def __init__(self, log: FTPLogs) -> None:
+        self.row = log.serialize()
+
+    def _holds(self, condition) -> bool:
+        if condition is None:
+            return True
+        name = condition.values[0].path[0]
+        if condition.operator == "attribute_exists":
+            return name in self.row
+        if condition.operator == "IN":
+            return self.row.get(name) in [value.value for value in condition.values[1:]]
+        raise NotImplementedError(condition.operator)
+
+    def update(self, log: FTPLogs, actions: list, condition=None) -> None:
+        if not self._holds(condition):
+            raise UpdateError(
+                "Failed to update item",
+                cause=ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"),
+            )
+        for action in actions:
+            name = action.values[0].path[0]
+            value = action.values[1].value if len(action.values) > 1 else None
+            kind = type(action).__name__
+            if kind == "SetAction":
+                self.row[name] = value
+            elif kind == "RemoveAction":
+                self.row.pop(name, None)
+            elif kind == "AddAction":
+                current = set(self.row.get(name, {"SS": []})["SS"])
+                self.row[name] = {"SS": sorted(current | set(value["SS"]))}
+            elif kind == "DeleteAction":
+                remaining = set(self.row.get(name, {"SS": []})["SS"]) - set(value["SS"])
+                if remaining:
+                    self.row[name] = {"SS": sorted(remaining)}
+                else:
+                    self.row.pop(name, None)
+        log.deserialize(self.row)
+
+
+@pytest.fixture
+def sharded_file(monkeypatch):
+    """
+    A 3-shard file whose FTPLogs row is in progress, with row ingestion and
+    the patient upsert recorded instead of written.
+    """
+    data = csv_file(30)
+    s3 = S3Stub({"h/file.csv": data})
+    _, data_start = sharding.read_header(s3, "bucket", "h/file.csv")
+    shards = sharding.plan_shards(len(data), data_start, (len(data) - data_start) // 3 + 1)
+    table = LogTable(
+        FTPLogs(hospital_id="h1", name="h/file.csv", server_last_modified=0, shards_total=len(shards), shard_status="sharded")
+    )
+    monkeypatch.setattr(FTPLogs, "update", lambda self, actions, condition=None: table.update(self, actions, condition))
+
+    mapper = handler.AppointmentsMapperWithVia()
+    mapper._connections.connection = s3
+    mapper.failing_shards = set()
+    mapper.ingested = []
+    mapper.upserts = []
+
+    def ingest(reader, errors, patient_mapping, hospital_id, patients):
+        rows = list(reader)
+        if errors.context["shard"] in mapper.failing_shards:
+            raise RuntimeError("DynamoDB throttled")
+        mapper.ingested.extend(row["patient_id"] for row in rows)
+        patients.update({row["patient_id"]: row["name"] for row in rows})
+        return len(rows), 0
+
+    monkeypatch.setattr(mapper, "ingest_veradigm_rows", ingest)
+    monkeypatch.setattr(mapper, "upsert_veradigm_patients", lambda patients, hospital_id: mapper.upserts.append(patients))
+    events = [
+        {
+            "action": "veradigm_shard",
+            "bucket_name": "bucket",
+            "file_key": "h/file.csv",
+            "hospital_id": "h1",
+            "header": HEADER,
+            "shard": shard,
+            "start": start,
+            "end": end,
+        }
+        for shard, (start, end) in enumerate(shards)
+    ]
+    return mapper, table, events
+
+
+def test_a_retried_shard_is_counted_once_and_the_merge_runs_once(sharded_file):
+    mapper, table, events = sharded_file
+
+    mapper.process_veradigm_shard(events[0], {})
+    mapper.process_veradigm_shard(events[0], {})
+    mapper.process_veradigm_shard(events[1], {})
+    assert table.row["shards_completed"] == {"SS": ["0", "1"]}
+    assert "rows_ingested" not in table.row
+
+    mapper.process_veradigm_shard(events[2], {})
+    mapper.process_veradigm_shard(events[2], {})
+
+    assert len(mapper.upserts) == 1
+    assert len(mapper.upserts[0]) == 30
+    assert table.row["rows_ingested"] == {"N": "30"}
+    assert "shard_status" not in table.row
+    assert not [key for key in mapper.s3_connection.objects if key.startswith("_shards/") and key.endswith("/0.json")]
+
+
+def test_a_failing_shard_marks_the_log_failed_until_a_retry_succeeds(sharded_file):
+    mapper, table, events = sharded_file
+    mapper.failing_shards = {1}
+
+    mapper.process_veradigm_shard(events[0], {})
+    with pytest.raises(RuntimeError):
+        mapper.process_veradigm_shard(events[1], {})
+    mapper.process_veradigm_shard(events[2], {})
+
+    assert table.row["shard_status"] == {"S": "failed"}
+    assert table.row["shards_failed"] == {"SS": ["1"]}
+    assert mapper.upserts == []
+
+    mapper.failing_shards = set()
+    mapper.process_veradigm_shard(events[1], {})
+
+    assert "shards_failed" not in table.row
+    assert "shard_status" not in table.row
+    assert table.row["rows_ingested"] == {"N": "30"}
+
+
+def test_a_failed_merge_marks_the_log_failed_and_can_be_retried(sharded_file, monkeypatch):
+    mapper, table, events = sharded_file
+    upsert = mapper.upsert_veradigm_patients
+    monkeypatch.setattr(mapper, "upsert_veradigm_patients", lambda patients, hospital_id: 1 / 0)
+
+    for event in events[:2]:
+        mapper.process_veradigm_shard(event, {})
+    with pytest.raises(ZeroDivisionError):
+        mapper.process_veradigm_shard(events[2], {})
+    assert table.row["shard_status"] == {"S": "failed"}
+
+    monkeypatch.setattr(mapper, "upsert_veradigm_patients", upsert)
+    mapper.process_veradigm_shard(events[2], {})
+
+    assert table.row["rows_ingested"] == {"N": "30"}
+    assert table.row["shards_completed"] == {"SS": ["0", "1", "2"]}
+
+
+def test_a_row_missing_shards_total_does_not_hide_the_shard_error(sharded_file):
+    mapper, table, events = sharded_file
+    mapper.failing_shards = {0}
+    del table.row["shards_total"]
+
+    with pytest.raises(RuntimeError, match="DynamoDB throttled"):
+        mapper.process_veradigm_shard(events[0], {})
+
+
+def test_a_throttled_failure_update_does_not_hide_the_merge_error(sharded_file, monkeypatch):
+    mapper, table, events = sharded_file
+    monkeypatch.setattr(mapper, "upsert_veradigm_patients", lambda patients, hospital_id: 1 / 0)
+    apply = FTPLogs.update
+
+    def update(self, actions, condition=None):
+        if any(action.values[1:] and action.values[1].value == {"S": "failed"} for action in actions):
+            raise UpdateError(
+                "Failed to update item",
+                cause=ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem"),
+            )
+        return apply(self, actions, condition)
+
+    monkeypatch.setattr(FTPLogs, "update", update)
+    for event in events[:2]:
+        mapper.process_veradigm_shard(event, {})
+
+    with pytest.raises(ZeroDivisionError):
+        mapper.process_veradigm_shard(events[2], {})
+
+
+def test_a_retried_event_does_not_restart_running_shards(monkeypatch):
+    data = csv_file(30)
+    mapper = handler.AppointmentsMapperWithVia()
+    mapper._connections.connection = S3Stub({"h/file.csv": data})
+    conditions = []
+
+    def save(self, condition=None, **kwargs):
+        conditions.append(str(condition))
+        raise PutError(
+            "Failed to put item",
+            cause=ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"),
+        )
+
+    monkeypatch.setattr(FTPLogs, "save", save)
+    monkeypatch.setattr(sharding, "get_shard_dispatcher", lambda handler: pytest.fail("shards dispatched"))
+
+    head = {"ContentLength": len(data), "LastModified": datetime.now(timezone.utc), "ETag": '"abc"'}
+    mapper.shard_veradigm_file({}, "h/file.csv", "bucket", "h1", head)
+
+    assert "shard_status" in conditions[0]
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+from conftest import load_handler
+
+handler = load_handler("datapopulator_lambda")
+error_report = load_handler("datapopulator_lambda", "error_report")
+
+HEADER = (
+    "Patient First Name|Patient Middle Initial|Patient Last Name|Scheduling Location Description|"
+    "Appointment DateTime|Status|Patient Number|Appointment Duration|Location Name|Location Street1|"
+    "Location Street2|Location City|Location State|Location Zip|Location Phone Number|Appointment ID"
+)
+
+
+def line(appointment_id: str, when: str = "20261020_093000", duration: str = "30") -> str:
+    return f"Ann|B|Lee|Clinic|{when}|Booked|p1|{duration}|610|10th St||Perry|IA|50220|555-0100|{appointment_id}"
+
+
+class UploadedReports:
+    """
+    S3 client stand-in keeping what upload_fileobj was given.
+    """
+
+    def __init__(self) -> None:
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[(bucket, key)] = [json.loads(record) for record in fileobj.read().splitlines()]
+
+
+class CountingLines:
+    """
+    Iterates lines of a file while counting how many were read.
+    """
+
+    def __init__(self, lines: list) -> None:
+        self._lines = iter(lines)
+        self.read = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        value = next(self._lines)
+        self.read += 1
+        return value
+
+
+def test_a_report_is_uploaded_only_with_rejected_rows():
+    s3 = UploadedReports()
+
+    with error_report.ErrorReport(s3, "bucket", "clean.csv.errors.jsonl"):
+        pass
+    with error_report.ErrorReport(s3, "bucket", "bad.csv.errors.jsonl", context={"shard": 2}) as report:
+        report.add(7, {"Status": "Booked"}, [{"type": "missing", "loc": ["Appointment ID"]}])
+
+    assert list(s3.objects) == [("bucket", "bad.csv.errors.jsonl")]
+    assert s3.objects[("bucket", "bad.csv.errors.jsonl")] == [{
+        "shard": 2,
+        "line": 7,
+        "row": {"Status": "Booked"},
+        "errors": [{"type": "missing", "loc": ["Appointment ID"]}],
+    }]
+
+
+def test_extend_appends_another_reports_records():
+    s3 = UploadedReports()
+    shard = io.BytesIO(b'{"line": 3}\n{"line": 9}\n')
+
+    with error_report.ErrorReport(s3, "bucket", "merged.errors.jsonl") as report:
+        report.add(1, {}, [])
+        report.extend(shard, 2)
+
+    assert report.count == 3
+    assert [record["line"] for record in s3.objects[("bucket", "merged.errors.jsonl")]] == [1, 3, 9]
+
+
+def test_invalid_rows_are_reported_with_their_line_numbers():
+    lines = [HEADER, line("a1"), line("a2", when="2026-10-20 09:30"), line("a3", duration="half an hour"), line("a4")]
+    reader = csv.DictReader(lines, delimiter="|")
+    s3 = UploadedReports()
+
+    with error_report.ErrorReport(s3, "bucket", "f.errors.jsonl") as report:
+        rows = list(handler.AppointmentsMapperWithVia().iter_veradigm_rows(reader, report, columnar=False))
+
+    assert [fields["id"] for fields in rows] == ["a1", "a4"]
+    rejected = s3.objects[("bucket", "f.errors.jsonl")]
+    assert [record["line"] for record in rejected] == [3, 4]
+    assert rejected[0]["errors"][0]["loc"] == ["Appointment DateTime"]
+
+
+def test_rows_are_read_and_written_one_chunk_at_a_time(monkeypatch):
+    monkeypatch.setattr(handler, "VERADIGM_CHUNK_SIZE", 2)
+    monkeypatch.setattr(handler, "VERADIGM_SKIP_UNCHANGED", False)
+    lines = CountingLines([HEADER] + [line(f"a{index}") for index in range(5)])
+    mapper = handler.AppointmentsMapperWithVia()
+    chunks = []
+
+    def write_chunk(appointments, patient_mapping, hospital_id, patients=None):
+        chunks.append(([appointment.id for appointment in appointments], lines.read))
+
+    monkeypatch.setattr(mapper, "_to_appointment", lambda fields, hospital_id: handler.Appointment(**fields, hospital_id=hospital_id))
+    monkeypatch.setattr(mapper, "_write_veradigm_chunk", write_chunk)
+
+    with error_report.ErrorReport(UploadedReports(), "bucket", "f.errors.jsonl") as report:
+        written, skipped = mapper.ingest_veradigm_rows(
+            csv.DictReader(lines, delimiter="|"), report, {"veradigm": {}}, "h1"
+        )
+
+    assert (written, skipped) == (5, 0)
+    assert [ids for ids, _ in chunks] == [["a0", "a1"], ["a2", "a3"], ["a4"]]
+    # Each chunk was written before more than one row past it was read
+    first, second, _ = (read for _, read in chunks)
+    assert first <= 1 + 2 + 1 and second <= 1 + 4 + 1
@@ -0,0 +1,153 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from conftest import load_handler
+from health_connector_base import bulk_export, smart_epic
+from health_connector_base.location_manager import LocationManager
+from health_connector_base.models import Appointment, Hospital
+
+handler = load_handler("epic_data_populator")
+stub = load_handler("epic_data_populator", "bulk_export_stub")
+
+CREDENTIALS = {"epic_client_id": "bulk-client"}
+LINKED = {"patient-0": "rider-0", "patient-1": "rider-1"}
+
+
+def fhir_time(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def export_resources() -> dict:
+    """
+    Three patients with two upcoming accepted appointments each (patient-2
+    not linked), plus appointments of patient-0 the per-patient search
+    (status=accepted) would not return, and an accepted one that ended.
+    """
+    resources = stub.generate_resources(patients=3, appointments=2, locations=2)
+    now = datetime.now(timezone.utc)
+    template = resources["Appointment"][0]
+    for suffix, status, start in (
+        ("proposed", "proposed", now + timedelta(days=2)),
+        ("booked", "booked", now + timedelta(days=2)),
+        ("waitlist", "waitlist", now + timedelta(days=3)),
+        ("fulfilled", "fulfilled", now + timedelta(days=3)),
+        ("cancelled", "cancelled", now + timedelta(days=4)),
+        ("ended", "accepted", now - timedelta(days=3)),
+    ):
+        resources["Appointment"].append(template | {
+            "id": f"appointment-0-{suffix}",
+            "status": status,
+            "start": fhir_time(start),
+            "end": fhir_time(start + timedelta(minutes=30)),
+        })
+    return resources
+
+
+@pytest.fixture
+def epic(monkeypatch):
+    server = stub.BulkExportStub(("127.0.0.1", 0), export_resources(), delay=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(smart_epic, "EPIC_FHIR_BASE_URL", f"{server.base_url}/api/FHIR/R4")
+    monkeypatch.setattr(smart_epic, "EPIC_TOKEN_URL", f"{server.base_url}/oauth2/token")
+    smart_epic._access_tokens.clear()
+    handler._demographics.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    smart_epic._access_tokens.clear()
+    handler._demographics.clear()
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """
+    Appointments passed to Appointment.batch_write, without DynamoDB or
+    geocoding.
+    """
+    saved = []
+
+    class Batch:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def save(self, appointment):
+            saved.append(appointment)
+
+    monkeypatch.setattr(Appointment, "batch_write", classmethod(lambda cls: Batch()))
+    monkeypatch.setattr(LocationManager, "get_coordinates", lambda self, address: [41.88, -87.63])
+    return saved
+
+
+@pytest.fixture
+def populator(monkeypatch):
+    populator = handler.AppointmentsMapperWithEpic()
+    monkeypatch.setattr(populator, "_get_jwt", lambda credentials: "signed-assertion")
+    return populator
+
+
+HOSPITAL = Hospital(id="h-bulk", name="Bulk", subdomain="bulk", status="Active")
+
+
+def test_an_export_is_started_then_ingested_on_the_next_run(epic, written, populator):
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+
+    job = bulk_export.load_job(HOSPITAL.id)
+    [exported] = epic.jobs.values()
+    query = parse_qs(urlparse(exported["request"]).query)
+    assert query["_typeFilter"] == handler.BULK_EXPORT_TYPE_FILTERS
+    assert query["_type"] == [",".join(handler.BULK_EXPORT_TYPES)]
+    assert written == [] and job["status_url"].startswith(epic.base_url)
+
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+
+    # The stub ignores _typeFilter, like servers that do not support it
+    assert sorted(a.id for a in written) == [
+        "appointment-0-0", "appointment-0-1", "appointment-1-0", "appointment-1-1",
+    ]
+    assert {a.status for a in written} == {"accepted"}
+    assert {a.patient_first_name for a in written} == {"First0", "First1"}
+    assert all(a.location and a.hospital_id == HOSPITAL.id for a in written)
+    job = bulk_export.load_job(HOSPITAL.id)
+    assert "status_url" not in job and job["since"] and job["completed_at"]
+    # Output files are released once ingested
+    assert epic.jobs == {}
+
+
+def test_the_next_export_waits_for_the_interval_and_sends_since(epic, written, populator):
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+    since = bulk_export.load_job(HOSPITAL.id)["since"]
+
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+    assert epic.jobs == {}
+
+    bulk_export.save_job(HOSPITAL.id, {"since": since, "completed_at": "2000-01-01T00:00:00+00:00"})
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+
+    [exported] = epic.jobs.values()
+    assert parse_qs(urlparse(exported["request"]).query)["_since"] == [since]
+
+
+def test_a_failed_export_is_forgotten_and_restarted_from_the_same_since(epic, written, populator):
+    since = "2026-10-01T00:00:00+00:00"
+    bulk_export.save_job(HOSPITAL.id, {
+        "status_url": f"{epic.base_url}/export-status/expired",
+        "kicked_off_at": since,
+        "since": since,
+    })
+
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+
+    assert bulk_export.load_job(HOSPITAL.id) == {"since": since}
+    assert written == []
+
+    populator.run_bulk_export(LINKED, HOSPITAL, CREDENTIALS, "group-1")
+
+    [exported] = epic.jobs.values()
+    assert parse_qs(urlparse(exported["request"]).query)["_since"] == [since]
@@ -0,0 +1,68 @@
+import pytest
+from conftest import load_handler
+
+handler = load_handler("epic_data_populator")
+
+PATIENT = {
+    "resourceType": "Patient",
+    "id": "e1",
+    "name": [{"use": "official", "given": ["Ann"], "family": "Lee"}, {"use": "usual", "given": ["Annie"], "family": "Lee"}],
+    "telecom": [{"system": "phone", "value": "555-0100", "rank": 2}, {"system": "phone", "value": "555-0199", "rank": 1}],
+}
+
+
+class PatientReads:
+    def __init__(self, patients: dict) -> None:
+        self.patients = patients
+        self.reads = []
+
+    def get_patient_info(self, patient_id):
+        self.reads.append(patient_id)
+        return self.patients.get(patient_id)
+
+
+@pytest.fixture
+def populator():
+    handler._demographics.clear()
+    yield handler.AppointmentsMapperWithEpic()
+    handler._demographics.clear()
+
+
+def test_included_patient_is_mapped_and_cached_in_memory_only(populator, local_store):
+    epic = PatientReads({})
+
+    demographics = populator.get_demographics("h1", "e1", epic, {"Patient/e1": PATIENT})
+    again = populator.get_demographics("h1", "e1", epic, {})
+
+    assert demographics is again
+    assert demographics["patient_name"] == "Annie Lee"
+    assert demographics["patient_phone_no"] == str(["555-0199", "555-0100"])
+    assert epic.reads == []
+    assert local_store == {}
+
+
+def test_a_patient_not_included_is_read_once(populator):
+    epic = PatientReads({"e1": PATIENT})
+
+    populator.get_demographics("h1", "e1", epic, {})
+    populator.get_demographics("h1", "e1", epic, {})
+
+    assert epic.reads == ["e1"]
+
+
+def test_cache_entries_are_per_hospital(populator):
+    epic = PatientReads({"e1": PATIENT})
+
+    populator.get_demographics("h1", "e1", epic, {})
+    populator.get_demographics("h2", "e1", epic, {})
+
+    assert epic.reads == ["e1", "e1"]
+
+
+def test_an_unreadable_patient_raises_and_is_not_cached(populator):
+    epic = PatientReads({})
+
+    with pytest.raises(KeyError, match="Patient/e2"):
+        populator.get_demographics("h1", "e2", epic, {})
+    epic.patients["e2"] = PATIENT
+    assert populator.get_demographics("h1", "e2", epic, {})["patient_id"] == "e2"
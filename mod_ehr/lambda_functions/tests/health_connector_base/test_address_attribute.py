@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+from health_connector_base.custom_attributes import AddressAttribute
+from health_connector_base.exceptions import ValidationError
+from health_connector_base.location_manager import LocationManager
+
+KNOWN = {"610 10th st, perry": [32.46, -83.73]}
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """
+    Addresses sent to the geocoder; only those in KNOWN resolve.
+    """
+    seen = []
+
+    def is_valid_address(self, address):
+        seen.append(address)
+        return KNOWN.get(address.lower())
+
+    monkeypatch.setattr(LocationManager, "is_valid_address", is_valid_address)
+    AddressAttribute._validated.clear()
+    yield seen
+    AddressAttribute._validated.clear()
+
+
+def test_an_address_is_geocoded_once_while_unchanged(lookups):
+    attribute = AddressAttribute()
+
+    attribute.serialize("610 10th St, Perry")
+    attribute.serialize("610  10th st,, Perry")
+
+    assert lookups == ["610 10th St, Perry"]
+    assert AddressAttribute.validated_coordinates("610 10th st, perry") == [32.46, -83.73]
+
+
+def test_a_value_read_from_the_table_is_saved_back_without_a_lookup(lookups):
+    attribute = AddressAttribute()
+
+    stored = attribute.deserialize("1 Unresolvable Rd")
+    attribute.serialize(stored)
+
+    assert lookups == []
+    # Known to be valid, but its coordinates were never looked up
+    assert AddressAttribute.validated_coordinates(stored) is None
+
+
+def test_a_changed_address_must_resolve(lookups):
+    attribute = AddressAttribute()
+    attribute.deserialize("610 10th St, Perry")
+
+    with pytest.raises(ValidationError):
+        attribute.serialize("1 Unresolvable Rd")
+    assert lookups == ["1 Unresolvable Rd"]
+
+
+def test_always_mode_geocodes_every_save(lookups):
+    attribute = AddressAttribute()
+
+    with AddressAttribute.validation("always"):
+        attribute.serialize("610 10th St, Perry")
+        attribute.serialize("610 10th St, Perry")
+
+    assert len(lookups) == 2
+
+
+def test_off_mode_only_applies_to_the_current_thread(lookups):
+    attribute = AddressAttribute()
+    errors = []
+
+    def save_elsewhere():
+        try:
+            attribute.serialize("1 Unresolvable Rd")
+        except ValidationError as e:
+            errors.append(e)
+
+    with AddressAttribute.validation("off"):
+        assert attribute.serialize("1 Unresolvable Rd") == "1 Unresolvable Rd"
+        other = threading.Thread(target=save_elsewhere)
+        other.start()
+        other.join()
+
+    assert len(errors) == 1
+    assert AddressAttribute.validation_mode() == "changed"
+
+
+def test_an_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        with AddressAttribute.validation("sometimes"):
+            pass
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from health_connector_base.cache import MISSING, LocalStore, LRUCache, TieredCache
+
+
+class CountingStore(LocalStore):
+    def __init__(self) -> None:
+        self.reads = 0
+
+    def get_entry(self, namespace, key):
+        self.reads += 1
+        return super().get_entry(namespace, key)
+
+
+@pytest.fixture
+def store():
+    return CountingStore()
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_lru_entry_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is MISSING
+
+
+def test_get_or_load_reads_shared_tier_before_loading(store):
+    TieredCache("geocode", ttl=60, store=store).set("addr", [1.0, 2.0])
+    cold = TieredCache("geocode", ttl=60, store=store)
+
+    assert cold.get_or_load("addr", lambda: pytest.fail("loader called on a shared hit")) == [1.0, 2.0]
+    assert cold.get_or_load("addr", lambda: None) == [1.0, 2.0]
+    assert store.reads == 1
+    assert cold.stats.as_dict() == {"shared_hits": 1, "local_hits": 1}
+
+
+def test_negative_results_are_cached_for_negative_ttl(store):
+    cache = TieredCache("geocode", ttl=60, negative_ttl=5, store=store)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("nowhere", loader) is None
+    assert cache.get_or_load("nowhere", loader) is None
+    assert len(calls) == 1
+    assert cache.stats.get("negative_hits") == 1
+    assert store.get_entry("geocode", "nowhere")[1] == pytest.approx(time.time() + 5, abs=1)
+
+
+def test_none_is_not_cached_without_negative_ttl(store):
+    cache = TieredCache("geocode", ttl=60, store=store)
+    calls = []
+    cache.get_or_load("nowhere", lambda: calls.append(1))
+    cache.get_or_load("nowhere", lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_shared_hit_keeps_the_shared_entry_expiry(store, monkeypatch):
+    store.set("trips", "rider", {"trips": []}, ttl=10)
+    cache = TieredCache("trips", ttl=120, store=store)
+    assert cache.get("rider") == {"trips": []}
+
+    # The local copy expires with the shared entry, not 120s after the read
+    later = time.monotonic() + 11
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert cache.local.get("rider") is MISSING
+
+
+def test_delete_drops_both_tiers(store):
+    cache = TieredCache("tokens", ttl=60, store=store)
+    cache.set("client", "token")
+    cache.delete("client")
+    assert cache.get("client") is MISSING
+    assert store.get("tokens", "client") is MISSING
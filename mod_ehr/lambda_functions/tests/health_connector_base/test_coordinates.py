@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from health_connector_base.custom_attributes import AddressAttribute
+from health_connector_base.location_manager import LocationManager, encode_geohash
+from health_connector_base.models import Appointment
+from pynamodb.expressions.update import RemoveAction
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    """
+    Counts geocoder calls; "Nowhere" does not resolve.
+    """
+    calls = []
+
+    def get_coordinates(self, address):
+        calls.append(address)
+        return None if address == "Nowhere" else [57.64911, 10.40744]
+
+    monkeypatch.setattr(LocationManager, "get_coordinates", get_coordinates)
+    AddressAttribute._validated.clear()
+    yield calls
+    AddressAttribute._validated.clear()
+
+
+def appointment(**fields) -> Appointment:
+    start = datetime(2026, 10, 20, 15, tzinfo=timezone.utc)
+    return Appointment(**{
+        "hospital_id": "h1",
+        "id": "a1",
+        "patient_id": "p1",
+        "patient_name": "Ann Lee",
+        "location": "Jomfru Ane Gade 1, Aalborg",
+        "start_time": start,
+        "end_time": start + timedelta(minutes=30),
+        "status": "Booked",
+    } | fields)
+
+
+def test_geohash_matches_the_reference_encoding():
+    assert encode_geohash(57.64911, 10.40744) == "u4pruydqq"
+    assert encode_geohash(57.64911, 10.40744, precision=5) == "u4pru"
+    assert encode_geohash(-33.8688, 151.2093, precision=6) == "r3gx2f"
+
+
+def test_an_address_is_geocoded_once_and_stored(geocoder):
+    row = appointment()
+
+    assert row.resolve_coordinates() == [57.64911, 10.40744]
+    assert row.resolve_coordinates() == [57.64911, 10.40744]
+
+    assert geocoder == ["Jomfru Ane Gade 1, Aalborg"]
+    assert (row.latitude, row.longitude, row.geohash) == (57.64911, 10.40744, "u4pruydqq")
+
+
+def test_coordinates_from_validation_are_reused(geocoder):
+    AddressAttribute._validated.set("jomfru ane gade 1, aalborg", [57.0, 10.0])
+
+    assert appointment().resolve_coordinates() == [57.0, 10.0]
+    assert geocoder == []
+
+
+def test_forcing_an_unresolvable_address_clears_stale_coordinates(geocoder):
+    row = appointment(location="Nowhere", latitude=1.0, longitude=2.0, geohash="s00twy01m")
+
+    assert row.resolve_coordinates() == [1.0, 2.0]
+    assert row.resolve_coordinates(force=True) is None
+
+    assert row.coordinates is None and row.geohash is None
+    assert all(isinstance(action, RemoveAction) for action in row.coordinate_actions())
+
+
+def test_coordinate_actions_set_the_resolved_values(geocoder):
+    row = appointment()
+    row.resolve_coordinates()
+
+    values = [action.values[1].value for action in row.coordinate_actions()]
+
+    assert values == [{"N": "57.64911"}, {"N": "10.40744"}, {"S": "u4pruydqq"}]
@@ -0,0 +1,122 @@
+import io
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from health_connector_base import smart_epic
+from health_connector_base.location_manager import LocationManager
+
+CLINIC = {
+    "resourceType": "Location",
+    "id": "loc-1",
+    "name": "North Clinic",
+    "address": {"line": ["610 10th St"], "city": "Perry", "state": "IA", "postalCode": "50220"},
+}
+
+
+def fhir_response(status_code: int, body: dict) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status_code
+    r.raw = io.BytesIO(json.dumps(body).encode())
+    return r
+
+
+class EpicFHIR:
+    """
+    Serves Location reads and Appointment searches, recording each request's
+    path and query.
+    """
+
+    def __init__(self) -> None:
+        self.locations = {"loc-1": CLINIC}
+        self.requests = []
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        path = urlparse(url).path.removeprefix("/fhir")
+        self.requests.append((path, params or {}))
+        if path.startswith("/Location/"):
+            location = self.locations.get(path.rsplit("/", 1)[1])
+            return fhir_response(200, location) if location else fhir_response(404, {})
+        if path == "/Appointment":
+            entries = [{"resource": {
+                "resourceType": "Appointment", "id": "a1", "status": "booked",
+                "participant": [{"actor": {"reference": "Location/loc-1"}}],
+            }}]
+            if "_include" in params:
+                entries += [{"resource": CLINIC, "search": {"mode": "include"}}]
+            return fhir_response(200, {"resourceType": "Bundle", "type": "searchset", "entry": entries})
+        return fhir_response(404, {})
+
+
+@pytest.fixture
+def epic(monkeypatch):
+    server = EpicFHIR()
+    monkeypatch.setattr(smart_epic.http_client, "request", server.request)
+    smart_epic._locations.local.clear()
+    yield server
+    smart_epic._locations.local.clear()
+
+
+@pytest.fixture
+def geocodes(monkeypatch):
+    addresses = []
+
+    def get_coordinates(self, address):
+        addresses.append(address)
+        return [41.84, -94.1]
+
+    monkeypatch.setattr(LocationManager, "get_coordinates", get_coordinates)
+    return addresses
+
+
+def client() -> smart_epic.SmartEpicClient:
+    epic_client = smart_epic.SmartEpicClient("assertion")
+    epic_client.base_url = "https://epic.example.com/fhir"
+    epic_client.token = "token"
+    return epic_client
+
+
+def test_a_location_is_read_and_geocoded_once(epic, geocodes):
+    first = client().get_location("loc-1")
+    # A cold container still finds it in the shared tier
+    smart_epic._locations.local.clear()
+    second = client().get_location("loc-1")
+
+    assert first == second == {"address": "610 10th St,Perry,IA,50220", "coordinates": [41.84, -94.1]}
+    assert [path for path, _ in epic.requests] == ["/Location/loc-1"]
+    assert geocodes == ["610 10th St,Perry,IA,50220"]
+
+
+def test_an_included_location_needs_no_read(epic, geocodes):
+    location = client().get_location("loc-1", CLINIC)
+
+    assert location["address"] == "610 10th St,Perry,IA,50220"
+    assert epic.requests == []
+
+
+def test_a_failed_read_is_not_cached(epic, geocodes):
+    assert client().get_location("loc-2") is None
+
+    epic.locations["loc-2"] = CLINIC | {"id": "loc-2"}
+    assert client().get_location("loc-2") is not None
+    assert [path for path, _ in epic.requests] == ["/Location/loc-2", "/Location/loc-2"]
+
+
+def test_the_appointment_search_includes_locations_and_patients(epic, geocodes):
+    appointments, included = client().get_appointments("p1", include=True)
+
+    [(path, params)] = epic.requests
+    assert path == "/Appointment"
+    assert params["_include"] == ["Appointment:location", "Appointment:patient"]
+    assert [appointment["id"] for appointment in appointments] == ["a1"]
+    # Trimmed to the elements the mappers read
+    assert included == {"Location/loc-1": {"resourceType": "Location", "id": "loc-1", "address": CLINIC["address"]}}
+
+
+def test_location_fields_carry_the_cached_coordinates():
+    fields = smart_epic.location_fields({"address": "610 10th St,Perry", "coordinates": [41.84, -94.1]})
+
+    assert fields["latitude"] == 41.84 and fields["longitude"] == -94.1
+    assert fields["geohash"].startswith("9zm")
+    assert smart_epic.location_fields({"address": "Unknown", "coordinates": None}) == {"location": "Unknown"}
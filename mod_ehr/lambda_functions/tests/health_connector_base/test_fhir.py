@@ -0,0 +1,154 @@
+import json
+from datetime import datetime
+
+import pytest
+from health_connector_base import fhir
+
+BUNDLE = {
+    "resourceType": "Bundle",
+    "type": "searchset",
+    "link": [{"relation": "self", "url": "https://epic.example.com/Appointment?patient=p1"}],
+    "entry": [
+        {
+            "fullUrl": "https://epic.example.com/Appointment/a1",
+            "resource": {
+                "resourceType": "Appointment",
+                "id": "a1",
+                "status": "booked",
+                "start": "2026-10-20T14:30:00Z",
+                "end": "2026-10-20T15:00:00Z",
+                "participant": [
+                    {"actor": {"reference": "Patient/p1", "display": "Zoë Åberg"}},
+                    {"actor": {"reference": "https://epic.example.com/Location/l1", "display": "North"}},
+                ],
+                "text": {"div": "<div>Café 🩺 visit</div>"},
+            },
+            "search": {"mode": "match", "score": 1.25},
+        },
+        {"fullUrl": "urn:uuid:outcome", "search": {"mode": "outcome"}},
+        {
+            "resource": {
+                "resourceType": "Location",
+                "id": "l1",
+                "address": {"line": ["610 10th St", "Suite 4"], "city": "Perry", "state": "IA", "postalCode": "50220"},
+            },
+        },
+    ],
+    "total": 1234567,
+}
+RESOURCES = [entry["resource"] for entry in BUNDLE["entry"] if "resource" in entry]
+
+
+def chunked(data, size: int) -> list:
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64, 4096])
+def test_any_byte_chunking_yields_the_entries(size):
+    # Small sizes split multi-byte characters, keys, strings and numbers
+    body = json.dumps(BUNDLE, ensure_ascii=False, indent=1).encode("utf-8")
+
+    assert list(fhir.iter_bundle_resources(chunked(body, size))) == RESOURCES
+
+
+def test_text_chunks_and_compact_json_work_too():
+    body = json.dumps(BUNDLE, separators=(",", ":"))
+
+    assert list(fhir.iter_bundle_resources(chunked(body, 11))) == RESOURCES
+    assert list(fhir.iter_bundle_resources([body.encode(), b"", b"\n"])) == RESOURCES
+
+
+def test_members_after_the_entries_are_skipped():
+    # "total" ends the object, so its digits can straddle the last chunks
+    body = json.dumps({"entry": [{"resource": {"id": "x"}}], "total": 98765}).encode()
+
+    assert list(fhir.iter_bundle_resources(chunked(body, len(body) - 3))) == [{"id": "x"}]
+
+
+def test_a_bundle_without_entries_yields_nothing():
+    body = b'{"resourceType": "Bundle", "type": "searchset", "total": 0}'
+
+    assert list(fhir.iter_bundle_resources(chunked(body, 4))) == []
+
+
+def test_entries_are_yielded_before_the_rest_is_read():
+    body = json.dumps(BUNDLE).encode()
+    chunks = iter(chunked(body, 32))
+    read = []
+
+    def stream():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    first = next(fhir.iter_bundle_resources(stream()))
+
+    assert first["id"] == "a1"
+    assert sum(map(len, read)) < len(body)
+
+
+@pytest.mark.parametrize("body", [b'["entry"]', b'{"entry": [{"resource": {"id": "x"}} {"id"', b'{"entry": [{"resource": '])
+def test_malformed_bundles_raise(body):
+    with pytest.raises(ValueError):
+        list(fhir.iter_bundle_resources(chunked(body, 5)))
+
+
+def test_iter_ndjson_skips_blank_lines():
+    lines = [b'{"id": "p1"}\n', b"\n", '{"id": "p2"}', "   "]
+
+    assert [resource["id"] for resource in fhir.iter_ndjson(lines)] == ["p1", "p2"]
+
+
+def test_extract_keeps_only_mapped_elements():
+    appointment = fhir.extract(RESOURCES[0])
+
+    assert "text" not in appointment and appointment["participant"] == RESOURCES[0]["participant"]
+    assert fhir.extract({"resourceType": "Practitioner", "id": "d1", "text": {}}) == {
+        "resourceType": "Practitioner", "id": "d1", "text": {},
+    }
+
+
+def test_split_bundle_keys_included_resources():
+    appointments, included = fhir.split_bundle(RESOURCES)
+
+    assert [appointment["id"] for appointment in appointments] == ["a1"]
+    assert list(included) == ["Location/l1"]
+
+
+def test_appointment_mappers():
+    appointment = RESOURCES[0]
+
+    assert fhir.appointment_fields(appointment) == {
+        "id": "a1",
+        "status": "booked",
+        "start_time": datetime(2026, 10, 20, 14, 30),
+        "end_time": datetime(2026, 10, 20, 15),
+    }
+    assert fhir.participant_ids(appointment, "Location") == ["l1"]
+    assert fhir.participant_ids(appointment, "Practitioner") == []
+    assert fhir.participant_display(appointment, "Patient") == "Zoë Åberg"
+    with pytest.raises(KeyError):
+        fhir.appointment_fields({k: v for k, v in appointment.items() if k != "end"})
+
+
+def test_location_address_joins_parts_in_order():
+    assert fhir.location_address(RESOURCES[1]) == "610 10th St,Suite 4,Perry,IA,50220"
+
+
+def test_patient_demographics_prefer_the_usual_name_and_rank_contacts():
+    patient = {
+        "name": [{"use": "official", "given": ["Zoe"], "family": "Aberg"}, {"use": "usual", "given": ["Zoë", "M"], "family": "Åberg"}],
+        "telecom": [
+            {"system": "email", "value": "z@example.com"},
+            {"system": "phone", "value": "555-0100", "rank": 3},
+            {"system": "phone", "value": "555-0199", "rank": 1},
+            {"system": "phone", "value": "555-0100", "rank": 2},
+        ],
+    }
+
+    demographics = fhir.patient_demographics(patient, "p1")
+
+    assert demographics["patient_name"] == "Zoë M Åberg"
+    assert demographics["patient_phone_no"] == str(["555-0199", "555-0100"])
+    assert demographics["patient_email"] == str(["z@example.com"])
+    assert fhir.patient_demographics({}, "p2")["patient_phone_no"] == ""
@@ -0,0 +1,57 @@
+import pytest
+from health_connector_base import hospital_directory
+from health_connector_base.models import Hospital
+
+
+def hospital(hospital_id: str, subfolder: str | None) -> Hospital:
+    return Hospital(id=hospital_id, name=hospital_id, subdomain=hospital_id, status="Active", s3_subfolder_name=subfolder)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """
+    The hospitals table as a list; scans are counted.
+    """
+    rows = [hospital("h1", "north"), hospital("h2", "south"), hospital("h3", None)]
+    scans = []
+
+    def scan(filter_condition=None):
+        scans.append(str(filter_condition))
+        return iter([row for row in rows if row.s3_subfolder_name])
+
+    monkeypatch.setattr(Hospital, "scan", scan)
+    hospital_directory.invalidate()
+    yield rows, scans
+    hospital_directory.invalidate()
+
+
+def test_known_subfolders_are_served_from_one_scan(table):
+    _, scans = table
+
+    assert hospital_directory.by_s3_subfolder("north").id == "h1"
+    assert hospital_directory.by_s3_subfolder("south").id == "h2"
+    assert hospital_directory.by_s3_subfolder("north").id == "h1"
+    assert len(scans) == 1
+    assert "s3_subfolder_name" in scans[0]
+
+
+def test_an_unknown_subfolder_rebuilds_and_finds_a_new_hospital(table):
+    rows, scans = table
+    assert hospital_directory.by_s3_subfolder("north").id == "h1"
+
+    rows.append(hospital("h4", "east"))
+
+    assert hospital_directory.by_s3_subfolder("east").id == "h4"
+    assert hospital_directory.by_s3_subfolder("west") is None
+    assert len(scans) == 3
+
+
+def test_invalidate_drops_renamed_subfolders(table):
+    rows, scans = table
+    assert hospital_directory.by_s3_subfolder("south").id == "h2"
+
+    rows[1] = hospital("h2", "southwest")
+    hospital_directory.invalidate()
+
+    assert hospital_directory.by_s3_subfolder("southwest").id == "h2"
+    assert hospital_directory.by_s3_subfolder("south") is None
@@ -0,0 +1,106 @@
+"""
+HttpClient against a local HTTP server that fails on request.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from health_connector_base.http_client import HttpClient
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so connection reuse is observable
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self) -> None:
+        server = self.server
+        with server.lock:
+            server.seen.append((self.command, self.path, self.client_address[1]))
+            status = server.statuses.pop(0) if server.statuses else 200
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """
+    Answers with the queued `statuses`, then 200; records (method, path,
+    client port) of every request in `seen`.
+    """
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.lock = threading.Lock()
+    httpd.statuses, httpd.seen = [], []
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_a_get_is_retried_after_a_5xx(server):
+    server.statuses = [503]
+    client = HttpClient(max_retries=2)
+
+    r = client.get(f"{server.url}/trips")
+
+    assert r.status_code == 200
+    assert [path for _, path, _ in server.seen] == ["/trips", "/trips"]
+
+
+def test_a_post_is_never_sent_twice(server):
+    server.statuses = [503]
+    client = HttpClient(max_retries=2)
+
+    r = client.post(f"{server.url}/trips/book", json={"rider_id": "r1"})
+
+    assert r.status_code == 503
+    assert len(server.seen) == 1
+
+
+def test_requests_to_a_host_reuse_one_session_and_connection(server):
+    client = HttpClient()
+
+    for _ in range(3):
+        client.get(f"{server.url}/ping")
+
+    assert client.session(server.url) is client.session(f"{server.url}/other?x=1")
+    assert len({port for _, _, port in server.seen}) == 1
+
+
+def test_stats_count_requests_and_errors_per_host(server):
+    server.statuses = [404]
+    client = HttpClient(max_retries=0)
+
+    client.get(f"{server.url}/missing")
+    client.get(f"{server.url}/ping")
+
+    host = server.url.removeprefix("http://")
+    stats = client.stats()[host]
+    assert (stats["requests"], stats["errors"]) == (2, 1)
+    assert stats["avg_latency_seconds"] >= 0
+
+
+def test_a_default_timeout_is_applied(monkeypatch, server):
+    client = HttpClient(timeout=(1, 2))
+    timeouts = []
+    session = client.session(server.url)
+    send = session.request
+
+    def request(method, url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return send(method, url, **kwargs)
+
+    monkeypatch.setattr(session, "request", request)
+    client.get(f"{server.url}/ping")
+    client.get(f"{server.url}/ping", timeout=5)
+
+    assert timeouts == [(1, 2), 5]
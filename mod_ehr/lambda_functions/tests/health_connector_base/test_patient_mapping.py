@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from health_connector_base import patient_mapping
+from health_connector_base.models import Patient
+
+T0 = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def patient(patient_id, rider_id, modified, provider="veradigm"):
+    return Patient(
+        hospital_id="h1", patient_id=patient_id, name=patient_id,
+        via_rider_id=rider_id, provider=provider, modified=modified,
+    )
+
+
+class IndexStub:
+    """
+    The rider_linked index: (provider, since) -> patients modified after since.
+    """
+
+    def __init__(self) -> None:
+        self.patients = []
+        self.queries = []
+
+    def __call__(self, provider, since):
+        self.queries.append((provider, since))
+        return [
+            p for p in self.patients
+            if p.provider == provider and (since is None or p.modified > since)
+        ]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = IndexStub()
+    monkeypatch.setattr(patient_mapping.PatientRiderMapping, "_query", lambda self, provider, since: index(provider, since))
+    return index
+
+
+def test_incremental_refresh_reads_changes_since_the_high_water_mark(index):
+    index.patients = [patient("p1", "r1", T0), patient("p2", "r2", T0 + timedelta(minutes=5), "epic")]
+    mapping = patient_mapping.PatientRiderMapping()
+    assert mapping.get()["all"] == {("h1", "p1"): "r1", ("h1", "p2"): "r2"}
+
+    # p1 unlinked and p3 linked after the build
+    index.patients = [
+        patient("p1", "", T0 + timedelta(minutes=10)),
+        patient("p3", "r3", T0 + timedelta(minutes=11)),
+    ]
+    result = mapping.get()
+
+    assert result["all"] == {("h1", "p2"): "r2", ("h1", "p3"): "r3"}
+    since = T0 + timedelta(minutes=5) - timedelta(seconds=patient_mapping.PATIENT_MAPPING_CLOCK_SKEW)
+    assert index.queries[-1][1] == since
+
+
+def test_full_rebuild_after_the_interval_drops_deleted_patients(index, monkeypatch):
+    index.patients = [patient("p1", "r1", T0)]
+    mapping = patient_mapping.PatientRiderMapping()
+    mapping.get()
+
+    index.patients = []
+    monkeypatch.setattr(patient_mapping, "PATIENT_MAPPING_REBUILD_INTERVAL", -1)
+    assert mapping.get()["all"] == {}
+    assert index.queries[-1][1] is None
+
+
+def test_new_patients_are_not_stamped_with_the_import_time():
+    before = datetime.now(timezone.utc)
+    assert Patient(hospital_id="h1", patient_id="p", name="n").modified >= before
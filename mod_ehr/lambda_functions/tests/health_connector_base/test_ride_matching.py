@@ -0,0 +1,114 @@
+"""
+RideMatcher against the per-trip scalar matcher it replaced, on a fixture
+corpus whose trips sit on and around the distance and time thresholds.
+"""
+import json
+import os
+
+import pytest
+from geopy.distance import geodesic
+from health_connector_base.ride_matching import RideMatcher
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "ride_matching_corpus.json")
+
+
+def scalar_to_ride(coordinates, start, trips, prior_period, subsequent_period, location_diff):
+    """
+    The previous get_matching_ride loop, with the address already geocoded.
+    """
+    match_ride, best_diff = {}, 1e9
+    for trip in trips:
+        if (dropoff_eta := trip.get("dropoff_eta")) is None:
+            continue
+        cur_diff = int(start - dropoff_eta)
+        dropoff, pickup = trip.get("dropoff", {}), trip.get("pickup", {})
+        if None in (dropoff.get("lat"), dropoff.get("lng"), pickup.get("lat"), pickup.get("lng")):
+            continue
+        dropoff_km = geodesic(coordinates, [dropoff["lat"], dropoff["lng"]]).kilometers
+        pickup_km = geodesic(coordinates, [pickup["lat"], pickup["lng"]]).kilometers
+        if pickup_km <= dropoff_km:
+            continue
+        if subsequent_period <= cur_diff <= prior_period and int(dropoff_km) <= location_diff:
+            if abs(cur_diff) < best_diff:
+                best_diff, match_ride = abs(cur_diff), trip
+    return match_ride
+
+
+def scalar_from_ride(coordinates, end, trips, prior_period, subsequent_period, location_diff):
+    """
+    The previous get_matching_return_ride loop.
+    """
+    match_ride, best_diff = {}, 1e9
+    for trip in trips:
+        if (pickup_eta := trip.get("pickup_eta")) is None:
+            continue
+        cur_diff = int(pickup_eta - end)
+        pickup, dropoff = trip.get("pickup", {}), trip.get("dropoff", {})
+        if None in (pickup.get("lat"), pickup.get("lng"), dropoff.get("lat"), dropoff.get("lng")):
+            continue
+        pickup_km = geodesic(coordinates, [pickup["lat"], pickup["lng"]]).kilometers
+        dropoff_km = geodesic(coordinates, [dropoff["lat"], dropoff["lng"]]).kilometers
+        if dropoff_km <= pickup_km:
+            continue
+        if subsequent_period <= cur_diff <= prior_period and int(pickup_km) <= location_diff:
+            if abs(cur_diff) < best_diff:
+                best_diff, match_ride = abs(cur_diff), trip
+    return match_ride
+
+
+with open(CORPUS) as f:
+    corpus = json.load(f)
+
+
+@pytest.mark.parametrize("rider", corpus["riders"], ids=lambda rider: rider["rider"])
+def test_matches_scalar_matcher(rider):
+    periods = (corpus["prior_period"], corpus["subsequent_period"], corpus["location_diff"])
+    matcher = RideMatcher(rider["trips"], *periods)
+    appointments = [(a["coordinates"], a["start"], a["end"]) for a in rider["appointments"]]
+
+    matched = matcher.match(appointments)
+
+    for (coordinates, start, end), (to_ride, from_ride) in zip(appointments, matched):
+        if coordinates is None:
+            # The scalar matcher raised TypeError here; no match now
+            assert (to_ride, from_ride) == ({}, {})
+            continue
+        expected_to = scalar_to_ride(coordinates, start, rider["trips"], *periods)
+        expected_from = scalar_from_ride(coordinates, end, rider["trips"], *periods)
+        assert to_ride.get("trip_id") == expected_to.get("trip_id")
+        assert from_ride.get("trip_id") == expected_from.get("trip_id")
+
+
+def test_corpus_exercises_matches_and_misses():
+    periods = (corpus["prior_period"], corpus["subsequent_period"], corpus["location_diff"])
+    legs = [
+        leg
+        for rider in corpus["riders"]
+        for pair in RideMatcher(rider["trips"], *periods).match(
+            [(a["coordinates"], a["start"], a["end"]) for a in rider["appointments"]]
+        )
+        for leg in pair
+    ]
+    assert any(legs) and not all(legs)
+
+
+def test_dropoff_just_inside_and_outside_the_distance_threshold():
+    # int(km) <= 1: 1.9999 km matches, 2.0001 km does not
+    origin = (41.8781, -87.6298)
+    start = 1_790_000_000
+
+    def trip(trip_id, dropoff_km):
+        dropoff = geodesic(kilometers=dropoff_km).destination(origin, 90)
+        pickup = geodesic(kilometers=10).destination(origin, 270)
+        return {
+            "trip_id": trip_id,
+            "dropoff": {"lat": dropoff.latitude, "lng": dropoff.longitude},
+            "pickup": {"lat": pickup.latitude, "lng": pickup.longitude},
+            "dropoff_eta": start - 600,
+            "pickup_eta": None,
+        }
+
+    inside = RideMatcher([trip("inside", 1.9999)], 5400, -900, 1).match_to_rides([(list(origin), start, start)])
+    outside = RideMatcher([trip("outside", 2.0001)], 5400, -900, 1).match_to_rides([(list(origin), start, start)])
+    assert inside[0]["trip_id"] == "inside"
+    assert outside[0] == {}
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from health_connector_base import settings_cache
+from health_connector_base.models import Settings
+from pynamodb.models import Model
+
+WRITTEN = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+class SettingsTable:
+    """
+    Settings rows by hospital, counting Settings.query calls.
+    """
+
+    def __init__(self) -> None:
+        self.rows = {}
+        self.queries = []
+
+    def put(self, hospital_id: str, name: str, value: str, modified: datetime = WRITTEN) -> None:
+        self.rows.setdefault(hospital_id, {})[name] = Settings(
+            hospital_id=hospital_id, name=name, value=value, modified=modified
+        )
+
+    def query(self, hospital_id, *args, **kwargs):
+        self.queries.append(hospital_id)
+        return iter(list(self.rows.get(hospital_id, {}).values()))
+
+
+@pytest.fixture
+def table(monkeypatch):
+    settings = SettingsTable()
+    settings.put("h1", "prior_window", "30")
+    settings.put("h1", "subsequent_window", "45")
+    monkeypatch.setattr(Settings, "query", settings.query)
+    # Settings.save/delete reach DynamoDB through Model
+    monkeypatch.setattr(Model, "save", lambda self, *args, **kwargs: {})
+    monkeypatch.setattr(Model, "delete", lambda self, *args, **kwargs: {})
+    settings_cache._settings.clear()
+    yield settings
+    settings_cache._settings.clear()
+
+
+def test_all_settings_load_with_one_query(table):
+    assert settings_cache.get_setting("h1", "prior_window") == "30"
+    assert settings_cache.get_setting("h1", "subsequent_window") == "45"
+    assert settings_cache.get_setting("h1", "missing", "15") == "15"
+
+    assert table.queries == ["h1"]
+
+
+def test_a_hospital_without_settings_is_cached_too(table):
+    settings_cache.get_settings("h2")
+    settings_cache.get_settings("h2")
+
+    assert table.queries == ["h2"]
+
+
+def test_saving_a_setting_reloads_it_in_this_process(table):
+    settings_cache.get_settings("h1")
+
+    Settings(hospital_id="h1", name="prior_window", value="60").save()
+    table.put("h1", "prior_window", "60", modified=WRITTEN + timedelta(days=1))
+
+    assert settings_cache.get_setting("h1", "prior_window") == "60"
+    assert table.queries == ["h1", "h1"]
+
+
+def test_other_processes_reload_once_the_check_interval_passes(table, monkeypatch):
+    settings_cache.get_settings("h1")
+    # Another container writes: only the shared stamp changes here
+    table.put("h1", "prior_window", "90", modified=WRITTEN + timedelta(days=1))
+    settings_cache._shared_store().set(settings_cache.NAMESPACE, "h1", (WRITTEN + timedelta(days=1)).timestamp())
+
+    assert settings_cache.get_setting("h1", "prior_window") == "30"
+
+    monkeypatch.setattr(settings_cache, "SETTINGS_CHECK_INTERVAL", 0)
+    assert settings_cache.get_setting("h1", "prior_window") == "90"
+    assert table.queries == ["h1", "h1"]
+
+
+def test_an_unchanged_stamp_does_not_reload(table, monkeypatch):
+    monkeypatch.setattr(settings_cache, "SETTINGS_CHECK_INTERVAL", 0)
+    settings_cache.get_settings("h1")
+    settings_cache.get_settings("h1")
+
+    assert table.queries == ["h1"]
+
+
+def test_a_deleted_setting_disappears(table):
+    settings_cache.get_settings("h1")
+
+    Settings(hospital_id="h1", name="prior_window", value="30").delete()
+    del table.rows["h1"]["prior_window"]
+
+    assert settings_cache.get_setting("h1", "prior_window") is None
@@ -0,0 +1,101 @@
+import itertools
+
+import pytest
+from health_connector_base import smart_epic
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict | None = None) -> None:
+        self.status_code = status_code
+        self.body = body or {}
+        self.closed = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> dict:
+        return self.body
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class EpicServer:
+    """
+    Issues numbered tokens and accepts only those not revoked.
+    """
+
+    def __init__(self, expires_in: int = 3600) -> None:
+        self.expires_in = expires_in
+        self.numbers = itertools.count(1)
+        self.assertions = []
+        self.revoked = set()
+        self.requests = []
+
+    def post(self, url, data=None, headers=None):
+        self.assertions.append(data["client_assertion"])
+        return FakeResponse(200, {"access_token": f"token-{next(self.numbers)}", "expires_in": self.expires_in})
+
+    def request(self, method, url, headers=None, **kwargs):
+        token = headers["Authorization"].removeprefix("Bearer ")
+        self.requests.append(token)
+        return FakeResponse(401 if token in self.revoked else 200)
+
+
+@pytest.fixture
+def epic(monkeypatch):
+    server = EpicServer()
+    monkeypatch.setattr(smart_epic.http_client, "post", server.post)
+    monkeypatch.setattr(smart_epic.http_client, "request", server.request)
+    smart_epic._access_tokens.clear()
+    yield server
+    smart_epic._access_tokens.clear()
+
+
+def client() -> smart_epic.SmartEpicClient:
+    jwt_numbers = itertools.count(1)
+    return smart_epic.SmartEpicClient(client_id="client-a", jwt_factory=lambda: f"assertion-{next(jwt_numbers)}")
+
+
+def test_tokens_are_reused_in_process_and_never_shared(epic, local_store):
+    first, second = client(), client()
+    first.set_access_token()
+    second.set_access_token()
+
+    assert first.token == second.token == "token-1"
+    assert len(epic.assertions) == 1
+    assert local_store == {}
+
+
+def test_a_401_requests_a_new_token_with_a_fresh_assertion_and_retries_once(epic):
+    epic_client = client()
+    epic_client.set_access_token()
+    epic.revoked.add("token-1")
+
+    r = epic_client._request("GET", "https://fhir.example.com/Patient/1")
+
+    assert r.status_code == 200
+    assert epic.requests == ["token-1", "token-2"]
+    assert epic.assertions == ["assertion-1", "assertion-2"]
+    assert smart_epic._access_tokens.get("client-a") == "token-2"
+
+
+def test_a_token_rejected_again_is_not_retried_twice(epic):
+    epic_client = client()
+    epic_client.set_access_token()
+    epic.revoked.update({"token-1", "token-2"})
+
+    r = epic_client._request("GET", "https://fhir.example.com/Patient/1")
+
+    assert r.status_code == 401
+    assert epic.requests == ["token-1", "token-2"]
+
+
+def test_a_token_expiring_within_the_margin_is_not_cached(epic):
+    epic.expires_in = smart_epic.TOKEN_REFRESH_MARGIN
+
+    client().set_access_token()
+    client().set_access_token()
+
+    assert len(epic.assertions) == 2
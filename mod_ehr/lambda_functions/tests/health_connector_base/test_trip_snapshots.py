@@ -0,0 +1,84 @@
+import pytest
+from health_connector_base import trip_snapshots
+
+TRIPS = {
+    "r1": [
+        {"trip_id": "early", "pickup_eta": 100, "dropoff_eta": 150},
+        {"trip_id": "midday", "pickup_eta": 500, "dropoff_eta": 550},
+        {"trip_id": "late", "pickup_eta": 900, "dropoff_eta": 950},
+    ],
+}
+
+
+class RecordingVia:
+    """
+    Stands in for Via: remembers each (rider, window) fetched and returns the
+    rider's trips in that window.
+    """
+
+    fetches = []
+
+    def iter_trips(self, rider_id, window_start=None, window_end=None):
+        RecordingVia.fetches.append((rider_id, window_start, window_end))
+        return (
+            trip for trip in TRIPS.get(rider_id, [])
+            if trip_snapshots.trip_in_window(trip, window_start, window_end)
+        )
+
+
+@pytest.fixture
+def via_fetches(monkeypatch):
+    monkeypatch.setattr(trip_snapshots, "Via", RecordingVia)
+    RecordingVia.fetches = []
+    trip_snapshots._snapshots.local.clear()
+    yield RecordingVia.fetches
+    trip_snapshots._snapshots.local.clear()
+
+
+def trip_ids(trips: list) -> list:
+    return [trip["trip_id"] for trip in trips]
+
+
+def test_a_covered_window_is_served_from_the_snapshot(via_fetches):
+    assert trip_ids(trip_snapshots.get_rider_trips("r1", 0, 1000)) == ["early", "midday", "late"]
+    assert trip_ids(trip_snapshots.get_rider_trips("r1", 400, 600)) == ["midday"]
+
+    assert via_fetches == [("r1", 0, 1000)]
+
+
+def test_a_wider_window_refreshes_over_the_union(via_fetches):
+    trip_snapshots.get_rider_trips("r1", 400, 600)
+    assert trip_ids(trip_snapshots.get_rider_trips("r1", 800, 1000)) == ["late"]
+    # Both earlier windows are now covered
+    trip_snapshots.get_rider_trips("r1", 450, 950)
+
+    assert via_fetches == [("r1", 400, 600), ("r1", 400, 1000)]
+
+
+def test_an_open_ended_snapshot_covers_any_window(via_fetches):
+    trip_snapshots.get_rider_trips("r1", 300, None)
+
+    assert trip_ids(trip_snapshots.get_rider_trips("r1", 300, 10_000)) == ["midday", "late"]
+    trip_snapshots.get_rider_trips("r1", None, 600)
+
+    assert via_fetches == [("r1", 300, None), ("r1", None, None)]
+
+
+def test_another_process_reuses_the_shared_snapshot(via_fetches):
+    trip_snapshots.get_rider_trips("r1", 0, 1000)
+    # A cold container only has the shared tier
+    trip_snapshots._snapshots.local.clear()
+
+    assert trip_ids(trip_snapshots.get_rider_trips("r1", 0, 200)) == ["early"]
+    assert len(via_fetches) == 1
+
+
+def test_booking_invalidates_the_riders_snapshot(via_fetches):
+    trip_snapshots.get_rider_trips("r1", 0, 1000)
+    trip_snapshots.get_rider_trips("r2", 0, 1000)
+
+    trip_snapshots.invalidate("r1")
+    trip_snapshots.get_rider_trips("r1", 0, 1000)
+    trip_snapshots.get_rider_trips("r2", 0, 1000)
+
+    assert [rider for rider, _, _ in via_fetches] == ["r1", "r2", "r1"]
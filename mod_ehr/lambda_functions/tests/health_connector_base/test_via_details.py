@@ -0,0 +1,120 @@
+"""
+Via.get_ride_details against a stubbed /trips/details/ endpoint.
+"""
+import threading
+import time
+
+import pytest
+from health_connector_base import via
+
+
+class DetailsResponse:
+    def __init__(self, trip_id: str, ok: bool) -> None:
+        self.ok = ok
+        self.status_code = 200 if ok else 500
+        self.trip_id = trip_id
+
+    def json(self) -> dict:
+        if not self.ok:
+            return {"message": "unavailable"}
+        return {"trip_details": {
+            "driver_info": {"name": f"driver of {self.trip_id}"},
+            "vehicle_info": {"plate": self.trip_id.upper()},
+        }}
+
+
+class DetailsEndpoint:
+    """
+    Answers /trips/details/ after a short delay, tracking how many calls run
+    at once; trips in `failing` get a 500.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.failing = set()
+        self.in_flight = self.peak = 0
+
+    def __call__(self, method, path, params=None, **kwargs):
+        assert (method, path) == ("GET", "/trips/details/")
+        with self.lock:
+            self.fetched.append(params["trip_id"])
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return DetailsResponse(params["trip_id"], params["trip_id"] not in self.failing)
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    stub = DetailsEndpoint()
+    monkeypatch.setattr(via._credentials, "_secrets", {
+        "via_client_id": "id", "via_client_secret": "secret", "via_api_key": "details-key",
+    })
+    monkeypatch.setattr(via, "VIA_DETAILS_CONCURRENCY", 3)
+    monkeypatch.setattr(via, "_detail_limits", {})
+    monkeypatch.setattr(via.Via, "_request", lambda self, *args, **kwargs: stub(*args, **kwargs))
+    via._trip_details.clear()
+    yield stub
+    via._trip_details.clear()
+
+
+def rides(count: int, status: str = "CONFIRMED") -> list:
+    return [
+        {"trip_id": f"t{index}", "trip_status": status, "pickup_eta": 1000 + index, "dropoff_eta": 2000 + index}
+        for index in range(count)
+    ]
+
+
+def test_every_ride_gets_details_with_bounded_concurrency(endpoint):
+    result = via.Via().get_ride_details(rides(12))
+
+    assert [ride["trip_id"] for ride in result] == [f"t{index}" for index in range(12)]
+    assert all(ride["vehicle_info"] == {"plate": ride["trip_id"].upper()} for ride in result)
+    assert sorted(endpoint.fetched) == sorted(f"t{index}" for index in range(12))
+    assert 1 < endpoint.peak <= 3
+
+
+def test_unchanged_trips_reuse_their_details(endpoint):
+    client = via.Via()
+    client.get_ride_details(rides(4))
+
+    again = client.get_ride_details(rides(4))
+
+    assert len(endpoint.fetched) == 4
+    assert again[2]["driver_info"] == {"name": "driver of t2"}
+
+
+def test_a_status_or_eta_change_fetches_again(endpoint):
+    client = via.Via()
+    client.get_ride_details(rides(3))
+
+    later = rides(3)
+    later[0]["trip_status"] = "ASSIGNED"
+    later[1]["pickup_eta"] += 60
+    client.get_ride_details(later)
+
+    assert sorted(endpoint.fetched) == ["t0", "t0", "t1", "t1", "t2"]
+
+
+def test_skip_unchanged_can_be_turned_off(endpoint):
+    client = via.Via()
+    client.get_ride_details(rides(2))
+    client.get_ride_details(rides(2), skip_unchanged=False)
+
+    assert len(endpoint.fetched) == 4
+
+
+def test_a_failed_detail_call_is_not_remembered(endpoint):
+    endpoint.failing.add("t1")
+    client = via.Via()
+
+    first = client.get_ride_details(rides(2))
+    endpoint.failing.clear()
+    second = client.get_ride_details(rides(2))
+
+    assert "driver_info" not in first[1]
+    assert second[1]["driver_info"] == {"name": "driver of t1"}
+    assert endpoint.fetched.count("t1") == 2 and endpoint.fetched.count("t0") == 1
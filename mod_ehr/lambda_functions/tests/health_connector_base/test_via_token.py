@@ -0,0 +1,121 @@
+"""
+The process-wide Via OAuth token against a stubbed Cognito and trip API.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from health_connector_base import via
+
+
+def response(status_code: int, body: dict) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status_code
+    r._content = json.dumps(body).encode()
+    return r
+
+
+class Cognito:
+    """
+    Grants "access-1", "access-2", ... and lets the trip API accept only the
+    latest one, like a rotated token.
+    """
+
+    def __init__(self) -> None:
+        self.grants = []
+        self.api_calls = []
+        self.expires_in = 3600
+        self.lock = threading.Lock()
+
+    @property
+    def current(self) -> str | None:
+        return self.grants[-1] if self.grants else None
+
+    def post(self, url, headers=None, data=None, auth=None):
+        assert url == via.VIA_AUTH_URL and auth == ("id", "secret")
+        with self.lock:
+            self.grants.append(f"access-{len(self.grants) + 1}")
+        body = {"access_token": self.current}
+        if self.expires_in is not None:
+            body["expires_in"] = self.expires_in
+        return response(200, body)
+
+    def request(self, method, url, headers=None, **kwargs):
+        with self.lock:
+            self.api_calls.append(headers["Authorization"])
+        ok = headers["Authorization"] == self.current
+        return response(200 if ok else 401, {"trips": []})
+
+
+@pytest.fixture
+def cognito(monkeypatch):
+    server = Cognito()
+    credentials = via._ViaCredentials()
+    credentials._secrets = {"via_client_id": "id", "via_client_secret": "secret", "via_api_key": "key"}
+    monkeypatch.setattr(via, "_credentials", credentials)
+    monkeypatch.setattr(via.http_client, "post", server.post)
+    monkeypatch.setattr(via.http_client, "request", server.request)
+    return server
+
+
+def test_every_client_in_the_process_shares_one_token(cognito):
+    for _ in range(3):
+        assert via.Via()._request("GET", "/trips/get").ok
+
+    assert cognito.grants == ["access-1"]
+
+
+def test_a_token_inside_the_refresh_margin_is_replaced(cognito):
+    cognito.expires_in = via.TOKEN_REFRESH_MARGIN
+
+    via.Via()._request("GET", "/trips/get")
+    via.Via()._request("GET", "/trips/get")
+
+    assert cognito.grants == ["access-1", "access-2"]
+
+
+def test_a_missing_expires_in_falls_back_to_the_default_ttl(cognito):
+    cognito.expires_in = None
+
+    via.Via()._request("GET", "/trips/get")
+    via.Via()._request("GET", "/trips/get")
+
+    assert cognito.grants == ["access-1"]
+
+
+def test_a_401_refreshes_once_and_retries(cognito):
+    client = via.Via()
+    client.set_token()
+    # Rotated elsewhere: access-1 is now rejected
+    cognito.grants.append("access-2")
+
+    r = client._request("GET", "/trips/get")
+
+    assert r.ok
+    assert cognito.api_calls == ["access-1", "access-3"]
+    assert client.token == "access-3"
+
+
+def test_concurrent_401s_share_a_single_refresh(cognito):
+    client = via.Via()
+    client.set_token()
+    cognito.grants.append("rotated")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: client._request("GET", "/trips/get"), range(8)))
+
+    assert all(r.ok for r in responses)
+    assert cognito.grants == ["access-1", "rotated", "access-3"]
+
+
+def test_a_failed_token_request_is_retried_by_the_next_call(cognito, monkeypatch):
+    granted = cognito.post
+    monkeypatch.setattr(via.http_client, "post", lambda *args, **kwargs: response(400, {}))
+    client = via.Via()
+    client.set_token()
+    assert client.token is None
+
+    monkeypatch.setattr(via.http_client, "post", granted)
+    assert client._request("GET", "/trips/get").ok
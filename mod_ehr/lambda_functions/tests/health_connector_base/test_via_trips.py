@@ -0,0 +1,120 @@
+"""
+Via trip paging against a stubbed /trips/get.
+"""
+import pytest
+from health_connector_base import via
+
+
+class Page:
+    status_code = 200
+    ok = True
+
+    def __init__(self, trips):
+        self._trips = trips
+
+    def json(self):
+        return {"trips": self._trips}
+
+
+class TripsStub:
+    """
+    Serves `total` trips per status in pages of page_list_size, by page_number
+    (or always the first page with ignore_page_number).
+    """
+
+    def __init__(self, total: int, ignore_page_number: bool = False, etas=None) -> None:
+        self.total = total
+        self.ignore_page_number = ignore_page_number
+        self.etas = etas or (lambda index: None)
+        self.calls = []
+
+    def __call__(self, method, path, params=None, **kwargs):
+        assert path == "/trips/get"
+        self.calls.append(dict(params))
+        size = params["page_list_size"]
+        page_number = 1 if self.ignore_page_number else params["page_number"]
+        first = (page_number - 1) * size
+        return Page([
+            {
+                "trip_id": f"{params['trip_status']}-{index}",
+                "pickup_eta": self.etas(index),
+                "dropoff_eta": self.etas(index),
+            }
+            for index in range(first, min(first + size, self.total))
+        ])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(via._credentials, "_secrets", {
+        "via_client_id": "id", "via_client_secret": "secret", "via_api_key": "key",
+    })
+    monkeypatch.setattr(via, "VIA_TRIP_PAGE_SIZE", 10)
+    monkeypatch.setattr(via, "VIA_MAX_TRIP_PAGES", 5)
+    client = via.Via()
+    client.TRIP_STATUSES = ["CONFIRMED", "FINISHED"]
+    # Details are fetched from another endpoint
+    monkeypatch.setattr(client, "get_ride_details", lambda rides: rides)
+    return client
+
+
+def test_follows_page_number_until_a_short_page(client, monkeypatch):
+    stub = TripsStub(total=23)
+    monkeypatch.setattr(client, "_request", stub)
+
+    trips = list(client.iter_trips("rider"))
+
+    assert [trip["trip_id"] for trip in trips] == [
+        f"{status}-{index}" for status in ("CONFIRMED", "FINISHED") for index in range(23)
+    ]
+    confirmed = [call for call in stub.calls if call["trip_status"] == "CONFIRMED"]
+    assert [call["page_number"] for call in confirmed] == [1, 2, 3]
+    assert {call["page_list_size"] for call in confirmed} == {10}
+
+
+def test_full_last_page_is_followed_by_one_empty_page(client, monkeypatch):
+    stub = TripsStub(total=20)
+    monkeypatch.setattr(client, "_request", stub)
+    assert len(list(client.iter_trips("rider"))) == 40
+    assert len(stub.calls) == 6
+
+
+def test_ignored_page_number_stops_instead_of_repeating_trips(client, monkeypatch, capsys):
+    stub = TripsStub(total=100, ignore_page_number=True)
+    monkeypatch.setattr(client, "_request", stub)
+
+    trips = list(client.iter_trips("rider"))
+
+    assert len(trips) == 20
+    assert len({trip["trip_id"] for trip in trips}) == 20
+    assert len(stub.calls) == 4
+    assert "again for page 2" in capsys.readouterr().out
+
+
+def test_page_cap_is_logged(client, monkeypatch, capsys):
+    monkeypatch.setattr(client, "_request", TripsStub(total=1000))
+    assert len(list(client.iter_trips("rider"))) == 2 * 5 * 10
+    assert "after 5 pages" in capsys.readouterr().out
+
+
+def test_window_stops_paging_after_trips_leave_it(client, monkeypatch):
+    # Trips sorted by ETA: only indexes 5-14 fall in the window
+    stub = TripsStub(total=50, etas=lambda index: 1000 + index * 100)
+    monkeypatch.setattr(client, "_request", stub)
+
+    trips = list(client.iter_trips("rider", window_start=1500, window_end=2400))
+
+    assert [trip["trip_id"] for trip in trips if trip["trip_id"].startswith("CONFIRMED")] == [
+        f"CONFIRMED-{index}" for index in range(5, 15)
+    ]
+    # Page 3 has nothing in the window, so page 4 is never requested
+    assert max(call["page_number"] for call in stub.calls) == 3
+
+
+def test_failed_page_ends_that_status(client, monkeypatch):
+    class Failed:
+        ok = False
+        status_code = 503
+
+    monkeypatch.setattr(client, "_request", lambda *args, **kwargs: Failed())
+    assert list(client.iter_trips("rider")) == []
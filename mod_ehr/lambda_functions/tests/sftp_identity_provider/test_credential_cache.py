@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+for name, value in {
+    "TABLE_NAME": "hospitals",
+    "ROLE_ARN": "arn:aws:iam::123456789012:role/sftp",
+    "BUCKET_NAME": "sftp-bucket",
+    "ENV": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+from conftest import load_handler  # noqa: E402
+
+handler = load_handler("sftp_identity_provider")
+
+
+class HospitalsTable:
+    def __init__(self, item: dict) -> None:
+        self.item = item
+        self.queries = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        return {"Items": [dict(self.item)] if self.item else []}
+
+
+class Secrets:
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, password: str) -> None:
+        self.password = password
+        self.reads = 0
+
+    def get_secret_value(self, SecretId):
+        self.reads += 1
+        return {"SecretString": json.dumps({"sftp_password": self.password})}
+
+
+@pytest.fixture
+def sftp(monkeypatch):
+    table = HospitalsTable({
+        "id": "h1",
+        "s3_subfolder_name": "north",
+        "status": "Active",
+        "modified": "2026-10-01T00:00:00.000000+0000",
+    })
+    secrets = Secrets("first-password")
+    monkeypatch.setattr(handler, "table", table)
+    monkeypatch.setattr(handler, "secrets_client", secrets)
+    monkeypatch.setattr(handler, "_emit_metrics", lambda timings, cache_hit: None)
+    handler._credentials.clear()
+    yield table, secrets
+    handler._credentials.clear()
+
+
+def login(password: str) -> bool:
+    return handler.lambda_handler({"username": "north-user", "password": password}, None)["isAuthenticated"]
+
+
+def test_a_cached_login_skips_the_secret_but_rechecks_the_hospital(sftp):
+    table, secrets = sftp
+
+    assert login("first-password")
+    assert login("first-password")
+
+    assert secrets.reads == 1
+    assert table.queries == 2
+
+
+def test_deactivating_the_hospital_rejects_the_next_login(sftp):
+    table, _ = sftp
+    assert login("first-password")
+
+    table.item |= {"status": "Inactive", "modified": "2026-10-02T00:00:00.000000+0000"}
+
+    assert not login("first-password")
+    assert "north-user" not in handler._credentials
+
+
+def test_a_dashboard_password_change_rejects_the_old_password(sftp):
+    table, secrets = sftp
+    assert login("first-password")
+
+    secrets.password = "second-password"
+    table.item |= {"modified": "2026-10-02T00:00:00.000000+0000"}
+
+    assert not login("first-password")
+    assert login("second-password")
+    assert secrets.reads == 2
+
+
+def test_an_unknown_user_is_rejected(sftp):
+    table, secrets = sftp
+    table.item = None
+
+    assert not login("first-password")
+    assert secrets.reads == 0